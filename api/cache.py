@@ -0,0 +1,45 @@
+import hashlib
+import time
+
+import jwt
+from cachetools import TLRUCache, TTLCache
+
+from .models.subscriber import SubscriberRead
+
+
+class SubscriberCache:
+    """Bounded LRU/TTL cache of authenticated subscribers, keyed by email (the JWT subject)."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._subscribers: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, email: str) -> SubscriberRead | None:
+        return self._subscribers.get(email)
+
+    def set(self, subscriber: SubscriberRead) -> None:
+        self._subscribers[subscriber.email] = subscriber
+
+    def invalidate(self, email: str | None) -> None:
+        if email:
+            self._subscribers.pop(email, None)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+class TokenCache:
+    """Memoizes decoded JWT payloads by token hash until the token expires."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._payloads: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda _key, payload, now: payload.get("exp", now), timer=time.time)
+
+    def decode(self, token: str, secret_key: str, algorithm: str) -> dict:
+        key: bytes = hashlib.sha256(token.encode()).digest()
+        payload: dict | None = self._payloads.get(key)
+        if payload is None:
+            payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+            self._payloads[key] = payload
+        return payload
+
+    def __len__(self) -> int:
+        return len(self._payloads)
@@ -0,0 +1,53 @@
+"""
+Folds the raw SBAT response time samples already stored into the `server_response_time_rollups` of the configured database backend.
+
+    python -m api.db.backfill_response_time_rollups --until 2026-10-19T12:00:00+00:00
+
+Run it once after deploying the version that maintains the rollups, with `--until` set to the moment it started,
+so the samples the monitor rolled up since then are not counted twice. Until it ran, MongoDB gets no TTL index on
+a regular `server_response_times` collection and the other backends keep their expired samples, so the history only
+in those samples is not lost. When it is done it creates the TTL index, restarting the API does the same.
+"""
+
+import argparse
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from ..dependencies import get_configured_repo, get_settings
+from ..models.sbat import ServerResponseTimeRead
+from .backfill_slot_stats import aware_datetime
+from .base_repo import BaseRepository
+
+
+async def backfill(args: argparse.Namespace) -> None:
+    repo: BaseRepository = await get_configured_repo()
+    ttl: timedelta = timedelta(days=get_settings().server_response_time_ttl_days)
+
+    folded: int = 0
+    samples: int = 0
+    # one page of samples in memory at a time, before the rollups the collection kept every sample ever taken
+    async for page in repo.iter_server_response_times(args.batch_size):
+        samples += len(page)
+        # the databases return naive UTC datetimes
+        batch: list[ServerResponseTimeRead] = [sample for sample in page if sample.start.replace(tzinfo=UTC) < args.until]
+        await repo.record_server_response_time_rollups(batch, ttl)
+        folded += len(batch)
+        print(f"{folded} of {samples} server response times folded into the rollups")
+
+    # creates the TTL index the startup skipped while the history was missing from the rollups
+    await repo.ensure_indexes(ttl)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--until", type=aware_datetime, default=datetime.now(UTC), help="ISO 8601 time, UTC without an offset, now by default")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(backfill(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Replays the time slots already stored into the monthly `slot_stats` aggregates of the configured database backend.
+
+    python -m api.db.backfill_slot_stats --until 2026-10-19T12:00:00+00:00
+
+Run it once after deploying the version that maintains the aggregates, with `--until` set to the moment it started,
+so the events the monitor recorded since then are not counted twice. A slot only keeps its first and its latest
+offer, so a slot that was taken and re-released more than once contributes its first take and its latest
+re-release and take, the takes in between are lost.
+"""
+
+import argparse
+import asyncio
+from datetime import UTC, datetime
+
+from ..dependencies import get_configured_repo
+from ..models.sbat import ExamTimeSlotRead, SlotEvent
+from .base_repo import BaseRepository
+
+
+def _aware(at: datetime | None) -> datetime | None:
+    # the databases return naive UTC datetimes
+    return at.replace(tzinfo=UTC) if at and at.tzinfo is None else at
+
+
+def replay_events(time_slot: ExamTimeSlotRead) -> list[SlotEvent]:
+    """The found, taken and re-release events that can be read back from the timestamps of a stored slot."""
+    first_found_at, first_taken_at = _aware(time_slot.first_found_at), _aware(time_slot.first_taken_at)
+    found_at, taken_at = _aware(time_slot.found_at), _aware(time_slot.taken_at)
+    common: dict = {"exam_center_id": time_slot.exam_center_id, "driving_school": time_slot.driving_school}
+
+    events: list[SlotEvent] = [SlotEvent(kind="found", at=first_found_at, **common)]
+    if first_taken_at:
+        events.append(SlotEvent(kind="taken", at=first_taken_at, seconds_on_offer=(first_taken_at - first_found_at).total_seconds(), **common))
+    if first_taken_at and found_at > first_taken_at:
+        events.append(SlotEvent(kind="re_released", at=found_at, **common))
+        if taken_at and taken_at > found_at:
+            events.append(SlotEvent(kind="taken", at=taken_at, seconds_on_offer=(taken_at - found_at).total_seconds(), **common))
+    return events
+
+
+def aware_datetime(value: str) -> datetime:
+    """An ISO 8601 time for argparse, read as UTC when it has no offset."""
+    try:
+        return _aware(datetime.fromisoformat(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"not an ISO 8601 time: {value!r}") from e
+
+
+async def backfill(args: argparse.Namespace) -> None:
+    repo: BaseRepository = await get_configured_repo()
+
+    replayed: int = 0
+    time_slots: int = 0
+    batch: list[SlotEvent] = []
+    # one page of slots in memory at a time, the archive alone can hold every slot ever seen
+    async for page in repo.iter_time_slots_in_all_tiers(args.batch_size):
+        time_slots += len(page)
+        for time_slot in page:
+            if time_slot.exam_center_id is not None:
+                batch.extend(event for event in replay_events(time_slot) if event.at < args.until)
+        if len(batch) >= args.batch_size:
+            await repo.record_slot_events(batch)
+            replayed += len(batch)
+            batch = []
+            print(f"{replayed} slot events replayed")
+    if batch:
+        await repo.record_slot_events(batch)
+        replayed += len(batch)
+    print(f"{replayed} slot events of {time_slots} time slots replayed")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--until", type=aware_datetime, default=datetime.now(UTC), help="ISO 8601 time, UTC without an offset, now by default")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    return parser.parse_args()
+
+
+def main() -> None:
+    asyncio.run(backfill(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
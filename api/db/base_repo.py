@@ -1,14 +1,35 @@
+import inspect
 from abc import ABC, abstractmethod
-from typing import Type
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Literal, Type
 
 from pydantic import BaseModel
 
-from ..models.sbat import ExamTimeSlotRead, SbatRequestRead
+from ..metrics import timed_repository_method
+from .document_view import DocumentView, ReturnMode
+from .response_time_rollups import ROLLUP_RESOLUTIONS, bucket_start
+from ..models.sbat import (
+    ExamTimeSlotRead,
+    SbatTokenCreate,
+    SbatTokenRead,
+    ServerResponseTimeBase,
+    ServerResponseTimeCreate,
+    ServerResponseTimeRead,
+    ServerResponseTimeRollupRead,
+    SlotEvent,
+)
 from ..models.subscriber import SubscriberCreate, SubscriberRead
 
 
 class BaseRepository(ABC):
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # every implementation reports the duration of its public methods to api.metrics.REPOSITORY_SECONDS
+        for name, attribute in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(attribute):
+                setattr(cls, name, timed_repository_method(attribute))
+
     @abstractmethod
     async def create(self, table_or_collection: str, data_model: BaseModel, pydantic_return_model: Type[BaseModel]) -> BaseModel:
         """
@@ -24,7 +45,24 @@ class BaseRepository(ABC):
         """
 
     @abstractmethod
-    async def find(self, table_or_collection: str, query_dict: dict, pydantic_return_model: Type[BaseModel]) -> list[BaseModel]:
+    async def create_many(self, table_or_collection: str, data_models: list[BaseModel]) -> None:
+        """
+        Create several documents or rows in the repository in a single round trip.
+
+        Args:
+            table_or_collection (str): The name of the collection or table.
+            data_models (list[BaseModel]): The Pydantic model instances containing the data to insert.
+        """
+
+    @abstractmethod
+    async def find(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> list[BaseModel | dict | DocumentView]:
         """
         Finds documents or rows in a collection or table based on the provided query dictionary
         returns the results as a list of Pydantic models.
@@ -33,13 +71,23 @@ class BaseRepository(ABC):
             table_or_collection (str): The name of the collection or table.
             query_dict (dict): A dictionary specifying the query criteria.('field':'value_to_match')
             pydantic_return_model (BaseModel): The Pydantic model class to use for deserializing the results.
+            projection (dict | None): Fields to include (1) or exclude (0), all fields are returned when omitted.
+            return_mode (ReturnMode): Return validated models, raw dicts or read-only `DocumentView`s.
+                Only `ReturnMode.MODEL` runs Pydantic validation.
 
         Returns:
-            list[BaseModel]: A list of Pydantic model instances representing the query results.
+            list[BaseModel | dict | DocumentView]: A list of results in the requested return mode.
         """
 
     @abstractmethod
-    async def find_one(self, table_or_collection: str, query_dict: dict, pydantic_return_model: BaseModel) -> BaseModel | None:
+    async def find_one(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> BaseModel | dict | DocumentView | None:
         """
         Finds a document or row in a collection or table based on the provided query dictionary
         returns the results as a Pydantic models if found else None.
@@ -48,9 +96,11 @@ class BaseRepository(ABC):
             table_or_collection (str): The name of the collection or table.
             query_dict (dict): A dictionary specifying the query criteria.('field':'value_to_match')
             pydantic_return_model (BaseModel): The Pydantic model class to use for deserializing the results.
+            projection (dict | None): Fields to include (1) or exclude (0), all fields are returned when omitted.
+            return_mode (ReturnMode): Return a validated model, a raw dict or a read-only `DocumentView`.
 
         Returns:
-            BaseModel | None: Pydantic model instances representing the result or None if no matching results were found.
+            BaseModel | dict | DocumentView | None: The result in the requested return mode or None if no matching results were found.
         """
 
     @abstractmethod
@@ -70,6 +120,94 @@ class BaseRepository(ABC):
             BaseModel | None: The updated document or row as a Pydantic model, or None if no matching document was found.
         """
 
+    async def find_time_slots_in_all_tiers(
+        self, query_dict: dict, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> list[ExamTimeSlotRead | dict | DocumentView]:
+        """
+        Find time slots in the hot `slots` collection and in `slots_archive`, for analytics over every slot ever seen.
+
+        Args:
+            query_dict (dict): The query to filter the time slots, evaluated on both tiers.
+            projection (dict | None): Fields to include (1) or exclude (0), as in MongoDB.
+            return_mode (ReturnMode): Validated models, plain dicts or lazily validated views.
+
+        Returns:
+            list[ExamTimeSlotRead | dict | DocumentView]: The hot time slots followed by the archived ones.
+        """
+        hot: list = await self.find("slots", query_dict, ExamTimeSlotRead, projection, return_mode)
+        return hot + await self.find("slots_archive", query_dict, ExamTimeSlotRead, projection, return_mode)
+
+    @abstractmethod
+    async def find_time_slots_page(
+        self, tier: Literal["slots", "slots_archive"], after_exam_id: int | None, limit: int
+    ) -> list[ExamTimeSlotRead]:
+        """
+        Find the next page of time slots of one tier in `exam_id` order.
+
+        Args:
+            tier (Literal["slots", "slots_archive"]): The hot or the archived time slots.
+            after_exam_id (int | None): The last `exam_id` of the previous page, None for the first page.
+            limit (int): The maximum number of time slots in the page.
+
+        Returns:
+            list[ExamTimeSlotRead]: The time slots with an `exam_id` above `after_exam_id`, lowest first.
+        """
+
+    async def iter_time_slots_in_all_tiers(self, batch_size: int = 1000) -> AsyncIterator[list[ExamTimeSlotRead]]:
+        """
+        Page through every time slot of both tiers without holding more than one page in memory.
+
+        Args:
+            batch_size (int): How many time slots are read per page.
+
+        Yields:
+            list[ExamTimeSlotRead]: The hot time slots followed by the archived ones, one page at a time.
+        """
+        for tier in ("slots", "slots_archive"):
+            after_exam_id: int | None = None
+            while True:
+                page: list[ExamTimeSlotRead] = await self.find_time_slots_page(tier, after_exam_id, batch_size)
+                if page:
+                    yield page
+                if len(page) < batch_size:
+                    break
+                after_exam_id = page[-1].exam_id
+
+    @abstractmethod
+    async def archive_time_slots(self, started_before: datetime, taken_before: datetime, batch_size: int = 1000) -> int:
+        """
+        Move the time slots starting before `started_before`, or taken before `taken_before`, to `slots_archive`.
+
+        Args:
+            started_before (datetime): Slots whose exam starts before this are no longer offered.
+            taken_before (datetime): Slots taken before this are unlikely to come back.
+            batch_size (int): How many slots are moved per round trip.
+
+        Returns:
+            int: The number of archived time slots.
+        """
+
+    @abstractmethod
+    async def restore_archived_time_slots(self, exam_ids: list[int]) -> set[int]:
+        """
+        Move archived time slots that are offered again back to `slots`.
+
+        Args:
+            exam_ids (list[int]): The exam ids of the offered slots that are not in `slots`.
+
+        Returns:
+            set[int]: The exam ids of the restored time slots.
+        """
+
+    @abstractmethod
+    async def record_slot_events(self, events: list[SlotEvent]) -> None:
+        """
+        Fold time slot state changes into the monthly `slot_stats` aggregates of their exam center and driving school.
+
+        Args:
+            events (list[SlotEvent]): The state changes, events of the same aggregate are applied as one update.
+        """
+
     @abstractmethod
     async def find_notified_time_slot_ids(self, exam_center_id: int, license_type: str) -> set[int]:
         """
@@ -97,12 +235,36 @@ class BaseRepository(ABC):
         """
 
     @abstractmethod
-    async def find_last_sbat_auth_request(self) -> SbatRequestRead | None:
+    async def find_sbat_token(self, username: str) -> SbatTokenRead | None:
+        """
+        Find the stored SBAT API token of an account.
+
+        Args:
+            username (str): The SBAT username the token was issued to.
+
+        Returns:
+            SbatTokenRead | None: The token if one was stored, or None if not.
+        """
+
+    @abstractmethod
+    async def save_sbat_token(self, token: SbatTokenCreate) -> None:
+        """
+        Store the SBAT API token of an account, replacing the previous one.
+
+        Args:
+            token (SbatTokenCreate): The token with its expiry.
+        """
+
+    @abstractmethod
+    async def delete_expired_sbat_requests(self, now: datetime) -> int:
         """
-        Find the most recent SBAT authentication request.
+        Delete the SBAT request log rows whose `expires_at` lies before `now`.
+
+        Args:
+            now (datetime): The current time.
 
         Returns:
-            SbatRequestRead | None: The last SBAT authentication request if found, or None if not.
+            int: The number of deleted rows.
         """
 
     @abstractmethod
@@ -122,7 +284,9 @@ class BaseRepository(ABC):
         """
 
     @abstractmethod
-    async def find_subscriber_by_telegram_user_id(self, telegram_user_id: int) -> SubscriberRead | None:
+    async def find_subscriber_by_telegram_user_id(
+        self, telegram_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
         """
         Find a subscriber by their Telegram user ID.
 
@@ -130,16 +294,20 @@ class BaseRepository(ABC):
 
         Args:
             telegram_user_id (int): The Telegram user ID associated with the subscriber.
+            projection (dict | None): Fields to include (1) or exclude (0), all fields are returned when omitted.
+            return_mode (ReturnMode): Return a validated model, a raw dict or a read-only `DocumentView`.
 
         Returns:
-            SubscriberRead | None: An instance of `SubscriberRead` if found, otherwise `None`.
+            SubscriberRead | dict | DocumentView | None: The subscriber in the requested return mode if found, otherwise `None`.
 
         Raises:
             NotImplementedError: If the method is not implemented by the subclass.
         """
 
     @abstractmethod
-    async def find_subscriber_by_discord_user_id(self, discord_user_id: int) -> SubscriberRead | None:
+    async def find_subscriber_by_discord_user_id(
+        self, discord_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
         """
         Find a subscriber by their discord user ID.
 
@@ -147,9 +315,11 @@ class BaseRepository(ABC):
 
         Args:
             discord_user_id (int): The discord user ID associated with the subscriber.
+            projection (dict | None): Fields to include (1) or exclude (0), all fields are returned when omitted.
+            return_mode (ReturnMode): Return a validated model, a raw dict or a read-only `DocumentView`.
 
         Returns:
-            SubscriberRead | None: An instance of `SubscriberRead` if found, otherwise `None`.
+            SubscriberRead | dict | DocumentView | None: The subscriber in the requested return mode if found, otherwise `None`.
 
         Raises:
             NotImplementedError: If the method is not implemented by the subclass.
@@ -212,6 +382,10 @@ class BaseRepository(ABC):
         """
         Process a Stripe checkout session and update the corresponding subscriber's information.
 
+        The subscriber is looked up by the session's client reference, or by its Stripe customer when it has none,
+        and a subscriber inserted for an unknown reference gets it as its id. Processing the same session again
+        thereby updates the subscriber it inserted the first time. The session is not modified.
+
         Args:
             session (dict): The Stripe session data.
             telegram_link (str): A link to the subscriber's Telegram account.
@@ -221,33 +395,58 @@ class BaseRepository(ABC):
         """
 
     @abstractmethod
-    async def create_stripe_event(self, stripe_event: dict) -> None:
+    async def create_stripe_event(self, stripe_event: dict) -> str | None:
         """
-        Process and store a Stripe event.
+        Store a Stripe event as pending, unless an event with the same ID was already stored.
 
-        This method handles incoming Stripe events (e.g., webhook notifications) and updates
-        the database accordingly. The `stripe_event` parameter contains the event
-        sent by Stripe.
+        The event is recorded before the webhook is acknowledged, handlers apply it afterwards
+        and mark it as processed with `mark_stripe_event_processed`. The check and the insert are a single
+        atomic upsert, so concurrent deliveries of one event store it once.
 
         Args:
             stripe_event (dict): The Stripe event.
 
+        Returns:
+            str | None: None if the event was newly stored, otherwise the processing status of the stored copy,
+                "pending" for a redelivery of an event that was not applied yet. Events stored without a
+                processing status count as "processed".
+
         Raises:
             NotImplementedError: If the method is not implemented by the subclass.
         """
 
     @abstractmethod
-    async def create_telegram_event(self, telegram_event: dict) -> None:
+    async def find_unprocessed_stripe_events(self) -> list[dict]:
+        """
+        Find the Stripe events that were stored but not yet processed, oldest first.
+
+        Returns:
+            list[dict]: The pending Stripe events.
+        """
+
+    @abstractmethod
+    async def mark_stripe_event_processed(self, stripe_event_id: str) -> None:
+        """
+        Mark a stored Stripe event as processed.
+
+        Args:
+            stripe_event_id (str): The ID of the Stripe event.
+        """
+
+    @abstractmethod
+    async def create_telegram_event(self, telegram_event: dict) -> bool:
         """
-        Process and store a Telegram event.
+        Store a Telegram update, unless an update with the same update_id was already stored.
 
-        This method handles incoming Telegram events (e.g., messages or updates) and updates
-        the database accordingly. The `telegram_event` parameter contains the event
-        sent by Telegram.
+        Telegram redelivers updates it considers unanswered, the return value lets callers
+        process every update only once.
 
         Args:
             telegram_event (dict): The Telegram event.
 
+        Returns:
+            bool: True if the update was newly stored, False if it is a duplicate delivery.
+
         Raises:
             NotImplementedError: If the method is not implemented by the subclass.
         """
@@ -267,3 +466,117 @@ class BaseRepository(ABC):
         Raises:
             NotImplementedError: If the method is not implemented by the subclass.
         """
+
+    @abstractmethod
+    async def delete_expired_notification_receipts(self, now: datetime) -> int:
+        """
+        Delete the notification receipts whose `expires_at` lies before `now`.
+
+        Args:
+            now (datetime): The current time.
+
+        Returns:
+            int: The number of deleted receipt documents.
+        """
+
+    @abstractmethod
+    async def add_server_response_time(self, sample: ServerResponseTimeCreate, ttl: timedelta) -> None:
+        """
+        Store a raw response time sample and fold it into its per-minute and per-hour rollups.
+
+        Args:
+            sample (ServerResponseTimeCreate): The response time of one SBAT request.
+            ttl (timedelta): How long the raw sample and the minute rollup are kept.
+        """
+
+    @abstractmethod
+    async def delete_expired_server_response_times(self, now: datetime, ttl: timedelta) -> int:
+        """
+        Delete the raw response time samples older than `ttl` and the expired minute rollups.
+
+        Args:
+            now (datetime): The current time.
+            ttl (timedelta): How long raw samples are kept.
+
+        Returns:
+            int: The number of deleted documents, backends that expire documents themselves may report fewer.
+        """
+
+    @abstractmethod
+    async def record_server_response_time_rollups(self, samples: list[ServerResponseTimeBase], ttl: timedelta) -> None:
+        """
+        Fold response time samples into their per-minute and per-hour rollups without storing the samples.
+
+        Args:
+            samples (list[ServerResponseTimeBase]): The response times to fold in, e.g. raw samples stored before the rollups existed.
+            ttl (timedelta): How long the minute rollups are kept.
+        """
+
+    @abstractmethod
+    async def find_server_response_times_page(self, after_id: str | None, limit: int) -> list[ServerResponseTimeRead]:
+        """
+        Find the next page of raw response time samples in `_id` order, the order in which they were stored.
+
+        Args:
+            after_id (str | None): The last `_id` of the previous page, None for the first page.
+            limit (int): The maximum number of samples in the page.
+
+        Returns:
+            list[ServerResponseTimeRead]: The samples with an `_id` above `after_id`, lowest first.
+        """
+
+    async def iter_server_response_times(self, batch_size: int = 1000) -> AsyncIterator[list[ServerResponseTimeRead]]:
+        """
+        Page through every raw response time sample without holding more than one page in memory.
+
+        Args:
+            batch_size (int): How many samples are read per page.
+
+        Yields:
+            list[ServerResponseTimeRead]: The samples in the order they were stored, one page at a time.
+        """
+        after_id: str | None = None
+        while True:
+            page: list[ServerResponseTimeRead] = await self.find_server_response_times_page(after_id, batch_size)
+            if page:
+                yield page
+            if len(page) < batch_size:
+                break
+            after_id = page[-1].id
+
+    async def server_response_time_rollups_cover_samples(self) -> bool:
+        """
+        Whether the hour rollups reach back to the oldest raw sample, so expiring raw samples loses no history.
+
+        Samples stored before the rollups existed are only covered once `backfill_response_time_rollups` folded them in.
+
+        Returns:
+            bool: True if there are no raw samples or an hour rollup starts at or before the hour of the oldest one.
+        """
+        oldest: list[ServerResponseTimeRead] = await self.find_server_response_times_page(None, 1)
+        if not oldest:
+            return True
+        oldest_hour: datetime = bucket_start(oldest[0].start, ROLLUP_RESOLUTIONS["hour"])
+        rollup: ServerResponseTimeRollupRead | None = await self.find_one(
+            "server_response_time_rollups", {"resolution": "hour", "bucket_start": {"$lte": oldest_hour}}, ServerResponseTimeRollupRead
+        )
+        return rollup is not None
+
+    async def ensure_indexes(self, server_response_time_ttl: timedelta) -> None:
+        """
+        Create the indexes and collections the backend relies on, once at startup rather than on the write paths.
+
+        The SQLite and in-memory backends create their indexes along with their tables, so by default this does nothing.
+
+        Args:
+            server_response_time_ttl (timedelta): How long raw server response time samples are kept.
+        """
+
+    @abstractmethod
+    async def ping(self) -> None:
+        """
+        Make a round trip to the database, for readiness checks.
+
+        Raises:
+            Exception: If the database can not be reached.
+        """
@@ -0,0 +1,209 @@
+"""Evaluate the MongoDB query, projection and update shapes used by the repositories on plain dict documents."""
+
+from datetime import UTC, datetime
+from typing import Any, Callable
+
+from bson import ObjectId
+
+
+def to_bson_value(value: Any) -> Any:
+    """Normalize a value like a BSON round trip does: naive UTC datetimes with millisecond precision, lists for tuples."""
+    if isinstance(value, dict):
+        return {key: to_bson_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_bson_value(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+def resolve_path(document: dict, path: str) -> list[Any]:
+    """Values at a dotted path, descending into arrays of subdocuments like MongoDB does."""
+    values: list[Any] = [document]
+    for part in path.split("."):
+        next_values: list[Any] = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                next_values.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = next_values
+    return values
+
+
+def _candidates(values: list[Any]) -> list[Any]:
+    """Values to compare against, an array field matches on the array itself and on each of its elements."""
+    candidates: list[Any] = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _equals(values: list[Any], expected: Any) -> bool:
+    if expected is None and not values:
+        return True
+    return any(candidate == expected for candidate in _candidates(values))
+
+
+def _compare(values: list[Any], expected: Any, comparison: Callable[[Any, Any], bool]) -> bool:
+    for candidate in _candidates(values):
+        try:
+            if candidate is not None and comparison(candidate, expected):
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def _matches_operators(values: list[Any], operators: dict) -> bool:
+    for operator, expected in operators.items():
+        if operator == "$eq":
+            matched: bool = _equals(values, expected)
+        elif operator == "$ne":
+            matched = not _equals(values, expected)
+        elif operator == "$in":
+            matched = any(_equals(values, option) for option in expected)
+        elif operator == "$nin":
+            matched = not any(_equals(values, option) for option in expected)
+        elif operator == "$gt":
+            matched = _compare(values, expected, lambda a, b: a > b)
+        elif operator == "$gte":
+            matched = _compare(values, expected, lambda a, b: a >= b)
+        elif operator == "$lt":
+            matched = _compare(values, expected, lambda a, b: a < b)
+        elif operator == "$lte":
+            matched = _compare(values, expected, lambda a, b: a <= b)
+        elif operator == "$exists":
+            matched = bool(values) == bool(expected)
+        else:
+            raise ValueError(f"Unsupported query operator: {operator}")
+        if not matched:
+            return False
+    return True
+
+
+def is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+
+def matches(document: dict, query: dict) -> bool:
+    for key, expected in query.items():
+        if key == "$or":
+            if not any(matches(document, sub_query) for sub_query in expected):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub_query) for sub_query in expected):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported query operator: {key}")
+        elif is_operator_dict(expected):
+            if not _matches_operators(resolve_path(document, key), expected):
+                return False
+        elif not _equals(resolve_path(document, key), expected):
+            return False
+    return True
+
+
+def _include(source: dict, target: dict, parts: list[str]) -> None:
+    head, rest = parts[0], parts[1:]
+    if head not in source:
+        return
+    if not rest:
+        target[head] = source[head]
+    elif isinstance(source[head], dict):
+        _include(source[head], target.setdefault(head, {}), rest)
+
+
+def _exclude(target: dict, parts: list[str]) -> None:
+    head, rest = parts[0], parts[1:]
+    if not rest:
+        target.pop(head, None)
+    elif isinstance(target.get(head), dict):
+        target[head] = dict(target[head])
+        _exclude(target[head], rest)
+
+
+def apply_projection(document: dict, projection: dict | None) -> dict:
+    """Returns a new dict with the fields selected by an inclusion (1) or exclusion (0) projection."""
+    if not projection:
+        return dict(document)
+
+    include_id: bool = bool(projection.get("_id", 1))
+    fields: dict = {key: value for key, value in projection.items() if key != "_id"}
+    if fields and all(fields.values()):
+        projected: dict = {"_id": document["_id"]} if include_id and "_id" in document else {}
+        for path in fields:
+            _include(document, projected, path.split("."))
+        return projected
+
+    projected = dict(document)
+    for path in fields:
+        _exclude(projected, path.split("."))
+    if not include_id:
+        projected.pop("_id", None)
+    return projected
+
+
+def _set_path(document: dict, path: str, value: Any) -> None:
+    parts: list[str] = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def apply_update(document: dict, update: dict) -> None:
+    """Applies a `$set`/`$inc`/`$min`/`$max`/`$unset` update document in place, `$setOnInsert` only applies to upserts."""
+    for operator, fields in update.items():
+        if operator == "$setOnInsert":
+            continue
+        for path, value in fields.items():
+            if operator == "$set":
+                _set_path(document, path, to_bson_value(value))
+            elif operator == "$inc":
+                current: list[Any] = resolve_path(document, path)
+                _set_path(document, path, (current[0] if current else 0) + value)
+            elif operator in ("$min", "$max"):
+                current = resolve_path(document, path)
+                value = to_bson_value(value)
+                if not current or (value < current[0] if operator == "$min" else value > current[0]):
+                    _set_path(document, path, value)
+            elif operator == "$unset":
+                parts: list[str] = path.split(".")
+                parent: list[Any] = resolve_path(document, ".".join(parts[:-1])) if len(parts) > 1 else [document]
+                if parent and isinstance(parent[0], dict):
+                    parent[0].pop(parts[-1], None)
+            else:
+                raise ValueError(f"Unsupported update operator: {operator}")
+
+
+def sort_key(path: str) -> Callable[[dict], tuple]:
+    """Sort key for documents on a dotted path, missing and None values sort first like in MongoDB."""
+
+    def key(document: dict) -> tuple:
+        values: list[Any] = resolve_path(document, path)
+        value: Any = values[0] if values else None
+        return (value is not None, value if value is not None else 0)
+
+    return key
+
+
+def new_document(data: dict) -> dict:
+    return {"_id": ObjectId(), **to_bson_value(data)}
+
+
+def upserted_document(query: dict, update: dict) -> dict:
+    """The document an upsert inserts when nothing matches: the equality conditions of the query with the update applied."""
+    document: dict = {}
+    for path, value in query.items():
+        if not path.startswith("$") and not is_operator_dict(value):
+            _set_path(document, path, value)
+    document = new_document(document)
+    apply_update(document, update)
+    for path, value in update.get("$setOnInsert", {}).items():
+        _set_path(document, path, to_bson_value(value))
+    return document
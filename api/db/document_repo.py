@@ -0,0 +1,353 @@
+from abc import abstractmethod
+from datetime import UTC, datetime, timedelta
+from typing import Any, Literal, Type
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from ..cache import SubscriberCache
+from ..models.sbat import (
+    ExamTimeSlotRead,
+    SbatTokenCreate,
+    SbatTokenRead,
+    ServerResponseTimeBase,
+    ServerResponseTimeCreate,
+    ServerResponseTimeRead,
+    SlotEvent,
+)
+from ..models.subscriber import SubscriberCreate, SubscriberRead
+from .base_repo import BaseRepository
+from .document_query import apply_projection, to_bson_value
+from .document_view import DocumentView, ReturnMode, convert_document
+from .response_time_rollups import rollup_updates
+from .slot_stats import slot_stats_updates
+from .password_hasher import PasswordHasher, default_password_hasher
+
+
+class DocumentRepository(BaseRepository):
+    """
+    Implements `BaseRepository` on top of five document primitives, for backends without a MongoDB driver.
+
+    Queries, projections and updates use the MongoDB shapes evaluated by `document_query`, so the
+    subclasses behave like `MongoRepository` and pass the same contract tests.
+    """
+
+    def __init__(self, subscriber_cache: SubscriberCache | None = None, password_hasher: PasswordHasher | None = None) -> None:
+        self.subscriber_cache: SubscriberCache | None = subscriber_cache
+        self.password_hasher: PasswordHasher = password_hasher or default_password_hasher()
+
+    @abstractmethod
+    async def _insert_documents(self, table_or_collection: str, documents: list[dict]) -> list[dict]:
+        """Store the documents, assigning an ObjectId `_id` to those without one, and return them as stored."""
+
+    @abstractmethod
+    async def _find_documents(
+        self, table_or_collection: str, query_dict: dict, sort: list[tuple[str, int]] | None = None, limit: int | None = None
+    ) -> list[dict]:
+        """Documents matching the query sorted on (field, 1 | -1) pairs, hand them out through `_read` as they may be the stored ones."""
+
+    @abstractmethod
+    async def _find_one_and_update(
+        self, table_or_collection: str, query_dict: dict, update: dict, return_updated: bool, upsert: bool = False
+    ) -> dict | None:
+        """
+        Atomically update the first matching document, returns a copy from before or after the update.
+
+        With `upsert` and no match the query's equality conditions with the update applied are inserted, like MongoDB does.
+        """
+
+    @abstractmethod
+    async def _delete_documents(self, table_or_collection: str, query_dict: dict) -> int:
+        """Delete every matching document, returns how many were deleted."""
+
+    @abstractmethod
+    async def _move_documents(self, source: str, target: str, query_dict: dict, limit: int | None = None) -> list[dict]:
+        """Atomically move up to `limit` matching documents with their `_id` from source to target, returns the moved documents."""
+
+    def _read(self, document: dict, projection: dict | None = None) -> dict:
+        return apply_projection(document, projection)
+
+    def _invalidate_subscriber(self, subscriber: dict | None) -> None:
+        if self.subscriber_cache and subscriber:
+            self.subscriber_cache.invalidate(subscriber.get("email"))
+
+    async def create(self, table_or_collection: str, data_model: BaseModel, pydantic_return_model: Type[BaseModel]) -> BaseModel:
+        documents: list[dict] = await self._insert_documents(table_or_collection, [data_model.model_dump()])
+        # data_model was validated on creation, echo it back without validating it a second time
+        return pydantic_return_model.model_construct(**dict(data_model), id=str(documents[0]["_id"]))
+
+    async def create_many(self, table_or_collection: str, data_models: list[BaseModel]) -> None:
+        if data_models:
+            await self._insert_documents(table_or_collection, [data_model.model_dump() for data_model in data_models])
+
+    async def find(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> list[BaseModel | dict | DocumentView]:
+        documents: list[dict] = await self._find_documents(table_or_collection, to_bson_value(query_dict))
+        return [convert_document(self._read(doc, projection), pydantic_return_model, return_mode) for doc in documents]
+
+    async def find_one(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> BaseModel | dict | DocumentView | None:
+        documents: list[dict] = await self._find_documents(table_or_collection, to_bson_value(query_dict), limit=1)
+        if documents:
+            return convert_document(self._read(documents[0], projection), pydantic_return_model, return_mode)
+
+    async def update_one(
+        self, table_or_collection: str, query_dict: dict, update_dict: dict, pydantic_return_model: Type[BaseModel]
+    ) -> BaseModel | None:
+        result: dict | None = await self._find_one_and_update(table_or_collection, to_bson_value(query_dict), {"$set": update_dict}, True)
+        if table_or_collection == "subscribers":
+            self._invalidate_subscriber(result)
+        return pydantic_return_model.model_validate(result) if result else None
+
+    # TIME_SLOTS
+    async def find_notified_time_slot_ids(self, exam_center_id: int, license_type: str) -> set[int]:
+        documents: list[dict] = await self._find_documents(
+            "slots", {"status": "notified", "exam_center_id": exam_center_id, "types_blob": {"$in": [license_type]}}
+        )
+        return {slot["exam_id"] for slot in documents}
+
+    async def update_time_slot_status(self, sbat_exam_id: int, status: str) -> ExamTimeSlotRead | None:
+        update_fields: dict[str, Any] = {"status": status}
+        if status == "taken":
+            update_fields["taken_at"] = datetime.now(UTC)
+        if status == "notified":
+            update_fields["found_at"] = datetime.now(UTC)
+
+        time_slot: dict | None = await self._find_one_and_update("slots", {"exam_id": sbat_exam_id}, {"$set": update_fields}, True)
+        return ExamTimeSlotRead.model_validate(time_slot) if time_slot else None
+
+    async def find_time_slots_page(
+        self, tier: Literal["slots", "slots_archive"], after_exam_id: int | None, limit: int
+    ) -> list[ExamTimeSlotRead]:
+        query_dict: dict = {"exam_id": {"$gt": after_exam_id}} if after_exam_id is not None else {}
+        documents: list[dict] = await self._find_documents(tier, query_dict, sort=[("exam_id", 1)], limit=limit)
+        return [ExamTimeSlotRead.model_validate(self._read(document)) for document in documents]
+
+    async def archive_time_slots(self, started_before: datetime, taken_before: datetime, batch_size: int = 1000) -> int:
+        archived: int = 0
+        for query_dict in ({"start_time": {"$lt": started_before}}, {"status": "taken", "taken_at": {"$lt": taken_before}}):
+            while True:
+                moved: list[dict] = await self._move_documents("slots", "slots_archive", to_bson_value(query_dict), batch_size)
+                archived += len(moved)
+                if len(moved) < batch_size:
+                    break
+        return archived
+
+    async def restore_archived_time_slots(self, exam_ids: list[int]) -> set[int]:
+        moved: list[dict] = await self._move_documents("slots_archive", "slots", {"exam_id": {"$in": exam_ids}})
+        return {time_slot["exam_id"] for time_slot in moved}
+
+    async def record_slot_events(self, events: list[SlotEvent]) -> None:
+        for query_dict, update in slot_stats_updates(events):
+            await self._find_one_and_update("slot_stats", to_bson_value(query_dict), update, True, upsert=True)
+
+    # SBAT TOKENS AND REQUESTS
+    async def find_sbat_token(self, username: str) -> SbatTokenRead | None:
+        documents: list[dict] = await self._find_documents("sbat_tokens", {"username": username}, limit=1)
+        return SbatTokenRead.model_validate(self._read(documents[0])) if documents else None
+
+    async def save_sbat_token(self, token: SbatTokenCreate) -> None:
+        await self._find_one_and_update("sbat_tokens", {"username": token.username}, {"$set": token.model_dump()}, True, upsert=True)
+
+    async def delete_expired_sbat_requests(self, now: datetime) -> int:
+        return await self._delete_documents("requests", to_bson_value({"expires_at": {"$lt": now}}))
+
+    # SUBSCRIBERS
+    async def create_subscriber(self, subscriber: SubscriberCreate) -> SubscriberRead:
+        subscriber.email = subscriber.email.lower()
+        if await self._find_documents("subscribers", {"email": subscriber.email}, limit=1):
+            raise Exception("Email already subscribed")  # pylint: disable=broad-exception-raised
+
+        hashed_password: str = await self.password_hasher.hash(subscriber.password)
+        documents: list[dict] = await self._insert_documents(
+            "subscribers", [{**subscriber.model_dump(exclude="password"), "hashed_password": hashed_password}]
+        )
+        return SubscriberRead.model_validate({"_id": documents[0]["_id"], "hashed_password": hashed_password, **subscriber.model_dump()})
+
+    async def verify_subscriber_credentials(self, username: str, password: str) -> SubscriberRead | None:
+        documents: list[dict] = await self._find_documents("subscribers", {"email": username.lower()}, limit=1)
+        if not documents:
+            return
+        subscriber: dict = self._read(documents[0])
+
+        verified, new_hashed_password = await self.password_hasher.verify_and_update(password, subscriber.get("hashed_password"))
+        if not verified:
+            return
+
+        if new_hashed_password:
+            subscriber = await self._find_one_and_update(
+                "subscribers", {"_id": subscriber["_id"]}, {"$set": {"hashed_password": new_hashed_password}}, True
+            )
+            self._invalidate_subscriber(subscriber)
+        return SubscriberRead.model_validate(subscriber)
+
+    async def find_subscriber_by_telegram_user_id(
+        self, telegram_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
+        return await self.find_one("subscribers", {"telegram_user.id": telegram_user_id}, SubscriberRead, projection, return_mode)
+
+    async def find_subscriber_by_discord_user_id(
+        self, discord_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
+        return await self.find_one("subscribers", {"discord_user.id": discord_user_id}, SubscriberRead, projection, return_mode)
+
+    async def find_all_subscribed_emails(self, exam_center_id: int, license_type: str) -> set[str]:
+        documents: list[dict] = await self._find_documents(
+            "subscribers",
+            {
+                "is_subscription_active": True,
+                "wants_emails": True,
+                "monitoring_preferences.exam_center_ids": exam_center_id,
+                "monitoring_preferences.license_types": license_type,
+            },
+        )
+        return {subscriber["email"] for subscriber in documents}
+
+    async def find_all_subscribed_telegram_ids(self, exam_center_id: int, license_type: str) -> set[int]:
+        documents: list[dict] = await self._find_documents(
+            "subscribers",
+            {
+                "is_subscription_active": True,
+                "monitoring_preferences.exam_center_ids": exam_center_id,
+                "monitoring_preferences.license_types": license_type,
+            },
+        )
+        return {subscriber.get("telegram_user").get("id") for subscriber in documents if subscriber.get("telegram_user", {}).get("id")}
+
+    async def activate_subscriber_subscription(self, stripe_customer_id: str, amount_paid: int) -> SubscriberRead | None:
+        subscriber: dict | None = await self._find_one_and_update(
+            "subscribers",
+            {"stripe_customer_id": stripe_customer_id},
+            {"$set": {"is_subscription_active": True}, "$inc": {"total_spent": amount_paid}},
+            False,
+        )
+        self._invalidate_subscriber(subscriber)
+        return SubscriberRead.model_validate(subscriber) if subscriber else None
+
+    async def process_checkout_session(self, session: dict) -> SubscriberRead:
+        sub_id: str = session.get("subscription")
+        amount_total: int = session.get("amount_total")
+        client_reference_id: str = session.get("client_reference_id")
+        stripe_customer_id: str = session.get("customer")
+
+        # read without popping, a retry or a redelivery of the event hands in the same session again
+        customer_details: dict = session.get("customer_details", {})
+        name: str = customer_details["name"]
+        email: str = customer_details["email"]
+        phone: str = customer_details["phone"]
+        extra_details: dict = {key: value for key, value in customer_details.items() if key not in ("name", "email", "phone")}
+
+        # an unknown client reference becomes the id of the inserted subscriber, without one the Stripe customer is
+        # looked up, so processing the session again updates the subscriber that was inserted the first time
+        lookup: dict | None = {"_id": ObjectId(client_reference_id)} if client_reference_id else None
+        if not lookup and stripe_customer_id:
+            lookup = {"stripe_customer_id": stripe_customer_id}
+        existing_users: list[dict] = await self._find_documents("subscribers", lookup, limit=1) if lookup else []
+        if existing_users:
+            valid: SubscriberRead = SubscriberRead.model_validate(self._read(existing_users[0]))
+            if sub_id not in valid.stripe_ids:
+                valid.stripe_ids.append(sub_id)
+
+            updated_valid: dict = await self._find_one_and_update(
+                "subscribers",
+                {"_id": existing_users[0]["_id"]},
+                {
+                    "$set": {
+                        "stripe_ids": valid.stripe_ids,
+                        "phone": phone,
+                        "name": name,
+                        "extra_details": extra_details,
+                        "stripe_customer_id": stripe_customer_id,
+                        "is_subscription_active": True,
+                    }
+                },
+                True,
+            )
+            self._invalidate_subscriber(updated_valid)
+            return SubscriberRead.model_validate(updated_valid)
+
+        valid = SubscriberCreate(
+            stripe_ids=[sub_id],
+            stripe_customer_id=stripe_customer_id,
+            is_subscription_active=True,
+            name=name,
+            email=email,
+            phone=phone,
+            total_spent=amount_total,
+            extra_details=extra_details,
+            password="",
+        )
+        document: dict = {**valid.model_dump(exclude="password"), "hashed_password": ""}
+        if client_reference_id:
+            document["_id"] = ObjectId(client_reference_id)
+        documents: list[dict] = await self._insert_documents("subscribers", [document])
+        return SubscriberRead(_id=documents[0]["_id"], hashed_password="", **valid.model_dump())
+
+    async def create_stripe_event(self, stripe_event: dict) -> str | None:
+        fields: dict = {key: value for key, value in stripe_event.items() if key != "id"}
+        stored: dict | None = await self._find_one_and_update(
+            "stripe_events", {"id": stripe_event["id"]}, {"$setOnInsert": {**fields, "processing_status": "pending"}}, False, upsert=True
+        )
+        return stored.get("processing_status", "processed") if stored else None
+
+    async def find_unprocessed_stripe_events(self) -> list[dict]:
+        documents: list[dict] = await self._find_documents("stripe_events", {"processing_status": "pending"}, sort=[("created", 1)])
+        return [self._read(document) for document in documents]
+
+    async def mark_stripe_event_processed(self, stripe_event_id: str) -> None:
+        await self._find_one_and_update(
+            "stripe_events", {"id": stripe_event_id}, {"$set": {"processing_status": "processed", "processed_at": datetime.now(UTC)}}, True
+        )
+
+    async def create_telegram_event(self, telegram_event: dict) -> bool:
+        if await self._find_documents("telegram_events", {"update_id": telegram_event.get("update_id")}, limit=1):
+            return False
+        await self._insert_documents("telegram_events", [telegram_event])
+        return True
+
+    async def create_discord_event(self, discord_event: dict) -> None:
+        if not await self._find_documents("discord_events", {"token": discord_event.get("token")}, limit=1):
+            await self._insert_documents("discord_events", [discord_event])
+
+    # NOTIFICATION RECEIPTS
+    async def delete_expired_notification_receipts(self, now: datetime) -> int:
+        return await self._delete_documents("notification_receipts", to_bson_value({"expires_at": {"$lt": now}}))
+
+    # SERVER RESPONSE TIMES
+    async def add_server_response_time(self, sample: ServerResponseTimeCreate, ttl: timedelta) -> None:
+        await self._insert_documents("server_response_times", [sample.model_dump()])
+        await self.record_server_response_time_rollups([sample], ttl)
+
+    async def record_server_response_time_rollups(self, samples: list[ServerResponseTimeBase], ttl: timedelta) -> None:
+        for sample in samples:
+            for query_dict, update in rollup_updates(sample, ttl):
+                await self._find_one_and_update("server_response_time_rollups", to_bson_value(query_dict), update, True, upsert=True)
+
+    async def find_server_response_times_page(self, after_id: str | None, limit: int) -> list[ServerResponseTimeRead]:
+        query_dict: dict = {"_id": {"$gt": ObjectId(after_id)}} if after_id is not None else {}
+        documents: list[dict] = await self._find_documents("server_response_times", query_dict, sort=[("_id", 1)], limit=limit)
+        return [ServerResponseTimeRead.model_validate(self._read(document)) for document in documents]
+
+    async def delete_expired_server_response_times(self, now: datetime, ttl: timedelta) -> int:
+        samples: int = 0
+        # samples from before the rollups existed are kept until the backfill folded them into the hour rollups
+        if await self.server_response_time_rollups_cover_samples():
+            samples = await self._delete_documents("server_response_times", to_bson_value({"start": {"$lt": now - ttl}}))
+        rollups: int = await self._delete_documents("server_response_time_rollups", to_bson_value({"expires_at": {"$lt": now}}))
+        return samples + rollups
+
+    async def ping(self) -> None:
+        # goes through the same primitive, and for SQLite the same worker thread, as every other query
+        await self._find_documents("requests", {"_id": ObjectId()}, limit=1)
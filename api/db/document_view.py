@@ -0,0 +1,67 @@
+from collections.abc import Mapping
+from enum import Enum
+from typing import Any, Iterator, Type
+
+from pydantic import BaseModel
+
+
+class ReturnMode(str, Enum):
+    MODEL = "model"
+    DICT = "dict"
+    VIEW = "view"
+
+
+class DocumentView(Mapping):
+    """
+    Read-only attribute access over a raw document, without any Pydantic validation.
+
+    A field of the document always wins over an attribute of the view, so a `keys`, `get` or `items` field
+    reads as the field. Names that are neither a field nor an attribute raise AttributeError.
+    """
+
+    __slots__ = ("_document",)
+
+    def __init__(self, document: dict) -> None:
+        object.__setattr__(self, "_document", document)
+
+    @staticmethod
+    def _wrap(value: Any) -> Any:
+        if isinstance(value, dict):
+            return DocumentView(value)
+        if isinstance(value, list):
+            return tuple(DocumentView._wrap(item) for item in value)
+        return value
+
+    @property
+    def id(self) -> str:
+        return str(self._document["_id"])
+
+    def __getattribute__(self, name: str) -> Any:
+        if not name.startswith("_"):
+            document: dict = object.__getattribute__(self, "_document")
+            if name in document:
+                return DocumentView._wrap(document[name])
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("DocumentView is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._wrap(self._document[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._document)
+
+    def __len__(self) -> int:
+        return len(self._document)
+
+    def __repr__(self) -> str:
+        return f"DocumentView({self._document!r})"
+
+
+def convert_document(document: dict, pydantic_return_model: Type[BaseModel], return_mode: ReturnMode) -> BaseModel | dict | DocumentView:
+    if return_mode == ReturnMode.DICT:
+        return document
+    if return_mode == ReturnMode.VIEW:
+        return DocumentView(document)
+    return pydantic_return_model.model_validate(document)
@@ -0,0 +1,195 @@
+import copy
+from itertools import count
+from typing import Any, Hashable, Iterator
+
+from bson import ObjectId
+
+from ..cache import SubscriberCache
+from .document_query import (
+    apply_projection,
+    apply_update,
+    is_operator_dict,
+    matches,
+    new_document,
+    resolve_path,
+    sort_key,
+    upserted_document,
+)
+from .document_repo import DocumentRepository
+from .password_hasher import PasswordHasher
+
+# fields with a hash index per collection, queries on other fields scan the collection
+INDEXED_FIELDS: dict[str, tuple[str, ...]] = {
+    "slots": ("exam_id", "exam_center_id", "status"),
+    "slots_archive": ("exam_id", "exam_center_id"),
+    "subscribers": (
+        "email",
+        "stripe_customer_id",
+        "verification_token",
+        "telegram_user.id",
+        "discord_user.id",
+        "monitoring_preferences.exam_center_ids",
+    ),
+    "requests": ("request_type",),
+    "sbat_tokens": ("username",),
+    "stripe_events": ("id", "processing_status"),
+    "telegram_events": ("update_id",),
+    "discord_events": ("token",),
+    "slot_stats": ("key",),
+    "server_response_time_rollups": ("bucket_start",),
+}
+
+
+class Collection:
+    """Documents by _id in insertion order plus hash indexes on the fields in `INDEXED_FIELDS`."""
+
+    def __init__(self, indexed_fields: tuple[str, ...]) -> None:
+        self.documents: dict[ObjectId, dict] = {}
+        self.indexes: dict[str, dict[Hashable, set[ObjectId]]] = {field: {} for field in indexed_fields}
+        self._order: dict[ObjectId, int] = {}
+        self._sequence: Iterator[int] = count()
+
+    @staticmethod
+    def _index_keys(document: dict, field: str) -> set[Hashable]:
+        keys: set[Hashable] = set()
+        for value in resolve_path(document, field):
+            for key in value if isinstance(value, list) else (value,):
+                try:
+                    hash(key)
+                except TypeError:
+                    continue
+                keys.add(key)
+        return keys
+
+    def _add_to_indexes(self, document: dict) -> None:
+        for field, index in self.indexes.items():
+            for key in self._index_keys(document, field):
+                index.setdefault(key, set()).add(document["_id"])
+
+    def _remove_from_indexes(self, document: dict) -> None:
+        for field, index in self.indexes.items():
+            for key in self._index_keys(document, field):
+                ids: set[ObjectId] = index.get(key, set())
+                ids.discard(document["_id"])
+                if not ids:
+                    index.pop(key, None)
+
+    def insert(self, document: dict) -> None:
+        self.documents[document["_id"]] = document
+        self._order[document["_id"]] = next(self._sequence)
+        self._add_to_indexes(document)
+
+    def delete(self, document: dict) -> None:
+        self._remove_from_indexes(document)
+        del self.documents[document["_id"]]
+        del self._order[document["_id"]]
+
+    def update(self, document: dict, update: dict) -> None:
+        self._remove_from_indexes(document)
+        apply_update(document, update)
+        self._add_to_indexes(document)
+
+    def _index_candidates(self, field: str, expected: Any) -> set[ObjectId] | None:
+        if field == "_id" and not is_operator_dict(expected):
+            return {expected} if expected in self.documents else set()
+        index: dict[Hashable, set[ObjectId]] | None = self.indexes.get(field)
+        if index is None:
+            return None
+        if is_operator_dict(expected):
+            if "$in" not in expected or None in expected["$in"]:
+                return None
+            options: list = expected["$in"]
+        elif expected is None or isinstance(expected, (dict, list)):
+            return None
+        else:
+            options = [expected]
+
+        ids: set[ObjectId] = set()
+        for option in options:
+            try:
+                ids |= index.get(option, set())
+            except TypeError:
+                return None
+        return ids
+
+    def scan(self, query: dict) -> list[dict]:
+        """Matching documents in insertion order, narrowed down with the most selective usable index."""
+        candidates: set[ObjectId] | None = None
+        for field, expected in query.items():
+            if field.startswith("$"):
+                continue
+            ids: set[ObjectId] | None = self._index_candidates(field, expected)
+            if ids is not None and (candidates is None or len(ids) < len(candidates)):
+                candidates = ids
+
+        if candidates is None:
+            documents: Iterator[dict] = iter(self.documents.values())
+        else:
+            documents = (self.documents[_id] for _id in sorted(candidates, key=self._order.__getitem__))
+        return [document for document in documents if matches(document, query)]
+
+
+class InMemoryRepository(DocumentRepository):
+    """
+    Keeps every collection in process memory, for tests and as a zero-latency baseline in benchmarks.
+
+    Stored values are normalized like a BSON round trip and reads return copies, so callers see the
+    same documents MongoRepository would return.
+    """
+
+    def __init__(self, subscriber_cache: SubscriberCache | None = None, password_hasher: PasswordHasher | None = None) -> None:
+        super().__init__(subscriber_cache, password_hasher)
+        self.collections: dict[str, Collection] = {}
+
+    def _collection(self, name: str) -> Collection:
+        if name not in self.collections:
+            self.collections[name] = Collection(INDEXED_FIELDS.get(name, ()))
+        return self.collections[name]
+
+    def _read(self, document: dict, projection: dict | None = None) -> dict:
+        return copy.deepcopy(apply_projection(document, projection))
+
+    async def _insert_documents(self, table_or_collection: str, documents: list[dict]) -> list[dict]:
+        collection: Collection = self._collection(table_or_collection)
+        stored: list[dict] = [new_document(data) for data in documents]
+        for document in stored:
+            collection.insert(document)
+        return stored
+
+    async def _find_documents(
+        self, table_or_collection: str, query_dict: dict, sort: list[tuple[str, int]] | None = None, limit: int | None = None
+    ) -> list[dict]:
+        documents: list[dict] = self._collection(table_or_collection).scan(query_dict)
+        for field, direction in reversed(sort or []):
+            documents.sort(key=sort_key(field), reverse=direction < 0)
+        return documents[:limit] if limit is not None else documents
+
+    async def _find_one_and_update(
+        self, table_or_collection: str, query_dict: dict, update: dict, return_updated: bool, upsert: bool = False
+    ) -> dict | None:
+        documents: list[dict] = await self._find_documents(table_or_collection, query_dict, limit=1)
+        if not documents:
+            if not upsert:
+                return None
+            document: dict = upserted_document(query_dict, update)
+            self._collection(table_or_collection).insert(document)
+            return copy.deepcopy(document) if return_updated else None
+        before: dict = copy.deepcopy(documents[0])
+        self._collection(table_or_collection).update(documents[0], update)
+        return copy.deepcopy(documents[0]) if return_updated else before
+
+    async def _delete_documents(self, table_or_collection: str, query_dict: dict) -> int:
+        collection: Collection = self._collection(table_or_collection)
+        documents: list[dict] = collection.scan(query_dict)
+        for document in documents:
+            collection.delete(document)
+        return len(documents)
+
+    async def _move_documents(self, source: str, target: str, query_dict: dict, limit: int | None = None) -> list[dict]:
+        source_collection: Collection = self._collection(source)
+        target_collection: Collection = self._collection(target)
+        documents: list[dict] = source_collection.scan(query_dict)[:limit]
+        for document in documents:
+            source_collection.delete(document)
+            target_collection.insert(document)
+        return copy.deepcopy(documents)
@@ -0,0 +1,73 @@
+"""
+Imports the MongoDB collections into a SQLite database for the `sqlite` database backend.
+
+    python -m api.db.migrate_mongo_to_sqlite --database-url mongodb://localhost:27017 --sqlite-path rijexamen-meldingen.db
+
+Documents keep their `_id` and existing rows are replaced, so the import can be re-run to catch up before switching
+`DATABASE_BACKEND` to `sqlite`. Exits non-zero when a table ends up with a different count than its collection.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from .sqlite_repo import SqliteRepository
+
+
+async def migrate_collection(mongo_db: AsyncIOMotorDatabase, repo: SqliteRepository, name: str, batch_size: int) -> tuple[int, int]:
+    """Copies one collection in batches, returns the MongoDB and SQLite document counts afterwards."""
+    imported: int = 0
+    batch: list[dict] = []
+    async for document in mongo_db[name].find({}, batch_size=batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            imported += await repo.import_documents(name, batch)
+            batch = []
+            print(f"{name}: {imported} documents imported")
+    if batch:
+        imported += await repo.import_documents(name, batch)
+
+    return await mongo_db[name].count_documents({}), await repo.count(name)
+
+
+async def migrate(args: argparse.Namespace) -> bool:
+    client: AsyncIOMotorClient = AsyncIOMotorClient(args.database_url)
+    repo = SqliteRepository(args.sqlite_path)
+    try:
+        mongo_db: AsyncIOMotorDatabase = client[args.database_name]
+        names: list[str] = args.collections or sorted(
+            name for name in await mongo_db.list_collection_names() if not name.startswith("system.")
+        )
+
+        consistent: bool = True
+        for name in names:
+            mongo_count, sqlite_count = await migrate_collection(mongo_db, repo, name, args.batch_size)
+            print(f"{name}: {mongo_count} documents in MongoDB, {sqlite_count} rows in SQLite")
+            consistent = consistent and mongo_count == sqlite_count
+        return consistent
+    finally:
+        repo.close()
+        client.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database-name", default="rijexamen-meldingen")
+    parser.add_argument("--sqlite-path", default=os.environ.get("SQLITE_PATH", "rijexamen-meldingen.db"))
+    parser.add_argument("--collections", nargs="+", help="collections to import, all of them by default")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    return parser.parse_args()
+
+
+def main() -> None:
+    if not asyncio.run(migrate(parse_args())):
+        print("Document counts differ between MongoDB and SQLite", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
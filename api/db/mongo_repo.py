@@ -1,36 +1,74 @@
-from datetime import UTC, datetime
-from typing import Type
+from datetime import UTC, datetime, timedelta
+from typing import Literal, Type
 
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
-from passlib.context import CryptContext
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorCursor, AsyncIOMotorDatabase
 from pydantic import BaseModel
-from pymongo import DESCENDING
-from pymongo.results import InsertOneResult
+from pymongo import ASCENDING, DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+from pymongo.results import DeleteResult, InsertOneResult
 
-from ..models.sbat import ExamTimeSlotRead, SbatRequestRead
+from ..models.sbat import (
+    ExamTimeSlotRead,
+    SbatTokenCreate,
+    SbatTokenRead,
+    ServerResponseTimeBase,
+    ServerResponseTimeCreate,
+    ServerResponseTimeRead,
+    SlotEvent,
+)
+from ..cache import SubscriberCache
 from ..models.subscriber import SubscriberCreate, SubscriberRead
 from .base_repo import BaseRepository
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .document_view import DocumentView, ReturnMode, convert_document
+from .password_hasher import PasswordHasher, default_password_hasher
+from .response_time_rollups import rollup_updates
+from .slot_stats import slot_stats_updates
 
 
 class MongoRepository(BaseRepository):
-    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+    def __init__(
+        self, db: AsyncIOMotorDatabase, subscriber_cache: SubscriberCache | None = None, password_hasher: PasswordHasher | None = None
+    ) -> None:
         self.db: AsyncIOMotorDatabase = db
+        self.subscriber_cache: SubscriberCache | None = subscriber_cache
+        self.password_hasher: PasswordHasher = password_hasher or default_password_hasher()
+
+    def _invalidate_subscriber(self, subscriber: dict | None) -> None:
+        if self.subscriber_cache and subscriber:
+            self.subscriber_cache.invalidate(subscriber.get("email"))
 
     async def create(self, table_or_collection: str, data_model: BaseModel, pydantic_return_model: Type[BaseModel]) -> BaseModel:
         result: InsertOneResult = await self.db[table_or_collection].insert_one(data_model.model_dump())
-        return pydantic_return_model.model_validate({"_id": result.inserted_id, **data_model.model_dump()})
+        # data_model was validated on creation, echo it back without validating it a second time
+        return pydantic_return_model.model_construct(**dict(data_model), id=str(result.inserted_id))
 
-    async def find(self, table_or_collection: str, query_dict: dict, pydantic_return_model: BaseModel) -> list[BaseModel]:
-        results: list = await self.db[table_or_collection].find(query_dict).to_list(None)
-        return [pydantic_return_model.model_validate(doc) for doc in results]
+    async def create_many(self, table_or_collection: str, data_models: list[BaseModel]) -> None:
+        if data_models:
+            await self.db[table_or_collection].insert_many([data_model.model_dump() for data_model in data_models])
 
-    async def find_one(self, table_or_collection: str, query_dict: dict, pydantic_return_model: BaseModel) -> BaseModel | None:
-        doc: dict | None = await self.db[table_or_collection].find_one(query_dict)
+    async def find(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> list[BaseModel | dict | DocumentView]:
+        results: list = await self.db[table_or_collection].find(query_dict, projection).to_list(None)
+        return [convert_document(doc, pydantic_return_model, return_mode) for doc in results]
+
+    async def find_one(
+        self,
+        table_or_collection: str,
+        query_dict: dict,
+        pydantic_return_model: Type[BaseModel],
+        projection: dict | None = None,
+        return_mode: ReturnMode = ReturnMode.MODEL,
+    ) -> BaseModel | dict | DocumentView | None:
+        doc: dict | None = await self.db[table_or_collection].find_one(query_dict, projection)
         if doc:
-            return pydantic_return_model.model_validate(doc)
+            return convert_document(doc, pydantic_return_model, return_mode)
 
     async def update_one(
         self, table_or_collection: str, query_dict: dict, update_dict: dict, pydantic_return_model: Type[BaseModel]
@@ -40,12 +78,14 @@ class MongoRepository(BaseRepository):
             {"$set": update_dict},
             return_document=True,
         )
+        if table_or_collection == "subscribers":
+            self._invalidate_subscriber(result)
         return pydantic_return_model.model_validate(result) if result else None
 
     # TIME_SLOTS
     async def find_notified_time_slot_ids(self, exam_center_id: int, license_type: str) -> set[int]:
         cursor: AsyncIOMotorCursor = self.db["slots"].find(
-            {"status": "notified", "exam_center_id": exam_center_id, "types_blob": {"$in": [license_type]}}
+            {"status": "notified", "exam_center_id": exam_center_id, "types_blob": {"$in": [license_type]}}, {"exam_id": 1, "_id": 0}
         )
         return {slot["exam_id"] async for slot in cursor}
 
@@ -61,10 +101,59 @@ class MongoRepository(BaseRepository):
         )
         return ExamTimeSlotRead.model_validate(time_slot) if time_slot else None
 
-    # REQUESTS
-    async def find_last_sbat_auth_request(self) -> SbatRequestRead | None:
-        document: dict | None = await self.db["requests"].find_one({"request_type": "authentication"}, sort=[("timestamp", DESCENDING)])
-        return SbatRequestRead.model_validate(document) if document else None
+    async def _move_time_slots(self, source: str, target: str, query_dict: dict, limit: int | None = None) -> list[dict]:
+        cursor: AsyncIOMotorCursor = self.db[source].find(query_dict)
+        documents: list[dict] = await (cursor.limit(limit) if limit else cursor).to_list(None)
+        if documents:
+            # replacing by _id makes a move that stopped between the two writes safe to repeat
+            await self.db[target].bulk_write([ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents], ordered=False)
+            # only the documents still as they were read leave the source, one the poller updated in the meantime
+            # stays where it is and its stale copy is taken out of the target again
+            await self.db[source].bulk_write([DeleteOne(document) for document in documents], ordered=False)
+            ids: list[ObjectId] = [document["_id"] for document in documents]
+            changed: set[ObjectId] = {document["_id"] for document in await self.db[source].find({"_id": {"$in": ids}}, {"_id": 1}).to_list(None)}
+            if changed:
+                await self.db[target].delete_many({"_id": {"$in": list(changed)}})
+                documents = [document for document in documents if document["_id"] not in changed]
+        return documents
+
+    async def find_time_slots_page(
+        self, tier: Literal["slots", "slots_archive"], after_exam_id: int | None, limit: int
+    ) -> list[ExamTimeSlotRead]:
+        query_dict: dict = {"exam_id": {"$gt": after_exam_id}} if after_exam_id is not None else {}
+        cursor: AsyncIOMotorCursor = self.db[tier].find(query_dict, sort=[("exam_id", ASCENDING)], limit=limit)
+        return [ExamTimeSlotRead.model_validate(document) for document in await cursor.to_list(None)]
+
+    async def archive_time_slots(self, started_before: datetime, taken_before: datetime, batch_size: int = 1000) -> int:
+        archived: int = 0
+        for query_dict in ({"start_time": {"$lt": started_before}}, {"status": "taken", "taken_at": {"$lt": taken_before}}):
+            while True:
+                moved: list[dict] = await self._move_time_slots("slots", "slots_archive", query_dict, batch_size)
+                archived += len(moved)
+                if len(moved) < batch_size:
+                    break
+        return archived
+
+    async def restore_archived_time_slots(self, exam_ids: list[int]) -> set[int]:
+        moved: list[dict] = await self._move_time_slots("slots_archive", "slots", {"exam_id": {"$in": exam_ids}})
+        return {time_slot["exam_id"] for time_slot in moved}
+
+    async def record_slot_events(self, events: list[SlotEvent]) -> None:
+        updates: list[tuple[dict, dict]] = slot_stats_updates(events)
+        if updates:
+            await self.db["slot_stats"].bulk_write([UpdateOne(query_dict, update, upsert=True) for query_dict, update in updates], ordered=False)
+
+    # SBAT TOKENS AND REQUESTS
+    async def find_sbat_token(self, username: str) -> SbatTokenRead | None:
+        document: dict | None = await self.db["sbat_tokens"].find_one({"username": username})
+        return SbatTokenRead.model_validate(document) if document else None
+
+    async def save_sbat_token(self, token: SbatTokenCreate) -> None:
+        await self.db["sbat_tokens"].update_one({"username": token.username}, {"$set": token.model_dump()}, upsert=True)
+
+    async def delete_expired_sbat_requests(self, now: datetime) -> int:
+        result: DeleteResult = await self.db["requests"].delete_many({"expires_at": {"$lt": now}})
+        return result.deleted_count
 
     # SUBSCRIBERS
     async def create_subscriber(self, subscriber: SubscriberCreate) -> SubscriberRead:
@@ -73,7 +162,7 @@ class MongoRepository(BaseRepository):
         if existing_subscriber:
             raise Exception("Email already subscribed")  # pylint: disable=broad-exception-raised
 
-        hashed_password: str = pwd_context.hash(subscriber.password)
+        hashed_password: str = await self.password_hasher.hash(subscriber.password)
         result: InsertOneResult = await self.db["subscribers"].insert_one(
             {**subscriber.model_dump(exclude="password"), "hashed_password": hashed_password}
         )
@@ -81,19 +170,29 @@ class MongoRepository(BaseRepository):
 
     async def verify_subscriber_credentials(self, username: str, password: str) -> SubscriberRead | None:
         subscriber: dict | None = await self.db["subscribers"].find_one({"email": username.lower()})
-        if not subscriber or not pwd_context.verify(password, subscriber.get("hashed_password")):
+        if not subscriber:
+            return
+
+        verified, new_hashed_password = await self.password_hasher.verify_and_update(password, subscriber.get("hashed_password"))
+        if not verified:
             return
+
+        if new_hashed_password:
+            subscriber = await self.db["subscribers"].find_one_and_update(
+                {"_id": subscriber["_id"]}, {"$set": {"hashed_password": new_hashed_password}}, return_document=True
+            )
+            self._invalidate_subscriber(subscriber)
         return SubscriberRead.model_validate(subscriber)
 
-    async def find_subscriber_by_telegram_user_id(self, telegram_user_id: int) -> SubscriberRead | None:
-        subscriber: dict | None = await self.db["subscribers"].find_one({"telegram_user.id": telegram_user_id})
-        if subscriber:
-            return SubscriberRead.model_validate(subscriber)
+    async def find_subscriber_by_telegram_user_id(
+        self, telegram_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
+        return await self.find_one("subscribers", {"telegram_user.id": telegram_user_id}, SubscriberRead, projection, return_mode)
 
-    async def find_subscriber_by_discord_user_id(self, discord_user_id: int) -> SubscriberRead | None:
-        subscriber: dict | None = await self.db["subscribers"].find_one({"discord_user.id": discord_user_id})
-        if subscriber:
-            return SubscriberRead.model_validate(subscriber)
+    async def find_subscriber_by_discord_user_id(
+        self, discord_user_id: int, projection: dict | None = None, return_mode: ReturnMode = ReturnMode.MODEL
+    ) -> SubscriberRead | dict | DocumentView | None:
+        return await self.find_one("subscribers", {"discord_user.id": discord_user_id}, SubscriberRead, projection, return_mode)
 
     async def find_all_subscribed_emails(self, exam_center_id: int, license_type: str) -> set[str]:
         cursor: AsyncIOMotorCursor = self.db["subscribers"].find(
@@ -123,6 +222,7 @@ class MongoRepository(BaseRepository):
             {"stripe_customer_id": stripe_customer_id},
             {"$set": {"is_subscription_active": True}, "$inc": {"total_spent": amount_paid}},
         )
+        self._invalidate_subscriber(subscriber)
         return SubscriberRead.model_validate(subscriber) if subscriber else None
 
     async def process_checkout_session(self, session: dict) -> SubscriberRead:
@@ -131,12 +231,19 @@ class MongoRepository(BaseRepository):
         client_reference_id: str = session.get("client_reference_id")
         stripe_customer_id: str = session.get("customer")
 
+        # read without popping, a retry or a redelivery of the event hands in the same session again
         customer_details: dict = session.get("customer_details", {})
-        name: str = customer_details.pop("name")
-        email: str = customer_details.pop("email")
-        phone: str = customer_details.pop("phone")
+        name: str = customer_details["name"]
+        email: str = customer_details["email"]
+        phone: str = customer_details["phone"]
+        extra_details: dict = {key: value for key, value in customer_details.items() if key not in ("name", "email", "phone")}
 
-        existing_user: dict | None = await self.db["subscribers"].find_one({"_id": ObjectId(client_reference_id)})
+        # an unknown client reference becomes the id of the inserted subscriber, without one the Stripe customer is
+        # looked up, so processing the session again updates the subscriber that was inserted the first time
+        lookup: dict | None = {"_id": ObjectId(client_reference_id)} if client_reference_id else None
+        if not lookup and stripe_customer_id:
+            lookup = {"stripe_customer_id": stripe_customer_id}
+        existing_user: dict | None = await self.db["subscribers"].find_one(lookup) if lookup else None
         if existing_user:
             valid: SubscriberRead = SubscriberRead.model_validate(existing_user)
             if sub_id not in valid.stripe_ids:
@@ -149,13 +256,14 @@ class MongoRepository(BaseRepository):
                         "stripe_ids": valid.stripe_ids,
                         "phone": phone,
                         "name": name,
-                        "extra_details": customer_details,
+                        "extra_details": extra_details,
                         "stripe_customer_id": stripe_customer_id,
                         "is_subscription_active": True,
                     }
                 },
                 return_document=True,
             )
+            self._invalidate_subscriber(updated_valid)
             return SubscriberRead.model_validate(updated_valid)
 
         valid = SubscriberCreate(
@@ -166,23 +274,124 @@ class MongoRepository(BaseRepository):
             email=email,
             phone=phone,
             total_spent=amount_total,
-            extra_details=customer_details,
+            extra_details=extra_details,
             password="",
         )
-        result: InsertOneResult = await self.db["subscribers"].insert_one({**valid.model_dump(exclude="password"), "hashed_password": ""})
+        document: dict = {**valid.model_dump(exclude="password"), "hashed_password": ""}
+        if client_reference_id:
+            document["_id"] = ObjectId(client_reference_id)
+        result: InsertOneResult = await self.db["subscribers"].insert_one(document)
         return SubscriberRead(_id=result.inserted_id, hashed_password="", **valid.model_dump())
 
-    async def create_stripe_event(self, stripe_event: dict) -> None:
-        evt: dict | None = await self.db["stripe_events"].find_one({"id": stripe_event["id"]})
-        if not evt:
-            await self.db["stripe_events"].insert_one(stripe_event)
+    async def create_stripe_event(self, stripe_event: dict) -> str | None:
+        # atomic with the unique index on id, the document from before the upsert is None when it inserted
+        fields: dict = {key: value for key, value in stripe_event.items() if key != "id"}
+        stored: dict | None = await self.db["stripe_events"].find_one_and_update(
+            {"id": stripe_event["id"]}, {"$setOnInsert": {**fields, "processing_status": "pending"}}, {"processing_status": 1}, upsert=True
+        )
+        return stored.get("processing_status", "processed") if stored else None
+
+    async def find_unprocessed_stripe_events(self) -> list[dict]:
+        cursor: AsyncIOMotorCursor = self.db["stripe_events"].find({"processing_status": "pending"}, sort=[("created", ASCENDING)])
+        return await cursor.to_list(None)
 
-    async def create_telegram_event(self, telegram_event: dict) -> None:
-        upt: dict | None = await self.db["telegram_events"].find_one({"update_id": telegram_event.get("update_id")})
-        if not upt:
-            await self.db["telegram_events"].insert_one(telegram_event)
+    async def mark_stripe_event_processed(self, stripe_event_id: str) -> None:
+        await self.db["stripe_events"].update_one(
+            {"id": stripe_event_id}, {"$set": {"processing_status": "processed", "processed_at": datetime.now(UTC)}}
+        )
+
+    async def create_telegram_event(self, telegram_event: dict) -> bool:
+        upt: dict | None = await self.db["telegram_events"].find_one({"update_id": telegram_event.get("update_id")}, {"_id": 1})
+        if upt:
+            return False
+        await self.db["telegram_events"].insert_one(telegram_event)
+        return True
 
     async def create_discord_event(self, discord_event: dict) -> None:
-        intr: dict | None = await self.db["discord_events"].find_one({"update_id": discord_event.get("token")})
+        intr: dict | None = await self.db["discord_events"].find_one({"token": discord_event.get("token")}, {"_id": 1})
         if not intr:
             await self.db["discord_events"].insert_one(discord_event)
+
+    # NOTIFICATION RECEIPTS
+    async def delete_expired_notification_receipts(self, now: datetime) -> int:
+        result: DeleteResult = await self.db["notification_receipts"].delete_many({"expires_at": {"$lt": now}})
+        return result.deleted_count
+
+    # SERVER RESPONSE TIMES
+    async def _ensure_response_time_collections(self, ttl: timedelta) -> None:
+        expire_after_seconds: int = int(ttl.total_seconds())
+        if not await self.db.list_collection_names(filter={"name": "server_response_times"}):
+            try:
+                # bucketed storage per request body (center, license, day) with expiry on the sample's start
+                await self.db.create_collection(
+                    "server_response_times",
+                    timeseries={"timeField": "start", "metaField": "request_body", "granularity": "minutes"},
+                    expireAfterSeconds=expire_after_seconds,
+                )
+            except OperationFailure:
+                print("Time series collections need MongoDB 5.0, storing server response times in a regular collection")
+
+        if "timeseries" in await self.db["server_response_times"].options():
+            await self.db.command("collMod", "server_response_times", expireAfterSeconds=expire_after_seconds)
+        elif not await self.server_response_time_rollups_cover_samples():
+            # a regular collection from before the rollups, a TTL index now would delete history the hour rollups lack
+            print(
+                "Not expiring server response times until their history is in the hour rollups, "
+                "run python -m api.db.backfill_response_time_rollups"
+            )
+        else:
+            try:
+                await self.db["server_response_times"].create_index("start", expireAfterSeconds=expire_after_seconds)
+            except OperationFailure:
+                # the TTL index exists with another TTL
+                await self.db.command(
+                    "collMod", "server_response_times", index={"keyPattern": {"start": 1}, "expireAfterSeconds": expire_after_seconds}
+                )
+
+        rollups: AsyncIOMotorCollection = self.db["server_response_time_rollups"]
+        await rollups.create_index(
+            [("exam_center_id", ASCENDING), ("license_type", ASCENDING), ("resolution", ASCENDING), ("bucket_start", ASCENDING)], unique=True
+        )
+        await rollups.create_index([("resolution", ASCENDING), ("bucket_start", ASCENDING)])
+        await rollups.create_index("expires_at", expireAfterSeconds=0)
+
+    async def add_server_response_time(self, sample: ServerResponseTimeCreate, ttl: timedelta) -> None:
+        await self.db["server_response_times"].insert_one(sample.model_dump())
+        await self.record_server_response_time_rollups([sample], ttl)
+
+    async def record_server_response_time_rollups(self, samples: list[ServerResponseTimeBase], ttl: timedelta) -> None:
+        if not samples:
+            return
+        await self.db["server_response_time_rollups"].bulk_write(
+            [UpdateOne(query_dict, update, upsert=True) for sample in samples for query_dict, update in rollup_updates(sample, ttl)],
+            ordered=False,
+        )
+
+    async def find_server_response_times_page(self, after_id: str | None, limit: int) -> list[ServerResponseTimeRead]:
+        query_dict: dict = {"_id": {"$gt": ObjectId(after_id)}} if after_id is not None else {}
+        cursor: AsyncIOMotorCursor = self.db["server_response_times"].find(query_dict, sort=[("_id", ASCENDING)], limit=limit)
+        return [ServerResponseTimeRead.model_validate(document) for document in await cursor.to_list(None)]
+
+    async def delete_expired_server_response_times(self, now: datetime, ttl: timedelta) -> int:
+        # raw samples expire through the collection's TTL, time series collections before MongoDB 7.0 can only
+        # delete on the metaField; the delete below catches up on minute rollups the TTL monitor has not removed yet
+        result: DeleteResult = await self.db["server_response_time_rollups"].delete_many({"expires_at": {"$lt": now}})
+        return result.deleted_count
+
+    async def ensure_indexes(self, server_response_time_ttl: timedelta) -> None:
+        await self.db["slots"].create_index("start_time")
+        await self.db["slots"].create_index("exam_id")
+        await self.db["slots_archive"].create_index("exam_id")
+        await self.db["slots_archive"].create_index([("exam_center_id", ASCENDING), ("start_time", ASCENDING)])
+        await self.db["slot_stats"].create_index([("dimension", ASCENDING), ("key", ASCENDING), ("month", ASCENDING)], unique=True)
+        await self.db["slot_stats"].create_index([("dimension", ASCENDING), ("month", ASCENDING)])
+        await self.db["sbat_tokens"].create_index("username", unique=True)
+        await self.db["stripe_events"].create_index("id", unique=True)
+        # lets MongoDB expire request log rows and receipts on its own as well, the Housekeeper catches up on what
+        # it has not removed yet; request log rows logged before they had an expires_at are kept
+        await self.db["requests"].create_index("expires_at", expireAfterSeconds=0)
+        await self.db["notification_receipts"].create_index("expires_at", expireAfterSeconds=0)
+        await self._ensure_response_time_collections(server_response_time_ttl)
+
+    async def ping(self) -> None:
+        await self.db.command("ping")
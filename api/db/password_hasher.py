@@ -0,0 +1,95 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, TypeVar
+
+from passlib.context import CryptContext
+
+T = TypeVar("T")
+
+MAX_BCRYPT_ROUNDS = 16
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded thread pool so it never blocks the event loop."""
+
+    def __init__(self, max_workers: int = 2, rounds: int = 12, min_rounds: int = 10) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.min_rounds: int = min_rounds
+        self.rounds: int = max(rounds, min_rounds)
+        self.context: CryptContext = self._create_context(self.rounds)
+
+        self.jobs: int = 0
+        self.waiting: int = 0
+        self.queue_time_total: float = 0.0
+        self.queue_time_max: float = 0.0
+
+    @staticmethod
+    def _create_context(rounds: int) -> CryptContext:
+        # min_rounds makes passlib flag weaker hashes for a transparent rehash on the next login
+        return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+    async def _run(self, function: Callable[..., T], *args) -> T:
+        submitted_at: float = time.perf_counter()
+        self.waiting += 1
+        try:
+            async with self.semaphore:
+                queue_time, result = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._timed, submitted_at, function, *args
+                )
+        finally:
+            self.waiting -= 1
+
+        self.jobs += 1
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+        return result
+
+    @staticmethod
+    def _timed(submitted_at: float, function: Callable[..., T], *args) -> tuple[float, T]:
+        return time.perf_counter() - submitted_at, function(*args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str | None) -> tuple[bool, str | None]:
+        """Returns whether the password matches and, if the stored hash is too weak, a replacement hash."""
+        if not hashed_password:
+            return False, None
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    async def calibrate(self, target_ms: float) -> int:
+        """Pick the highest bcrypt cost that hashes within target_ms on this machine (never below min_rounds)."""
+        probe: CryptContext = self._create_context(self.min_rounds)
+        await self._run(probe.hash, "warm-up")  # the first call loads the bcrypt backend
+        started_at: float = time.perf_counter()
+        await self._run(probe.hash, "calibration-password")
+        elapsed_ms: float = (time.perf_counter() - started_at) * 1000
+
+        # every extra round doubles the bcrypt work
+        extra_rounds: int = max(0, math.floor(math.log2(target_ms / elapsed_ms))) if elapsed_ms > 0 else 0
+        self.rounds = min(self.min_rounds + extra_rounds, MAX_BCRYPT_ROUNDS)
+        self.context = self._create_context(self.rounds)
+        print(f"bcrypt calibrated to {self.rounds} rounds ({elapsed_ms:.0f} ms at {self.min_rounds} rounds, target {target_ms} ms)")
+        return self.rounds
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "rounds": self.rounds,
+            "jobs": self.jobs,
+            "waiting": self.waiting,
+            "queue_time_avg_seconds": self.queue_time_total / self.jobs if self.jobs else 0.0,
+            "queue_time_max_seconds": self.queue_time_max,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+@lru_cache
+def default_password_hasher() -> PasswordHasher:
+    """The hasher shared by the repositories built without one, so they don't each start a thread pool."""
+    return PasswordHasher()
@@ -0,0 +1,63 @@
+"""Fold raw SBAT response time samples into per-minute and per-hour rollup documents, the same way on every backend."""
+
+from datetime import UTC, datetime, timedelta
+
+from ..latency_sketch import LatencySketch
+from ..models.sbat import EXAM_CENTER_MAP, ServerResponseTimeBase, ServerResponseTimeStatsRead
+
+ROLLUP_RESOLUTIONS: dict[str, timedelta] = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+
+def bucket_start(at: datetime, width: timedelta) -> datetime:
+    seconds: float = width.total_seconds()
+    # the databases return naive UTC datetimes
+    timestamp: float = (at if at.tzinfo else at.replace(tzinfo=UTC)).timestamp()
+    return datetime.fromtimestamp(timestamp // seconds * seconds, UTC)
+
+
+def rollup_updates(sample: ServerResponseTimeBase, ttl: timedelta) -> list[tuple[dict, dict]]:
+    """(query, update) pairs that upsert the sample into the rollup bucket of every resolution."""
+    duration_ms: float = (sample.end - sample.start).total_seconds() * 1000
+    updates: list[tuple[dict, dict]] = []
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        key: dict = {
+            "exam_center_id": sample.request_body.get("examCenterId"),
+            "license_type": sample.request_body.get("licenseType"),
+            "resolution": resolution,
+            "bucket_start": bucket_start(sample.start, width),
+        }
+        update: dict = {
+            "$inc": {
+                "count": 1,
+                "duration_sum_ms": duration_ms,
+                "response_bytes_sum": sample.response_size,
+                f"sketch.{LatencySketch.index(duration_ms)}": 1,
+            },
+            "$min": {"duration_min_ms": duration_ms},
+            "$max": {"duration_max_ms": duration_ms},
+        }
+        if resolution == "minute":
+            update["$set"] = {"expires_at": key["bucket_start"] + ttl}
+        updates.append((key, update))
+    return updates
+
+
+def rollup_stats(rollup: dict) -> ServerResponseTimeStatsRead:
+    """Count, mean and sketch percentiles of a rollup document, the percentiles clamped to the exact min and max."""
+    sketch: LatencySketch = LatencySketch.from_document(rollup["sketch"])
+    low: float = rollup["duration_min_ms"]
+    high: float = rollup["duration_max_ms"]
+    return ServerResponseTimeStatsRead(
+        exam_center=EXAM_CENTER_MAP.get(rollup["exam_center_id"], str(rollup["exam_center_id"])),
+        license_type=rollup["license_type"],
+        resolution=rollup["resolution"],
+        bucket_start=rollup["bucket_start"],
+        count=rollup["count"],
+        min_ms=low,
+        mean_ms=rollup["duration_sum_ms"] / rollup["count"],
+        p50_ms=min(max(sketch.quantile(0.5), low), high),
+        p90_ms=min(max(sketch.quantile(0.9), low), high),
+        p99_ms=min(max(sketch.quantile(0.99), low), high),
+        max_ms=high,
+        mean_response_bytes=rollup["response_bytes_sum"] / rollup["count"],
+    )
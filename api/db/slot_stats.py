@@ -0,0 +1,63 @@
+"""Fold time slot state changes into monthly per exam center and per driving school aggregates, the same way on every backend."""
+
+from datetime import UTC, datetime
+
+from ..latency_sketch import LatencySketch
+from ..models.sbat import EXAM_CENTER_MAP, SlotEvent, SlotStatsSummaryRead
+
+TIME_TO_TAKE_QUANTILES: dict[str, float] = {"p25": 0.25, "p50": 0.5, "p75": 0.75, "p90": 0.9}
+
+
+def month_start(at: datetime, months_back: int = 0) -> datetime:
+    """First instant of the month of `at` (naive datetimes are UTC, as the databases return them), `months_back` months earlier."""
+    months: int = at.year * 12 + at.month - 1 - months_back
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=UTC)
+
+
+def slot_stats_updates(events: list[SlotEvent]) -> list[tuple[dict, dict]]:
+    """(query, update) pairs that upsert the events into their aggregates, one pair per aggregate touched."""
+    increments: dict[tuple[str, str, datetime], dict[str, float]] = {}
+    for event in events:
+        keys: list[tuple[str, str]] = [("exam_center", EXAM_CENTER_MAP.get(event.exam_center_id, str(event.exam_center_id)))]
+        if event.driving_school:
+            keys.append(("driving_school", event.driving_school))
+        for dimension, key in keys:
+            inc: dict[str, float] = increments.setdefault((dimension, key, month_start(event.at)), {})
+            inc[event.kind] = inc.get(event.kind, 0) + 1
+            if event.kind == "taken" and event.seconds_on_offer is not None:
+                bin_field: str = f"seconds_on_offer_sketch.{LatencySketch.index(event.seconds_on_offer)}"
+                inc["seconds_on_offer_sum"] = inc.get("seconds_on_offer_sum", 0) + event.seconds_on_offer
+                inc[bin_field] = inc.get(bin_field, 0) + 1
+    return [({"dimension": dimension, "key": key, "month": month}, {"$inc": inc}) for (dimension, key, month), inc in increments.items()]
+
+
+def slot_stats_summaries(aggregates: list[dict], by_month: bool) -> list[SlotStatsSummaryRead]:
+    """Rates and time to take percentiles per key, per month or merged over every month of the aggregates."""
+    groups: dict[tuple, list[dict]] = {}
+    for aggregate in aggregates:
+        group: tuple = (aggregate["dimension"], aggregate["key"], aggregate["month"] if by_month else None)
+        groups.setdefault(group, []).append(aggregate)
+
+    summaries: list[SlotStatsSummaryRead] = []
+    for (dimension, key, month), members in sorted(groups.items(), key=lambda item: (item[0][1], item[0][2] or datetime.min)):
+        sketch = LatencySketch()
+        for aggregate in members:
+            sketch.merge(LatencySketch.from_document(aggregate.get("seconds_on_offer_sketch", {})))
+        found: int = sum(aggregate.get("found", 0) for aggregate in members)
+        taken: int = sum(aggregate.get("taken", 0) for aggregate in members)
+        re_released: int = sum(aggregate.get("re_released", 0) for aggregate in members)
+        timed: int = sketch.count
+        summaries.append(
+            SlotStatsSummaryRead(
+                dimension=dimension,
+                key=key,
+                month=month,
+                found=found,
+                taken=taken,
+                re_released=re_released,
+                re_release_rate=re_released / taken if taken else None,
+                time_to_take_mean_seconds=sum(aggregate.get("seconds_on_offer_sum", 0) for aggregate in members) / timed if timed else None,
+                **{f"time_to_take_{name}_seconds": sketch.quantile(q) for name, q in TIME_TO_TAKE_QUANTILES.items()},
+            )
+        )
+    return summaries
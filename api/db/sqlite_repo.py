@@ -0,0 +1,361 @@
+import asyncio
+import base64
+import copy
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Mapping
+
+from bson import ObjectId
+
+from ..cache import SubscriberCache
+from .document_query import apply_update, is_operator_dict, matches, new_document, sort_key, upserted_document
+from .document_repo import DocumentRepository
+from .password_hasher import PasswordHasher
+
+# fields the SQL layer filters and sorts on per table: "scalar" fields compare with json_extract, "array" fields
+# match an element with json_each and "date" fields hold tagged datetimes. Conditions on other fields are
+# checked in Python on the rows the SQL conditions selected.
+FIELDS: dict[str, dict[str, str]] = {
+    "slots": {
+        "exam_id": "scalar",
+        "exam_center_id": "scalar",
+        "status": "scalar",
+        "types_blob": "array",
+        "start_time": "date",
+        "found_at": "date",
+        "first_found_at": "date",
+        "taken_at": "date",
+    },
+    "slots_archive": {
+        "exam_id": "scalar",
+        "exam_center_id": "scalar",
+        "status": "scalar",
+        "types_blob": "array",
+        "start_time": "date",
+        "found_at": "date",
+        "first_found_at": "date",
+        "taken_at": "date",
+    },
+    "subscribers": {
+        "email": "scalar",
+        "stripe_customer_id": "scalar",
+        "verification_token": "scalar",
+        "telegram_user.id": "scalar",
+        "discord_user.id": "scalar",
+        "is_subscription_active": "scalar",
+        "wants_emails": "scalar",
+        "monitoring_preferences.exam_center_ids": "array",
+        "monitoring_preferences.license_types": "array",
+    },
+    "requests": {"request_type": "scalar", "timestamp": "date", "expires_at": "date"},
+    "sbat_tokens": {"username": "scalar"},
+    "stripe_events": {"id": "scalar", "processing_status": "scalar", "created": "scalar"},
+    "telegram_events": {"update_id": "scalar"},
+    "discord_events": {"token": "scalar"},
+    "notification_receipts": {"channel": "scalar", "exam_center_id": "scalar", "found_at": "date", "expires_at": "date"},
+    "slot_stats": {"dimension": "scalar", "key": "scalar", "month": "date"},
+    "server_response_times": {"start": "date"},
+    "server_response_time_rollups": {
+        "exam_center_id": "scalar",
+        "license_type": "scalar",
+        "resolution": "scalar",
+        "bucket_start": "date",
+        "expires_at": "date",
+    },
+}
+
+# expression indexes per table, one tuple of FIELDS entries per index
+INDEXES: dict[str, tuple[tuple[str, ...], ...]] = {
+    "slots": (("exam_id",), ("exam_center_id", "status"), ("start_time",)),
+    "slots_archive": (("exam_id",), ("exam_center_id", "start_time")),
+    "subscribers": (("email",), ("stripe_customer_id",), ("verification_token",), ("telegram_user.id",), ("discord_user.id",)),
+    "requests": (("request_type", "timestamp"), ("expires_at",)),
+    "sbat_tokens": (("username",),),
+    "stripe_events": (("id",), ("processing_status", "created")),
+    "telegram_events": (("update_id",),),
+    "discord_events": (("token",),),
+    "notification_receipts": (("found_at",), ("expires_at",)),
+    "slot_stats": (("dimension", "key", "month"), ("dimension", "month")),
+    "server_response_times": (("start",),),
+    "server_response_time_rollups": (("resolution", "bucket_start", "exam_center_id", "license_type"), ("expires_at",)),
+}
+
+SCALAR_TYPES: tuple[type, ...] = (str, int, float, bool)
+COMPARISONS: dict[str, str] = {"$eq": "=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _encode_value(value: Any) -> dict:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="milliseconds")}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, bytes):
+        return {"$binary": base64.b64encode(value).decode()}
+    if isinstance(value, Mapping):
+        # like BSON, any mapping (e.g. httpx.Headers) is stored as a plain document
+        return dict(value)
+    raise TypeError(f"Cannot store a {type(value).__name__} in SQLite")
+
+
+def _decode_object(value: dict) -> Any:
+    if len(value) == 1:
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+        if "$binary" in value:
+            return base64.b64decode(value["$binary"])
+    return value
+
+
+def encode_document(document: dict) -> str:
+    """JSON for the doc column, datetimes as fixed width ISO strings under "$date" so they sort as text."""
+    return json.dumps({key: value for key, value in document.items() if key != "_id"}, default=_encode_value, separators=(",", ":"))
+
+
+def decode_document(_id: str, doc: str) -> dict:
+    return {"_id": ObjectId(_id), **json.loads(doc, object_hook=_decode_object)}
+
+
+def _expression(field: str, kind: str) -> str:
+    return f"json_extract(doc, '$.{field}.\"$date\"')" if kind == "date" else f"json_extract(doc, '$.{field}')"
+
+
+def _sql_value(kind: str, value: Any) -> Any | None:
+    """The bound parameter for a value compared against a field, None when SQL can't compare it exactly."""
+    if kind == "date":
+        return value.isoformat(timespec="milliseconds") if isinstance(value, datetime) else None
+    return value if isinstance(value, SCALAR_TYPES) else None
+
+
+def _condition(fields: dict[str, str], field: str, expected: Any) -> tuple[str, list[Any]] | None:
+    """SQL for one top level query condition, None if it has to be checked in Python."""
+    if field == "_id":
+        if isinstance(expected, ObjectId):
+            return "id = ?", [str(expected)]
+        if is_operator_dict(expected) and list(expected) == ["$in"] and all(isinstance(option, ObjectId) for option in expected["$in"]):
+            return f"id IN ({', '.join('?' * len(expected['$in']))})", [str(option) for option in expected["$in"]]
+        # the hex strings of ObjectIds order like the ObjectIds themselves
+        if is_operator_dict(expected) and all(operator in COMPARISONS and isinstance(value, ObjectId) for operator, value in expected.items()):
+            return " AND ".join(f"id {COMPARISONS[operator]} ?" for operator in expected), [str(value) for value in expected.values()]
+        return None
+
+    kind: str | None = fields.get(field)
+    if kind is None:
+        return None
+    operators: dict = expected if is_operator_dict(expected) else {"$eq": expected}
+
+    clauses: list[str] = []
+    params: list[Any] = []
+    for operator, value in operators.items():
+        options: list[Any] = value if operator == "$in" else [value]
+        if (operator not in COMPARISONS and operator != "$in") or not options:
+            return None
+        if kind == "array" and operator not in ("$eq", "$in"):
+            return None
+        sql_values: list[Any] = [_sql_value(kind, option) for option in options]
+        if any(sql_value is None for sql_value in sql_values):
+            return None
+
+        if kind == "array":
+            placeholders: str = ", ".join("?" * len(sql_values))
+            clauses.append(f"EXISTS (SELECT 1 FROM json_each(doc, '$.{field}') WHERE value IN ({placeholders}))")
+        elif operator == "$in":
+            clauses.append(f"{_expression(field, kind)} IN ({', '.join('?' * len(sql_values))})")
+        else:
+            clauses.append(f"{_expression(field, kind)} {COMPARISONS[operator]} ?")
+        params.extend(sql_values)
+    return " AND ".join(clauses), params
+
+
+class SqliteRepository(DocumentRepository):
+    """
+    Stores every collection as a SQLite table of JSON documents, for single-node deployments without a MongoDB server.
+
+    Each table has an `id` primary key and a `doc` JSON column, nested values like `types_blob` and
+    `monitoring_preferences` stay JSON and are matched with json_each. Conditions on the fields in `FIELDS` run as
+    SQL with bound parameters, backed by the expression indexes in `INDEXES`, and the full MongoDB query is
+    re-checked in Python whenever part of it could not be expressed in SQL.
+
+    The connection runs in WAL mode and is only used from a single worker thread, which serializes the
+    read-modify-write updates and keeps the event loop free while SQLite works.
+    """
+
+    def __init__(
+        self, path: str, subscriber_cache: SubscriberCache | None = None, password_hasher: PasswordHasher | None = None
+    ) -> None:
+        super().__init__(subscriber_cache, password_hasher)
+        self.path: str = path
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-repo")
+        # autocommit mode, writes open their own BEGIN IMMEDIATE transactions
+        self.connection: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=512)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute("PRAGMA busy_timeout = 5000")
+        self.tables: set[str] = set()
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.connection.close()
+
+    def _ensure_table(self, table: str) -> None:
+        if table in self.tables:
+            return
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+        fields: dict[str, str] = FIELDS.get(table, {})
+        for index_fields in INDEXES.get(table, ()):
+            name: str = "_".join((table, *index_fields)).replace(".", "_")
+            expressions: str = ", ".join(_expression(field, fields[field]) for field in index_fields)
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({expressions})')
+        self.tables.add(table)
+
+    @staticmethod
+    def _where(fields: dict[str, str], query_dict: dict) -> tuple[list[str], list[Any], bool]:
+        """SQL clauses and parameters for the query, and whether they express all of it."""
+        clauses: list[str] = []
+        params: list[Any] = []
+        exact: bool = True
+        for field, expected in query_dict.items():
+            condition: tuple[str, list[Any]] | None = _condition(fields, field, expected)
+            if condition is None:
+                exact = False
+                continue
+            clauses.append(condition[0])
+            params.extend(condition[1])
+        return clauses, params, exact
+
+    def _select(self, table: str, query_dict: dict, sort: list[tuple[str, int]] | None, limit: int | None) -> list[dict]:
+        self._ensure_table(table)
+        fields: dict[str, str] = FIELDS.get(table, {})
+        clauses, params, exact = self._where(fields, query_dict)
+
+        order: list[str] = []
+        for field, direction in sort or []:
+            if field == "_id":
+                order.append(f"id {'DESC' if direction < 0 else 'ASC'}")
+                continue
+            if fields.get(field) not in ("scalar", "date"):
+                exact = False
+                break
+            order.append(f"{_expression(field, fields[field])} {'DESC' if direction < 0 else 'ASC'}")
+
+        statement: str = f'SELECT id, doc FROM "{table}"'
+        if clauses:
+            statement += f" WHERE {' AND '.join(clauses)}"
+        statement += f" ORDER BY {', '.join(order)}" if exact and order else " ORDER BY rowid"
+        if exact and limit is not None:
+            statement += f" LIMIT {int(limit)}"
+
+        documents: list[dict] = [decode_document(_id, doc) for _id, doc in self.connection.execute(statement, params)]
+        if exact:
+            return documents
+
+        documents = [document for document in documents if matches(document, query_dict)]
+        for field, direction in reversed(sort or []):
+            documents.sort(key=sort_key(field), reverse=direction < 0)
+        return documents[:limit] if limit is not None else documents
+
+    def _insert(self, table: str, documents: list[dict], replace: bool = False) -> list[dict]:
+        self._ensure_table(table)
+        stored: list[dict] = [new_document(data) for data in documents]
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.executemany(
+                f'INSERT {"OR REPLACE " if replace else ""}INTO "{table}" (id, doc) VALUES (?, ?)',
+                [(str(document["_id"]), encode_document(document)) for document in stored],
+            )
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return stored
+
+    def _update(self, table: str, query_dict: dict, update: dict, return_updated: bool, upsert: bool = False) -> dict | None:
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            documents: list[dict] = self._select(table, query_dict, None, 1)
+            if not documents and upsert:
+                document: dict = upserted_document(query_dict, update)
+                self.connection.execute(f'INSERT INTO "{table}" (id, doc) VALUES (?, ?)', (str(document["_id"]), encode_document(document)))
+                self.connection.execute("COMMIT")
+                return document if return_updated else None
+            if not documents:
+                self.connection.execute("COMMIT")
+                return None
+            before: dict = copy.deepcopy(documents[0])
+            apply_update(documents[0], update)
+            self.connection.execute(f'UPDATE "{table}" SET doc = ? WHERE id = ?', (encode_document(documents[0]), str(documents[0]["_id"])))
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return documents[0] if return_updated else before
+
+    def _delete(self, table: str, query_dict: dict) -> int:
+        self._ensure_table(table)
+        clauses, params, exact = self._where(FIELDS.get(table, {}), query_dict)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            if exact:
+                where: str = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+                deleted: int = self.connection.execute(f'DELETE FROM "{table}"{where}', params).rowcount
+            else:
+                ids: list[tuple[str]] = [(str(document["_id"]),) for document in self._select(table, query_dict, None, None)]
+                self.connection.executemany(f'DELETE FROM "{table}" WHERE id = ?', ids)
+                deleted = len(ids)
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return deleted
+
+    def _move(self, source: str, target: str, query_dict: dict, limit: int | None) -> list[dict]:
+        self._ensure_table(target)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            documents: list[dict] = self._select(source, query_dict, None, limit)
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO "{target}" (id, doc) VALUES (?, ?)',
+                [(str(document["_id"]), encode_document(document)) for document in documents],
+            )
+            self.connection.executemany(f'DELETE FROM "{source}" WHERE id = ?', [(str(document["_id"]),) for document in documents])
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return documents
+
+    async def _insert_documents(self, table_or_collection: str, documents: list[dict]) -> list[dict]:
+        return await self._run(self._insert, table_or_collection, documents)
+
+    async def _find_documents(
+        self, table_or_collection: str, query_dict: dict, sort: list[tuple[str, int]] | None = None, limit: int | None = None
+    ) -> list[dict]:
+        return await self._run(self._select, table_or_collection, query_dict, sort, limit)
+
+    async def _find_one_and_update(
+        self, table_or_collection: str, query_dict: dict, update: dict, return_updated: bool, upsert: bool = False
+    ) -> dict | None:
+        return await self._run(self._update, table_or_collection, query_dict, update, return_updated, upsert)
+
+    async def _delete_documents(self, table_or_collection: str, query_dict: dict) -> int:
+        return await self._run(self._delete, table_or_collection, query_dict)
+
+    async def _move_documents(self, source: str, target: str, query_dict: dict, limit: int | None = None) -> list[dict]:
+        return await self._run(self._move, source, target, query_dict, limit)
+
+    async def import_documents(self, table_or_collection: str, documents: list[dict]) -> int:
+        """Stores documents with their existing `_id`, replacing earlier copies, so an import can be re-run."""
+        return len(await self._run(self._insert, table_or_collection, documents, True))
+
+    async def count(self, table_or_collection: str) -> int:
+        def _count() -> int:
+            self._ensure_table(table_or_collection)
+            return self.connection.execute(f'SELECT COUNT(*) FROM "{table_or_collection}"').fetchone()[0]
+
+        return await self._run(_count)
@@ -1,18 +1,34 @@
+import secrets
+from datetime import timedelta
 from functools import lru_cache
 from typing import AsyncGenerator, Callable, Coroutine
 
 import jwt
 from aiocache import cached
 from fastapi import Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from nacl.signing import VerifyKey
 
+from .cache import SubscriberCache, TokenCache
 from .db.base_repo import BaseRepository
+from .db.memory_repo import InMemoryRepository
 from .db.mongo_repo import MongoRepository
+from .db.password_hasher import PasswordHasher
+from .db.sqlite_repo import SqliteRepository
 from .models.sbat import MonitorConfiguration
 from .models.settings import Settings
 from .models.subscriber import SubscriberRead
+from .services.loop_monitor import LoopLagMonitor
+from .services.housekeeper import Housekeeper
+from .services.memory_tracker import MemoryTracker
+from .services.profiler import Profiler
 from .services.sbat_monitor import SbatMonitor
+from .services.response_time_analytics import ResponseTimeAnalytics
+from .services.slot_archiver import SlotArchiver
+from .services.telegram_sender import TelegramSender
+from .webhooks.stripe_processor import StripeEventProcessor
+from .webhooks.telegram_pipeline import TelegramUpdatePipeline
 
 
 @lru_cache
@@ -20,22 +36,126 @@ def get_settings() -> Settings:
     return Settings()
 
 
+@lru_cache
+def get_subscriber_cache() -> SubscriberCache:
+    settings: Settings = get_settings()
+    return SubscriberCache(settings.subscriber_cache_size, settings.subscriber_cache_ttl_seconds)
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    return TokenCache(get_settings().token_cache_size)
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    settings: Settings = get_settings()
+    return PasswordHasher(max_workers=settings.password_hash_workers, min_rounds=settings.password_hash_min_rounds)
+
+
+@lru_cache
+def get_stripe_event_processor() -> StripeEventProcessor:
+    return StripeEventProcessor(get_settings().stripe_webhook_concurrency)
+
+
+@lru_cache
+def get_telegram_sender() -> TelegramSender:
+    return TelegramSender(get_settings().telegram_bot_token)
+
+
+@lru_cache
+def get_telegram_pipeline() -> TelegramUpdatePipeline:
+    return TelegramUpdatePipeline(get_telegram_sender(), get_settings().telegram_webhook_concurrency)
+
+
+@lru_cache
+def get_loop_monitor() -> LoopLagMonitor:
+    settings: Settings = get_settings()
+    return LoopLagMonitor(settings.loop_lag_interval_seconds, settings.slow_callback_threshold_seconds)
+
+
+@lru_cache
+def get_memory_tracker() -> MemoryTracker:
+    settings: Settings = get_settings()
+    return MemoryTracker(settings.memory_sample_interval_seconds, settings.tracemalloc_frames, settings.memory_soft_limit_mb)
+
+
+@lru_cache
+def get_slot_archiver() -> SlotArchiver:
+    settings: Settings = get_settings()
+    return SlotArchiver(
+        settings.slot_archive_interval_seconds, timedelta(days=settings.slot_archive_taken_after_days), settings.slot_archive_batch_size
+    )
+
+
+@lru_cache
+def get_housekeeper() -> Housekeeper:
+    settings: Settings = get_settings()
+    return Housekeeper(settings.housekeeping_interval_seconds, timedelta(days=settings.server_response_time_ttl_days))
+
+
+@lru_cache
+def get_response_time_analytics() -> ResponseTimeAnalytics:
+    settings: Settings = get_settings()
+    return ResponseTimeAnalytics(timedelta(days=settings.response_time_analytics_days), settings.response_time_analytics_cache_path)
+
+
+@lru_cache
+def get_profiler() -> Profiler:
+    return Profiler(get_settings().profiler_max_seconds)
+
+
+@lru_cache
+def get_discord_verify_key() -> VerifyKey:
+    return VerifyKey(bytes.fromhex(get_settings().discord_public_key))
+
+
+@lru_cache
+def get_memory_repository() -> InMemoryRepository:
+    return InMemoryRepository(get_subscriber_cache(), get_password_hasher())
+
+
+@lru_cache
+def get_sqlite_repository() -> SqliteRepository:
+    return SqliteRepository(get_settings().sqlite_path, get_subscriber_cache(), get_password_hasher())
+
+
 client: AsyncIOMotorClient = AsyncIOMotorClient(get_settings().database_url)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+metrics_bearer = HTTPBearer(auto_error=False)
 
 
 async def get_mongodb() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
     yield client["rijexamen-meldingen"]
 
 
-def get_repo(db_type: str) -> Callable[..., Coroutine]:
+# cached so every call returns the same dependency, which makes it usable as a key in app.dependency_overrides
+@lru_cache
+def get_repo(db_type: str | None = None) -> Callable[..., Coroutine]:
+    if db_type is None:
+        return get_repo(get_settings().database_backend)
+
     if db_type == "mongodb":
 
         async def _get_mongo_repo(mongo_db: AsyncIOMotorDatabase = Depends(get_mongodb)) -> MongoRepository:
-            return MongoRepository(mongo_db)
+            return MongoRepository(mongo_db, get_subscriber_cache(), get_password_hasher())
 
         return _get_mongo_repo
 
+    elif db_type == "memory":
+
+        async def _get_memory_repo() -> InMemoryRepository:
+            return get_memory_repository()
+
+        return _get_memory_repo
+
+    elif db_type == "sqlite":
+
+        async def _get_sqlite_repo() -> SqliteRepository:
+            return get_sqlite_repository()
+
+        return _get_sqlite_repo
+
     # elif db_type == "sql":
     #     async def _get_sqlalchemy_repo(sqlalchemy_db: AsyncSession = Depends(get_sqldb)) -> SQLAlchemyRepository:
     #         return SQLAlchemyRepository(sqlalchemy_db)
@@ -46,28 +166,44 @@ def get_repo(db_type: str) -> Callable[..., Coroutine]:
         raise ValueError("Unsupported database type")
 
 
+async def get_configured_repo() -> BaseRepository:
+    """The repository of the configured database backend, for use outside of a request."""
+    if get_settings().database_backend == "mongodb":
+        return await get_repo("mongodb")(mongo_db=client["rijexamen-meldingen"])
+    return await get_repo()()
+
+
 @cached()
 async def get_sbat_monitor() -> SbatMonitor:
     settings: Settings = get_settings()
-    repo = await get_repo("mongodb")(mongo_db=client["rijexamen-meldingen"])
+    repo = await get_configured_repo()
     return SbatMonitor(repo=repo, settings=settings, config=MonitorConfiguration())
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), repo: BaseRepository = Depends(get_repo("mongodb")), settings: Settings = Depends(get_settings)
+    token: str = Depends(oauth2_scheme),
+    repo: BaseRepository = Depends(get_repo()),
+    settings: Settings = Depends(get_settings),
+    subscriber_cache: SubscriberCache = Depends(get_subscriber_cache),
+    token_cache: TokenCache = Depends(get_token_cache),
 ) -> SubscriberRead:
     credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
 
     try:
-        payload: dict = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+        payload: dict = token_cache.decode(token, settings.jwt_secret_key, settings.jwt_algorithm)
         email: str = payload.get("sub", "")
     except jwt.InvalidTokenError as ite:
         raise credentials_exception from ite
 
-    subscriber: SubscriberRead | None = await repo.find_one("subscribers", {"email": email}, SubscriberRead)
+    subscriber: SubscriberRead | None = subscriber_cache.get(email)
+    if subscriber:
+        return subscriber
+
+    subscriber = await repo.find_one("subscribers", {"email": email}, SubscriberRead, {"extra_details": 0})
     if not subscriber:
         raise credentials_exception
 
+    subscriber_cache.set(subscriber)
     return subscriber
 
 
@@ -78,3 +214,13 @@ async def get_admin_user(current_user: SubscriberRead = Depends(get_current_user
             detail="Not enough privileges",
         )
     return current_user
+
+
+async def verify_metrics_token(
+    credentials: HTTPAuthorizationCredentials | None = Depends(metrics_bearer), settings: Settings = Depends(get_settings)
+) -> None:
+    # a static token for the Prometheus scrape config, user tokens expire after ACCESS_TOKEN_EXPIRE_MINUTES
+    if not settings.metrics_token:
+        raise HTTPException(status_code=403, detail="Metrics are disabled, set METRICS_TOKEN to enable them")
+    if not credentials or not secrets.compare_digest(credentials.credentials.encode(), settings.metrics_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
@@ -1,11 +1,28 @@
+import asyncio
 from contextlib import asynccontextmanager
+from datetime import timedelta
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from api.dependencies import client
+from api.dependencies import (
+    client,
+    get_configured_repo,
+    get_housekeeper,
+    get_loop_monitor,
+    get_memory_tracker,
+    get_password_hasher,
+    get_settings,
+    get_slot_archiver,
+    get_sqlite_repository,
+    get_stripe_event_processor,
+    get_telegram_pipeline,
+    get_telegram_sender,
+)
+from api.routes.diagnostics import router as diagnostics_router
 from api.routes.jwt_auth import auth
+from api.routes.metrics import router as metrics_router
 from api.routes.sbat import router as sbat_router
 from api.routes.subscribers import router as subscribers_router
 from api.routes.temporary import router as temp_router
@@ -14,10 +31,32 @@ from api.webhooks.webhooks import webhooks
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:  # pylint: disable=redefined-outer-name, unused-argument
+    get_loop_monitor().start()
+    get_memory_tracker().start()
+    await get_password_hasher().calibrate(get_settings().password_hash_target_ms)
+    repo = await get_configured_repo()
+    await repo.ensure_indexes(timedelta(days=get_settings().server_response_time_ttl_days))
+    await get_stripe_event_processor().resume_pending(repo, get_settings())
+    get_slot_archiver().start(repo)
+    get_housekeeper().start(repo)
+
+    polling_task: asyncio.Task | None = None
+    if get_settings().telegram_polling:
+        polling_task = asyncio.create_task(get_telegram_pipeline().poll(repo, get_settings().telegram_bot_token))
     try:
         yield
     finally:
+        if polling_task:
+            polling_task.cancel()
+        await get_slot_archiver().stop()
+        await get_housekeeper().stop()
+        await get_telegram_sender().close()
         client.close()
+        if get_settings().database_backend == "sqlite":
+            get_sqlite_repository().close()
+        get_password_hasher().shutdown()
+        await get_loop_monitor().stop()
+        await get_memory_tracker().stop()
 
 
 app = FastAPI(title="Exam Time Slot Checker", lifespan=lifespan)
@@ -36,6 +75,8 @@ app.include_router(auth)
 app.include_router(subscribers_router)
 app.include_router(sbat_router)
 app.include_router(webhooks)
+app.include_router(metrics_router)
+app.include_router(diagnostics_router)
 
 
 @app.get("/health")
@@ -0,0 +1,201 @@
+"""
+In-process metrics with Prometheus text exposition, cheap enough to stay on in the poll loop.
+
+Label values are passed positionally in the order of the metric's label names, an update is a tuple
+lookup plus an addition (and a bisect for histograms). Metrics are only updated from the event loop thread.
+"""
+
+import functools
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+import httpx
+
+LATENCY_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DATABASE_BUCKETS: tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS: tuple[float, ...] = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs: list[str] = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    type_name: str = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: tuple[str, ...] = label_names
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines: list[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, *label_values: Any) -> None:
+        self.values[label_values] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # per label values: the count per bucket (the last one is +Inf), then the sum
+        self.values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        counts: list[float] | None = self.values.get(label_values)
+        if counts is None:
+            counts = self.values[label_values] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        for label_values, counts in self.values.items():
+            cumulative: float = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels: str = _format_labels(self.label_names, label_values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{labels} {_format_value(cumulative)}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SBAT_POLL_SECONDS: Histogram = REGISTRY.histogram(
+    "sbat_poll_duration_seconds", "Duration of an SBAT availability request.", ("exam_center", "license_type")
+)
+SBAT_RESPONSE_BYTES: Histogram = REGISTRY.histogram(
+    "sbat_response_size_bytes", "Body size of SBAT availability responses.", ("exam_center", "license_type"), SIZE_BUCKETS
+)
+SBAT_AUTHENTICATIONS: Counter = REGISTRY.counter(
+    "sbat_authentications_total", "SBAT token lookups by outcome (cached, refreshed, failed).", ("outcome",)
+)
+SLOTS_FOUND: Counter = REGISTRY.counter("sbat_time_slots_found_total", "New exam time slots found.", ("exam_center", "license_type"))
+SLOTS_TAKEN: Counter = REGISTRY.counter(
+    "sbat_time_slots_taken_total", "Notified exam time slots that disappeared.", ("exam_center", "license_type")
+)
+NOTIFICATION_SECONDS: Histogram = REGISTRY.histogram(
+    "notification_duration_seconds", "Time to send a new time slot notification per channel.", ("channel",)
+)
+NOTIFICATION_DELIVERY_SECONDS: Histogram = REGISTRY.histogram(
+    "notification_delivery_seconds", "Time from finding a slot to the channel accepting the alert.", ("channel", "exam_center")
+)
+NOTIFICATION_DELIVERIES: Counter = REGISTRY.counter(
+    "notification_deliveries_total", "Per-recipient alert deliveries by channel and outcome.", ("channel", "outcome")
+)
+HTTP_RESPONSES: Counter = REGISTRY.counter("http_client_responses_total", "Outbound HTTP responses by host and status code.", ("host", "status"))
+REPOSITORY_SECONDS: Histogram = REGISTRY.histogram(
+    "repository_operation_duration_seconds", "Duration of repository method calls.", ("backend", "method"), DATABASE_BUCKETS
+)
+LOOP_LAG_SECONDS: Histogram = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How much later than scheduled the event loop ran the lag sampler.", buckets=LOOP_LAG_BUCKETS
+)
+LOOP_STALLS: Counter = REGISTRY.counter("event_loop_stalls_total", "Callbacks that blocked the event loop past the slow callback threshold.")
+PROCESS_RSS_BYTES: Gauge = REGISTRY.gauge("process_resident_memory_bytes", "Resident set size, sampled by the memory tracker.")
+TRACED_MEMORY_BYTES: Gauge = REGISTRY.gauge("tracemalloc_traced_bytes", "Memory allocated by Python code while tracemalloc is on.")
+MODEL_INSTANCES: Gauge = REGISTRY.gauge("model_instances", "Live instances of the api.models classes and of httpx.AsyncClient.", ("model",))
+SLOTS_ARCHIVED: Counter = REGISTRY.counter("time_slots_archived_total", "Time slots moved from the hot slots collection to slots_archive.")
+SLOTS_RESTORED: Counter = REGISTRY.counter("time_slots_restored_total", "Archived time slots moved back to slots because they were offered again.")
+QUEUE_DEPTH: Gauge = REGISTRY.gauge("queue_depth", "Jobs waiting in the background queues, sampled at scrape time.", ("queue",))
+
+
+async def record_http_response(response: httpx.Response) -> None:
+    HTTP_RESPONSES.inc(response.request.url.host, response.status_code)
+
+
+# pass as event_hooks to every outbound httpx client
+HTTP_EVENT_HOOKS: dict[str, list[Callable]] = {"response": [record_http_response]}
+
+
+# set while a timed repository method runs, the methods it calls in turn are part of its duration
+_IN_REPOSITORY_METHOD: ContextVar[bool] = ContextVar("in_repository_method", default=False)
+
+
+def timed_repository_method(method: Callable) -> Callable:
+    """Wraps a repository coroutine method to observe its duration in REPOSITORY_SECONDS, only for the outermost call."""
+    name: str = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if _IN_REPOSITORY_METHOD.get():
+            return await method(self, *args, **kwargs)
+        token = _IN_REPOSITORY_METHOD.set(True)
+        started_at: float = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            REPOSITORY_SECONDS.observe(time.perf_counter() - started_at, type(self).__name__, name)
+            _IN_REPOSITORY_METHOD.reset(token)
+
+    return wrapper
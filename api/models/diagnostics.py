@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class LoopStallRead(BaseModel):
+    detected_at: datetime
+    duration_ms: float
+    stack: list[str] = Field(default_factory=list)
+
+
+class LoopDiagnosticsRead(BaseModel):
+    running: bool
+    interval_ms: float
+    slow_callback_threshold_ms: float
+    samples: int
+    lag_last_ms: float | None = None
+    lag_p50_ms: float | None = None
+    lag_p99_ms: float | None = None
+    lag_max_ms: float | None = None
+    stalls: int
+    recent_stalls: list[LoopStallRead]
+
+
+class DatabaseReadiness(BaseModel):
+    backend: str
+    ping_ms: float | None = None
+    error: str | None = None
+
+
+class PollerReadiness(BaseModel):
+    running: bool
+    heartbeat_age_seconds: float | None = None
+    max_heartbeat_age_seconds: float
+    stopped_due_to: str | None = None
+    # stopped by an exception rather than by an admin or at its end
+    crashed: bool = False
+
+
+class ReadinessRead(BaseModel):
+    ready: bool
+    database: DatabaseReadiness
+    poller: PollerReadiness
+    loop_lag_p50_ms: float
+    max_loop_lag_ms: float
+
+
+class MemorySampleRead(BaseModel):
+    timestamp: datetime
+    rss_bytes: int
+    traced_bytes: int | None = None
+
+
+class MemoryGrowthRead(BaseModel):
+    location: list[str]
+    size_bytes: int
+    size_diff_bytes: int
+    count: int
+    count_diff: int
+
+
+class MemoryDiagnosticsRead(BaseModel):
+    running: bool
+    interval_seconds: float
+    tracemalloc: bool
+    soft_limit_bytes: int | None = None
+    restart_requested_at: datetime | None = None
+    rss_bytes: int | None = None
+    rss_trend_bytes_per_hour: float | None = None
+    object_counts: dict[str, int]
+    top_growth: list[MemoryGrowthRead]
+    samples: list[MemorySampleRead]
@@ -1,3 +1,4 @@
+import zlib
 from datetime import datetime
 from typing import Literal
 
@@ -37,12 +38,28 @@ class MonitorConfiguration(MonitorPreferences):
 
 
 class SbatRequestBase(BaseModel):
+    """
+    A diagnostic log row of an SBAT request.
+
+    `response` holds the status code, a whitelisted subset of the headers, the body size and the body itself
+    zlib compressed under `body_zlib`, rows from before the compression kept the text under `response_text`.
+    """
+
     timestamp: datetime
     request_type: str
     request_body: dict | None = None
     response: dict | None = None
     url: str
     email_used: str
+    expires_at: datetime | None = None
+
+    @property
+    def response_text(self) -> str | None:
+        if not self.response:
+            return None
+        if self.response.get("body_zlib") is not None:
+            return zlib.decompress(self.response["body_zlib"]).decode(errors="replace")
+        return self.response.get("response_text")
 
 
 class SbatRequestCreate(SbatRequestBase):
@@ -53,6 +70,23 @@ class SbatRequestRead(SbatRequestBase):
     _id: PyObjectId
 
 
+class SbatTokenBase(BaseModel):
+    """The current SBAT API token of an account, one document per username."""
+
+    username: str
+    token: str
+    expires_at: datetime
+    refreshed_at: datetime
+
+
+class SbatTokenCreate(SbatTokenBase):
+    pass
+
+
+class SbatTokenRead(SbatTokenBase):
+    id: PyObjectId = Field(..., alias="_id")
+
+
 class ExamTimeSlotBase(BaseModel):
     exam_id: int
 
@@ -82,6 +116,52 @@ class ExamTimeSlotRead(ExamTimeSlotBase):
     id: PyObjectId = Field(..., alias="_id")
 
 
+class SlotEvent(BaseModel):
+    """A state change of a time slot, folded into the monthly slot_stats aggregates."""
+
+    kind: Literal["found", "taken", "re_released"]
+    at: datetime
+    exam_center_id: int
+    driving_school: str | None = None
+    # for "taken", the seconds between the slot being offered (found or re-released) and taken
+    seconds_on_offer: float | None = None
+
+
+class SlotStatsBase(BaseModel):
+    """The slot state changes of one exam center or one driving school in one month."""
+
+    dimension: Literal["exam_center", "driving_school"]
+    key: str
+    month: datetime
+    found: int = 0
+    taken: int = 0
+    re_released: int = 0
+    seconds_on_offer_sum: float = 0
+    # LatencySketch bins of the seconds on offer of the taken slots, bin index to number of slots
+    seconds_on_offer_sketch: dict[str, int] = Field(default_factory=dict)
+
+
+class SlotStatsRead(SlotStatsBase):
+    id: PyObjectId = Field(..., alias="_id")
+
+
+class SlotStatsSummaryRead(BaseModel):
+    dimension: Literal["exam_center", "driving_school"]
+    key: str
+    # None when the summary covers every month in the range
+    month: datetime | None = None
+    found: int
+    taken: int
+    re_released: int
+    # share of the takes that were offered again afterwards
+    re_release_rate: float | None = None
+    time_to_take_mean_seconds: float | None = None
+    time_to_take_p25_seconds: float | None = None
+    time_to_take_p50_seconds: float | None = None
+    time_to_take_p75_seconds: float | None = None
+    time_to_take_p90_seconds: float | None = None
+
+
 class ServerResponseTimeBase(BaseModel):
     start: datetime
     end: datetime
@@ -95,3 +175,140 @@ class ServerResponseTimeCreate(ServerResponseTimeBase):
 
 class ServerResponseTimeRead(ServerResponseTimeBase):
     id: PyObjectId = Field(..., alias="_id")
+
+
+class ServerResponseTimeRollupBase(BaseModel):
+    """The SBAT response times of one exam center and license type over one minute or one hour."""
+
+    exam_center_id: int
+    license_type: str
+    resolution: Literal["minute", "hour"]
+    bucket_start: datetime
+    # minute buckets expire with the raw samples, hour buckets are kept
+    expires_at: datetime | None = None
+    count: int
+    duration_sum_ms: float
+    duration_min_ms: float
+    duration_max_ms: float
+    response_bytes_sum: int
+    # LatencySketch bins of the durations, bin index to number of samples
+    sketch: dict[str, int]
+
+
+class ServerResponseTimeRollupRead(ServerResponseTimeRollupBase):
+    id: PyObjectId = Field(..., alias="_id")
+
+
+class ServerResponseTimeStatsRead(BaseModel):
+    exam_center: str
+    license_type: str
+    resolution: Literal["minute", "hour"]
+    bucket_start: datetime
+    count: int
+    min_ms: float
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    mean_response_bytes: float
+
+
+class ResponseTimeBucketRead(BaseModel):
+    exam_center: str
+    # the hour for `by=hour`, None when the bucket spans every day in the range
+    hour: datetime | None = None
+    hour_of_day: int
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    mean_response_bytes: float
+    # p50 above the slow factor times the median of the exam center's buckets
+    slow: bool
+
+
+class SlownessWindowRead(BaseModel):
+    """Consecutive slow buckets of one exam center."""
+
+    exam_center: str
+    first_hour: datetime | None = None
+    first_hour_of_day: int
+    hours: int
+    count: int
+    max_p50_ms: float
+
+
+class ResponseSizeTrendRead(BaseModel):
+    exam_center: str
+    count: int
+    mean_response_bytes: float
+    # least squares slope of the response sizes over time
+    bytes_per_day: float | None = None
+
+
+class ServerResponseTimeAnalyticsRead(BaseModel):
+    since: datetime
+    until: datetime
+    # later than `since` when the samples do not reach back that far, e.g. before the cache filled up
+    first_sample_at: datetime | None = None
+    by: Literal["hour", "hour_of_day"]
+    count: int
+    buckets: list[ResponseTimeBucketRead]
+    slowness_windows: list[SlownessWindowRead]
+    response_size_trends: list[ResponseSizeTrendRead]
+
+
+class PollSpanRead(BaseModel):
+    name: str
+    span_id: str
+    parent_span_id: str | None = None
+    start_offset_ms: float
+    duration_ms: float | None = None
+    attributes: dict[str, str | int | float | bool] = Field(default_factory=dict)
+
+
+class PollTraceRead(BaseModel):
+    trace_id: str
+    exam_center: str
+    license_type: str
+    started_at: datetime
+    duration_ms: float | None = None
+    spans: list[PollSpanRead]
+
+
+class NotificationReceiptBase(BaseModel):
+    """The delivery receipts of one alert on one channel, one entry per recipient in the parallel lists."""
+
+    alert_id: str
+    channel: Literal["email", "discord", "telegram"]
+    exam_center_id: int
+    license_type: str
+    exam_ids: list[int]
+    found_at: datetime
+    expires_at: datetime
+    recipients: list[str]
+    # milliseconds after found_at at which the channel accepted the message, None when it did not
+    accepted_ms: list[int | None]
+    outcomes: list[Literal["accepted", "failed"]]
+
+
+class NotificationReceiptCreate(NotificationReceiptBase):
+    pass
+
+
+class NotificationReceiptRead(NotificationReceiptBase):
+    id: PyObjectId = Field(..., alias="_id")
+
+
+class NotificationLatencyRead(BaseModel):
+    channel: str
+    exam_center: str
+    receipts: int
+    failed: int
+    p50_ms: float | None = None
+    p90_ms: float | None = None
+    p99_ms: float | None = None
+    max_ms: float | None = None
@@ -1,11 +1,27 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
-    database_url: str
+    database_backend: Literal["mongodb", "sqlite", "memory"] = "mongodb"
+    database_url: str | None = None
+    sqlite_path: str = "rijexamen-meldingen.db"
 
     sbat_username: str
     sbat_password: str
+    sbat_api_url: str = "https://api.rijbewijs.sbat.be/praktijk/api"
+    sbat_record_path: str | None = None
+    poll_trace_capacity: int = 100
+    notification_receipt_ttl_days: int = 30
+    server_response_time_ttl_days: int = 14
+    sbat_request_log_ttl_days: int = 30
+    response_time_analytics_days: int = 90
+    response_time_analytics_cache_path: str | None = None
+    slot_archive_interval_seconds: int = 3600
+    slot_archive_taken_after_days: int = 14
+    slot_archive_batch_size: int = 1000
+    housekeeping_interval_seconds: int = 3600
 
     stripe_secret_key: str
     stripe_publishable_key: str
@@ -23,10 +39,33 @@ class Settings(BaseSettings):
     sender_password: str | None = None
     smtp_server: str | None = None
     smtp_port: int | None = None
+    smtp_starttls: bool = True
 
     jwt_secret_key: str
     access_token_expire_minutes: int = 1440
     jwt_algorithm: str = "HS256"
 
+    subscriber_cache_size: int = 1024
+    subscriber_cache_ttl_seconds: int = 60
+    token_cache_size: int = 1024
+
+    password_hash_workers: int = 2
+    password_hash_target_ms: int = 250
+    password_hash_min_rounds: int = 10
+
+    stripe_webhook_concurrency: int = 4
+    telegram_webhook_concurrency: int = 8
+    telegram_polling: bool = False
+
+    loop_lag_interval_seconds: float = 0.5
+    slow_callback_threshold_seconds: float = 0.25
+    readiness_max_loop_lag_seconds: float = 1.0
+    profiler_max_seconds: int = 60
+    memory_sample_interval_seconds: int = 300
+    tracemalloc_frames: int = 0
+    memory_soft_limit_mb: int | None = None
+    # bearer token of /metrics, the endpoint is disabled without one
+    metrics_token: str | None = None
+
     class Config:
         env_file: str = ".env"
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from datetime import UTC, datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+
+from ..db.base_repo import BaseRepository
+from ..dependencies import (
+    get_admin_user,
+    get_loop_monitor,
+    get_memory_tracker,
+    get_profiler,
+    get_repo,
+    get_sbat_monitor,
+    get_settings,
+)
+from ..models.diagnostics import DatabaseReadiness, LoopDiagnosticsRead, MemoryDiagnosticsRead, PollerReadiness, ReadinessRead
+from ..models.settings import Settings
+from ..services.loop_monitor import LoopLagMonitor
+from ..services.memory_tracker import MemoryTracker
+from ..services.profiler import Profiler, ProfilerBusyError
+from ..services.sbat_monitor import SbatMonitor
+
+router = APIRouter(tags=["diagnostics"])
+
+DATABASE_PING_TIMEOUT = 2.0
+
+
+@router.get("/diagnostics/loop", dependencies=[Depends(get_admin_user)])
+async def get_loop_diagnostics(
+    limit: int = Query(10, ge=1, le=50), loop_monitor: LoopLagMonitor = Depends(get_loop_monitor)
+) -> LoopDiagnosticsRead:
+    return loop_monitor.diagnostics(limit)
+
+
+@router.get("/diagnostics/memory", dependencies=[Depends(get_admin_user)])
+async def get_memory_diagnostics(
+    compare_to: Literal["baseline", "previous"] = "baseline",
+    limit: int = Query(15, ge=1, le=100),
+    refresh: bool = False,
+    memory_tracker: MemoryTracker = Depends(get_memory_tracker),
+) -> MemoryDiagnosticsRead:
+    """Memory samples, instance counts and, with TRACEMALLOC_FRAMES set, the allocation sites that grew most."""
+    if refresh:
+        await memory_tracker.sample()
+    return memory_tracker.diagnostics(compare_to, limit)
+
+
+@router.get("/diagnostics/profile", dependencies=[Depends(get_admin_user)], response_class=Response)
+async def profile_process(
+    seconds: float = Query(10, gt=0),
+    output: Literal["collapsed", "pstats"] = "collapsed",
+    interval_ms: float = Query(5, ge=1, le=1000),
+    all_threads: bool = False,
+    include_idle: bool = False,
+    profiler: Profiler = Depends(get_profiler),
+) -> Response:
+    """
+    Profiles the running process for `seconds` (capped by PROFILER_MAX_SECONDS). `collapsed` samples stacks
+    for flamegraph.pl or speedscope, `pstats` runs cProfile on the event loop thread (higher overhead).
+    """
+    filename: str = f"profile-{datetime.now(UTC):%Y%m%dT%H%M%S}"
+    try:
+        if output == "pstats":
+            return Response(
+                await profiler.trace(seconds),
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": f'attachment; filename="{filename}.pstats"'},
+            )
+        stacks, interval = await profiler.sample(seconds, interval_ms / 1000, all_threads, include_idle)
+    except ProfilerBusyError as pbe:
+        raise HTTPException(409, detail=str(pbe)) from pbe
+    return Response(
+        stacks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.collapsed"', "X-Sampling-Interval-Ms": f"{interval * 1000:g}"},
+    )
+
+
+@router.get("/ready", response_model=ReadinessRead)
+async def readiness_check(
+    repo: BaseRepository = Depends(get_repo()),
+    sbat_monitor: SbatMonitor = Depends(get_sbat_monitor),
+    loop_monitor: LoopLagMonitor = Depends(get_loop_monitor),
+    settings: Settings = Depends(get_settings),
+) -> JSONResponse:
+    database = DatabaseReadiness(backend=settings.database_backend)
+    started_at: float = time.perf_counter()
+    try:
+        await asyncio.wait_for(repo.ping(), DATABASE_PING_TIMEOUT)
+        database.ping_ms = (time.perf_counter() - started_at) * 1000
+    except Exception as e:  # pylint: disable=broad-except
+        database.error = str(e) or type(e).__name__
+
+    # a poll may take a full request timeout on top of the configured interval
+    poller = PollerReadiness(
+        running=sbat_monitor.task is not None and not sbat_monitor.task.done(),
+        heartbeat_age_seconds=sbat_monitor.heartbeat_age(),
+        max_heartbeat_age_seconds=2 * sbat_monitor.seconds_inbetween + 60,
+        stopped_due_to=sbat_monitor.stopped_due_to,
+        crashed=sbat_monitor.crashed,
+    )
+    loop_lag: float = loop_monitor.median_lag()
+
+    # the poller is only started by an admin, one that was never started or was stopped still serves the webhooks
+    poller_ready: bool = poller.heartbeat_age_seconds <= poller.max_heartbeat_age_seconds if poller.running else not poller.crashed
+    ready: bool = database.error is None and poller_ready and loop_lag <= settings.readiness_max_loop_lag_seconds
+    readiness = ReadinessRead(
+        ready=ready,
+        database=database,
+        poller=poller,
+        loop_lag_p50_ms=loop_lag * 1000,
+        max_loop_lag_ms=settings.readiness_max_loop_lag_seconds * 1000,
+    )
+    return JSONResponse(readiness.model_dump(mode="json"), status_code=200 if ready else 503)
@@ -12,7 +12,7 @@ auth = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @auth.post("/signup")
 async def subscribe(
-    subscriber: SubscriberCreate, repo: BaseRepository = Depends(get_repo("mongodb")), settings: Settings = Depends(get_settings)
+    subscriber: SubscriberCreate, repo: BaseRepository = Depends(get_repo()), settings: Settings = Depends(get_settings)
 ) -> dict[str, str]:
     try:
         await repo.create_subscriber(subscriber)
@@ -23,6 +23,7 @@ async def subscribe(
             settings.sender_password,
             settings.smtp_server,
             settings.smtp_port,
+            starttls=settings.smtp_starttls,
             is_html=True,
             html_template="email_verification.html",
             naam=subscriber.name,
@@ -35,7 +36,7 @@ async def subscribe(
 
 
 @auth.get("/verify")
-async def verify_email(verification_token: str, repo: BaseRepository = Depends(get_repo("mongodb"))) -> dict[str, str]:
+async def verify_email(verification_token: str, repo: BaseRepository = Depends(get_repo())) -> dict[str, str]:
     subscriber: SubscriberRead | None = await repo.find_one("subscribers", {"verification_token": verification_token}, SubscriberRead)
     if not subscriber:
         raise HTTPException(status_code=400, detail="Invalid token")
@@ -51,7 +52,7 @@ async def verify_email(verification_token: str, repo: BaseRepository = Depends(g
 @auth.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    repo: BaseRepository = Depends(get_repo("mongodb")),
+    repo: BaseRepository = Depends(get_repo()),
     settings: Settings = Depends(get_settings),
 ) -> dict[str, str]:
     subscriber: SubscriberRead | None = await repo.verify_subscriber_credentials(form_data.username, form_data.password)
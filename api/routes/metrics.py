@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+from ..db.password_hasher import PasswordHasher
+from ..dependencies import get_password_hasher, get_stripe_event_processor, get_telegram_pipeline, get_telegram_sender, verify_metrics_token
+from ..services.telegram_sender import TelegramSender
+from ..webhooks.stripe_processor import StripeEventProcessor
+from ..webhooks.telegram_pipeline import TelegramUpdatePipeline
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_metrics_token)])
+async def get_metrics(
+    telegram_sender: TelegramSender = Depends(get_telegram_sender),
+    stripe_event_processor: StripeEventProcessor = Depends(get_stripe_event_processor),
+    telegram_pipeline: TelegramUpdatePipeline = Depends(get_telegram_pipeline),
+    password_hasher: PasswordHasher = Depends(get_password_hasher),
+) -> PlainTextResponse:
+    # queue depths are sampled here instead of on every enqueue
+    metrics.QUEUE_DEPTH.set(telegram_sender.queue.qsize(), "telegram_sender")
+    metrics.QUEUE_DEPTH.set(stripe_event_processor.dispatcher.pending, "stripe_events")
+    metrics.QUEUE_DEPTH.set(telegram_pipeline.dispatcher.pending, "telegram_updates")
+    metrics.QUEUE_DEPTH.set(password_hasher.waiting, "password_hashing")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,9 +1,28 @@
 import asyncio
+from datetime import UTC, datetime, timedelta
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
-from ..dependencies import get_admin_user, get_sbat_monitor
-from ..models.sbat import MonitorConfiguration, MonitorStatus
+from ..db.base_repo import BaseRepository
+from ..db.document_view import ReturnMode
+from ..db.response_time_rollups import rollup_stats
+from ..db.slot_stats import month_start, slot_stats_summaries
+from ..dependencies import get_admin_user, get_repo, get_response_time_analytics, get_sbat_monitor
+from ..models.sbat import (
+    MonitorConfiguration,
+    MonitorStatus,
+    NotificationLatencyRead,
+    NotificationReceiptRead,
+    PollTraceRead,
+    ServerResponseTimeAnalyticsRead,
+    ServerResponseTimeRollupRead,
+    ServerResponseTimeStatsRead,
+    SlotStatsRead,
+    SlotStatsSummaryRead,
+)
+from ..services.notification_receipts import latency_percentiles
+from ..services.response_time_analytics import ResponseTimeAnalytics, buckets_csv
 from ..services.sbat_monitor import SbatMonitor
 
 router = APIRouter(dependencies=[Depends(get_admin_user)], tags=["SBAT-monitor"])
@@ -33,6 +52,102 @@ async def get_monitoring_status(sbat_monitor: SbatMonitor = Depends(get_sbat_mon
     return sbat_monitor.status()
 
 
+@router.get("/monitor-status/traces")
+async def get_poll_traces(
+    limit: int = Query(20, ge=1, le=1000), sbat_monitor: SbatMonitor = Depends(get_sbat_monitor)
+) -> list[PollTraceRead]:
+    return [poll_trace.to_read_model() for poll_trace in sbat_monitor.tracer.recent(limit)]
+
+
+@router.get("/monitor-status/traces/otlp")
+async def get_poll_traces_otlp(limit: int = Query(20, ge=1, le=1000), sbat_monitor: SbatMonitor = Depends(get_sbat_monitor)) -> dict:
+    return sbat_monitor.tracer.to_otlp(limit)
+
+
+@router.get("/notification-latency")
+async def get_notification_latency(
+    hours: int = Query(24, ge=1, le=24 * 90), repo: BaseRepository = Depends(get_repo())
+) -> list[NotificationLatencyRead]:
+    receipts: list[dict] = await repo.find(
+        "notification_receipts",
+        {"found_at": {"$gte": datetime.now(UTC) - timedelta(hours=hours)}},
+        NotificationReceiptRead,
+        {"channel": 1, "exam_center_id": 1, "accepted_ms": 1, "outcomes": 1, "_id": 0},
+        ReturnMode.DICT,
+    )
+    return latency_percentiles(receipts)
+
+
+@router.get("/server-response-times")
+async def get_server_response_times(
+    resolution: Literal["minute", "hour"] = "hour",
+    hours: int = Query(24, ge=1, le=24 * 90),
+    exam_center_id: int | None = None,
+    repo: BaseRepository = Depends(get_repo()),
+) -> list[ServerResponseTimeStatsRead]:
+    """SBAT response time statistics per rollup bucket, oldest bucket first."""
+    query_dict: dict = {"resolution": resolution, "bucket_start": {"$gte": datetime.now(UTC) - timedelta(hours=hours)}}
+    if exam_center_id is not None:
+        query_dict["exam_center_id"] = exam_center_id
+    rollups: list[dict] = await repo.find("server_response_time_rollups", query_dict, ServerResponseTimeRollupRead, {"_id": 0}, ReturnMode.DICT)
+    return [rollup_stats(rollup) for rollup in sorted(rollups, key=lambda rollup: (rollup["bucket_start"], rollup["exam_center_id"]))]
+
+
+@router.get("/server-response-times/analytics")
+async def get_server_response_time_analytics(
+    days: int = Query(14, ge=1),
+    by: Literal["hour", "hour_of_day"] = "hour",
+    slow_factor: float = Query(2.0, gt=1),
+    repo: BaseRepository = Depends(get_repo()),
+    analytics: ResponseTimeAnalytics = Depends(get_response_time_analytics),
+) -> ServerResponseTimeAnalyticsRead:
+    """
+    SBAT response time percentiles per exam center and hour (or hour of the day), the windows of hours slower
+    than `slow_factor` times the center's median and the response size trends, from the raw samples.
+    """
+    try:
+        return await analytics.analyze(repo, days, by, slow_factor)
+    except ValueError as ve:
+        raise HTTPException(400, detail=str(ve)) from ve
+
+
+@router.get("/server-response-times/analytics.csv")
+async def export_server_response_time_analytics(
+    days: int = Query(14, ge=1),
+    by: Literal["hour", "hour_of_day"] = "hour",
+    slow_factor: float = Query(2.0, gt=1),
+    repo: BaseRepository = Depends(get_repo()),
+    analytics: ResponseTimeAnalytics = Depends(get_response_time_analytics),
+) -> Response:
+    """The buckets of `/server-response-times/analytics` as CSV, one row per exam center and bucket."""
+    filename: str = f"server-response-times-{by}-{datetime.now(UTC):%Y%m%d}.csv"
+    try:
+        analyzed: ServerResponseTimeAnalyticsRead = await analytics.analyze(repo, days, by, slow_factor)
+    except ValueError as ve:
+        raise HTTPException(400, detail=str(ve)) from ve
+    return Response(
+        buckets_csv(analyzed),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/slot-stats")
+async def get_slot_stats(
+    dimension: Literal["exam_center", "driving_school"] = "exam_center",
+    months: int = Query(12, ge=1, le=120),
+    key: str | None = None,
+    by_month: bool = False,
+    repo: BaseRepository = Depends(get_repo()),
+) -> list[SlotStatsSummaryRead]:
+    """Slots found, taken and re-released with time to take percentiles per exam center or driving school, from the monthly aggregates."""
+    query_dict: dict = {"dimension": dimension, "month": {"$gte": month_start(datetime.now(UTC), months - 1)}}
+    if key is not None:
+        query_dict["key"] = key
+    aggregates: list[dict] = await repo.find("slot_stats", query_dict, SlotStatsRead, {"_id": 0}, ReturnMode.DICT)
+    return slot_stats_summaries(aggregates, by_month)
+
+
 @router.delete("/shutdown")
 async def stop_monitoring(sbat_monitor: SbatMonitor = Depends(get_sbat_monitor)) -> MonitorStatus:
     try:
@@ -23,7 +23,7 @@ async def read_users_me(current_user: SubscriberRead = Depends(get_current_user)
 
 @router.patch("/me/telegram-account")
 async def update_telegram_account(
-    telegram_user: dict, current_user: SubscriberRead = Depends(get_current_user), repo: BaseRepository = Depends(get_repo("mongodb"))
+    telegram_user: dict, current_user: SubscriberRead = Depends(get_current_user), repo: BaseRepository = Depends(get_repo())
 ) -> BasicApiResponse:
     await repo.update_one("subscribers", {"_id": ObjectId(current_user.id)}, {"telegram_user": telegram_user}, SubscriberRead)
     return BasicApiResponse(detail="Telegram account updated!")
@@ -34,7 +34,7 @@ async def update_discord_account(
     token: Annotated[Optional[str], Body(description="OAuth2 token to fetch Discord user data if provided.")] = None,
     discord_user: Annotated[Optional[dict], Body(description="Dictionary containing the Discord user data.")] = None,
     current_user: SubscriberRead = Depends(get_current_user),
-    repo: BaseRepository = Depends(get_repo("mongodb")),
+    repo: BaseRepository = Depends(get_repo()),
     settings: Settings = Depends(get_settings),
 ) -> BasicApiResponse:
     discord_user_id: str = current_user.discord_user.get("id")
@@ -65,7 +65,7 @@ async def update_users_monitoring_preferences(
     preferences: MonitorPreferences,
     background_tasks: BackgroundTasks,
     current_user=Depends(get_current_user),
-    repo: BaseRepository = Depends(get_repo("mongodb")),
+    repo: BaseRepository = Depends(get_repo()),
     settings: Settings = Depends(get_settings),
 ) -> BasicApiResponse:
     await repo.update_one(
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from ..db.base_repo import BaseRepository
+
+
+class Housekeeper:
+    """
+    Deletes the expired SBAT request log rows, notification receipts and server response times every `interval` seconds.
+
+    On MongoDB TTL indexes expire most of them as well and the purge catches up on what the TTL monitor has not
+    removed yet, on the other backends it is the only expiry. The write paths in the poll loop only insert.
+    """
+
+    def __init__(self, interval: float = 3600, server_response_time_ttl: timedelta = timedelta(days=14)) -> None:
+        self.interval: float = interval
+        self.server_response_time_ttl: timedelta = server_response_time_ttl
+        self.last_run_at: datetime | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self, repo: BaseRepository) -> None:
+        if not self.task:
+            self.task = asyncio.create_task(self._run(repo))
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self, repo: BaseRepository) -> None:
+        while True:
+            try:
+                await self.purge(repo)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # whatever is left expires on the next run
+                print(f"Failed to purge expired documents: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def purge(self, repo: BaseRepository) -> dict[str, int]:
+        now: datetime = datetime.now(UTC)
+        deleted: dict[str, int] = {
+            "SBAT request log rows": await repo.delete_expired_sbat_requests(now),
+            "notification receipts": await repo.delete_expired_notification_receipts(now),
+            "server response times": await repo.delete_expired_server_response_times(now, self.server_response_time_ttl),
+        }
+        self.last_run_at = now
+        for name, count in deleted.items():
+            if count:
+                print(f"Deleted {count} expired {name}")
+        return deleted
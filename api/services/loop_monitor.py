@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import UTC, datetime
+
+from .. import metrics
+from ..models.diagnostics import LoopDiagnosticsRead, LoopStallRead
+
+MAX_STACK_FRAMES = 30
+
+
+class LoopLagMonitor:
+    """
+    Samples event loop lag and catches callbacks that block the loop, together with the stack that blocks it.
+
+    A task sleeps `interval` seconds and records how much later than that it woke up. A watchdog thread
+    schedules a no-op on the loop every `interval` seconds, when the loop has not run it after
+    `slow_callback_threshold` seconds the loop thread's stack is captured, which points at the blocking call,
+    and the stall is recorded with its full duration once the loop is responsive again.
+    """
+
+    def __init__(self, interval: float = 0.5, slow_callback_threshold: float = 0.25, capacity: int = 50) -> None:
+        self.interval: float = interval
+        self.slow_callback_threshold: float = slow_callback_threshold
+        self.lags: deque[float] = deque(maxlen=max(1, int(60 / interval)))
+        self.stalls: deque[LoopStallRead] = deque(maxlen=capacity)
+        self.stall_count: int = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.loop_thread_id: int | None = None
+        self.task: asyncio.Task | None = None
+        self.watchdog: threading.Thread | None = None
+        self.stopped: threading.Event = threading.Event()
+
+    def start(self) -> None:
+        if self.task:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.task = asyncio.create_task(self._sample())
+        self.watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.watchdog.start()
+
+    async def stop(self) -> None:
+        self.stopped.set()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.watchdog:
+            await asyncio.to_thread(self.watchdog.join)
+            self.watchdog = None
+
+    async def _sample(self) -> None:
+        while True:
+            expected_at: float = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag: float = max(0.0, self.loop.time() - expected_at)
+            self.lags.append(lag)
+            metrics.LOOP_LAG_SECONDS.observe(lag)
+
+    def _watch(self) -> None:
+        while not self.stopped.wait(self.interval):
+            sent_at: float = time.perf_counter()
+            answered: threading.Event = threading.Event()
+            try:
+                self.loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:  # the loop is closed
+                return
+            if answered.wait(self.slow_callback_threshold):
+                continue
+
+            detected_at: datetime = datetime.now(UTC)
+            stack: list[str] = self._loop_stack()
+            while not answered.wait(self.interval):
+                if self.stopped.is_set():
+                    return
+            stall = LoopStallRead(detected_at=detected_at, duration_ms=(time.perf_counter() - sent_at) * 1000, stack=stack)
+            # metrics and the stall buffer are only touched from the loop thread
+            self.loop.call_soon_threadsafe(self._record_stall, stall)
+
+    def _loop_stack(self) -> list[str]:
+        frame = sys._current_frames().get(self.loop_thread_id)  # pylint: disable=protected-access
+        if frame is None:
+            return []
+        return [line.rstrip() for line in traceback.format_stack(frame)[-MAX_STACK_FRAMES:]]
+
+    def _record_stall(self, stall: LoopStallRead) -> None:
+        self.stalls.append(stall)
+        self.stall_count += 1
+        metrics.LOOP_STALLS.inc()
+        print(f"Event loop blocked for {stall.duration_ms:.0f} ms in:\n" + "\n".join(stall.stack[-5:]))
+
+    def median_lag(self) -> float:
+        ordered: list[float] = sorted(self.lags)
+        return ordered[len(ordered) // 2] if ordered else 0.0
+
+    def diagnostics(self, limit: int = 10) -> LoopDiagnosticsRead:
+        ordered: list[float] = sorted(self.lags)
+        return LoopDiagnosticsRead(
+            running=self.task is not None and not self.task.done(),
+            interval_ms=self.interval * 1000,
+            slow_callback_threshold_ms=self.slow_callback_threshold * 1000,
+            samples=len(ordered),
+            lag_last_ms=self.lags[-1] * 1000 if self.lags else None,
+            lag_p50_ms=ordered[len(ordered) // 2] * 1000 if ordered else None,
+            lag_p99_ms=ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000 if ordered else None,
+            lag_max_ms=ordered[-1] * 1000 if ordered else None,
+            stalls=self.stall_count,
+            recent_stalls=list(reversed(self.stalls))[:limit],
+        )
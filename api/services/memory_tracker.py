@@ -0,0 +1,175 @@
+import asyncio
+import gc
+import heapq
+import os
+import signal
+import tracemalloc
+from collections import Counter, deque
+from datetime import UTC, datetime
+from typing import Literal
+
+import httpx
+import psutil
+from pydantic import BaseModel
+
+from .. import metrics
+from ..models.diagnostics import MemoryDiagnosticsRead, MemoryGrowthRead, MemorySampleRead
+
+# allocation sites left out of the growth lists, they belong to the tracker itself or to imports
+IGNORED_FILENAMES: tuple[str, ...] = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+Allocations = dict[tuple[str, ...], tuple[int, int]]
+
+
+def _is_tracked_type(cls: type) -> bool:
+    # our own models plus the httpx clients, which leak when a per-call client is never closed
+    return (issubclass(cls, BaseModel) and cls.__module__.startswith("api.models")) or issubclass(cls, httpx.AsyncClient)
+
+
+class MemoryTracker:
+    """
+    Follows the memory of the long running process every `interval` seconds.
+
+    Each sample records the RSS, the live instances of the `api.models` classes and of httpx.AsyncClient, and
+    with `tracemalloc_frames` > 0 the size and count per allocation site from a tracemalloc snapshot, so the sites
+    that grew since the start or the previous sample can be listed. Only the per-site totals are kept, a snapshot
+    of a few hundred thousand traces would cost more memory than it helps find. The RSS trend is the least
+    squares slope over the kept samples. Past an optional soft limit the process sends itself SIGTERM once,
+    uvicorn then shuts down gracefully and the container's restart policy brings it back.
+    """
+
+    def __init__(
+        self, interval: float = 300, tracemalloc_frames: int = 0, soft_limit_mb: int | None = None, capacity: int = 288
+    ) -> None:
+        self.interval: float = interval
+        self.tracemalloc_frames: int = tracemalloc_frames
+        self.soft_limit_bytes: int | None = soft_limit_mb * 1024 * 1024 if soft_limit_mb else None
+        self.samples: deque[MemorySampleRead] = deque(maxlen=capacity)
+        self.object_counts: dict[str, int] = {}
+        self.baseline: Allocations | None = None
+        self.previous: Allocations | None = None
+        self.latest: Allocations | None = None
+        self.restart_requested_at: datetime | None = None
+        self.process: psutil.Process = psutil.Process()
+        self.tracked_types: dict[type, bool] = {}
+        self.task: asyncio.Task | None = None
+        # a refresh from the diagnostics route may come in while the loop samples
+        self.lock = asyncio.Lock()
+
+    def start(self) -> None:
+        if self.task:
+            return
+        if self.tracemalloc_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    def _allocations(self) -> Allocations:
+        key_type: str = "traceback" if self.tracemalloc_frames > 1 else "lineno"
+        return {
+            tuple(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback): (stat.size, stat.count)
+            for stat in tracemalloc.take_snapshot().statistics(key_type)
+            if not any(frame.filename in IGNORED_FILENAMES for frame in stat.traceback)
+        }
+
+    def _count_objects(self) -> dict[str, int]:
+        counts: Counter[str] = Counter()
+        for obj in gc.get_objects():
+            cls: type = type(obj)
+            tracked: bool | None = self.tracked_types.get(cls)
+            if tracked is None:
+                tracked = self.tracked_types[cls] = _is_tracked_type(cls)
+            if tracked:
+                counts[cls.__name__] += 1
+        return dict(counts.most_common())
+
+    async def sample(self) -> MemorySampleRead:
+        async with self.lock:
+            # the heap walks run on a worker thread, which still holds the GIL but lets the event loop in between
+            if tracemalloc.is_tracing():
+                allocations: Allocations = await asyncio.to_thread(self._allocations)
+                self.previous, self.latest = self.latest, allocations
+                self.baseline = self.baseline or allocations
+
+            sample = MemorySampleRead(
+                timestamp=datetime.now(UTC),
+                rss_bytes=self.process.memory_info().rss,
+                traced_bytes=tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+            )
+            self.samples.append(sample)
+            previous_counts: dict[str, int] = self.object_counts
+            self.object_counts = await asyncio.to_thread(self._count_objects)
+
+            metrics.PROCESS_RSS_BYTES.set(sample.rss_bytes)
+            if sample.traced_bytes is not None:
+                metrics.TRACED_MEMORY_BYTES.set(sample.traced_bytes)
+            for name, count in self.object_counts.items():
+                metrics.MODEL_INSTANCES.set(count, name)
+            # classes without live instances drop out of the counts, their gauges go back to zero
+            for name in previous_counts.keys() - self.object_counts.keys():
+                metrics.MODEL_INSTANCES.set(0, name)
+
+            if self.soft_limit_bytes and sample.rss_bytes > self.soft_limit_bytes and not self.restart_requested_at:
+                self.restart_requested_at = sample.timestamp
+                print(f"RSS of {sample.rss_bytes / 2**20:.0f} MiB is above the soft limit of {self.soft_limit_bytes / 2**20:.0f} MiB, restarting")
+                os.kill(os.getpid(), signal.SIGTERM)
+            return sample
+
+    def rss_trend(self) -> float | None:
+        """Least squares slope of the RSS samples in bytes per hour."""
+        if len(self.samples) < 2:
+            return None
+        start: datetime = self.samples[0].timestamp
+        hours: list[float] = [(sample.timestamp - start).total_seconds() / 3600 for sample in self.samples]
+        rss: list[int] = [sample.rss_bytes for sample in self.samples]
+        mean_hours: float = sum(hours) / len(hours)
+        mean_rss: float = sum(rss) / len(rss)
+        variance: float = sum((hour - mean_hours) ** 2 for hour in hours)
+        if not variance:
+            return None
+        return sum((hour - mean_hours) * (value - mean_rss) for hour, value in zip(hours, rss)) / variance
+
+    def top_growth(self, compare_to: Literal["baseline", "previous"], limit: int) -> list[MemoryGrowthRead]:
+        reference: Allocations | None = self.baseline if compare_to == "baseline" else self.previous
+        if not self.latest or not reference:
+            return []
+        growing: list[tuple[str, ...]] = heapq.nlargest(
+            limit, self.latest, key=lambda location: self.latest[location][0] - reference.get(location, (0, 0))[0]
+        )
+        return [
+            MemoryGrowthRead(
+                location=list(location),
+                size_bytes=self.latest[location][0],
+                size_diff_bytes=self.latest[location][0] - reference.get(location, (0, 0))[0],
+                count=self.latest[location][1],
+                count_diff=self.latest[location][1] - reference.get(location, (0, 0))[1],
+            )
+            for location in growing
+        ]
+
+    def diagnostics(self, compare_to: Literal["baseline", "previous"] = "baseline", limit: int = 15) -> MemoryDiagnosticsRead:
+        return MemoryDiagnosticsRead(
+            running=self.task is not None and not self.task.done(),
+            interval_seconds=self.interval,
+            tracemalloc=tracemalloc.is_tracing(),
+            soft_limit_bytes=self.soft_limit_bytes,
+            restart_requested_at=self.restart_requested_at,
+            rss_bytes=self.samples[-1].rss_bytes if self.samples else None,
+            rss_trend_bytes_per_hour=self.rss_trend(),
+            object_counts=self.object_counts,
+            top_growth=self.top_growth(compare_to, limit),
+            samples=list(self.samples),
+        )
@@ -0,0 +1,93 @@
+import math
+import secrets
+from datetime import datetime, timedelta
+from typing import Literal
+
+from .. import metrics
+from ..models.sbat import EXAM_CENTER_MAP, NotificationLatencyRead, NotificationReceiptCreate
+
+Outcome = Literal["accepted", "failed"]
+
+
+class AlertReceipts:
+    """
+    Collects the per-recipient delivery receipts of one alert on one channel.
+
+    Every alert gets a correlation id when its slots are found, receipts are kept as the millisecond
+    offset from `found_at` so a channel's latency is measured from the moment the slot was seen.
+    """
+
+    def __init__(
+        self, alert_id: str, channel: str, exam_center_id: int, license_type: str, exam_ids: list[int], found_at: datetime
+    ) -> None:
+        self.alert_id: str = alert_id
+        self.channel: str = channel
+        self.exam_center_id: int = exam_center_id
+        self.license_type: str = license_type
+        self.exam_ids: list[int] = exam_ids
+        self.found_at: datetime = found_at
+        self.recipients: list[str] = []
+        self.accepted_ms: list[int | None] = []
+        self.outcomes: list[Outcome] = []
+
+    @staticmethod
+    def new_alert_id() -> str:
+        return secrets.token_hex(8)
+
+    def add(self, recipient: str | int, outcome: Outcome, at: datetime) -> None:
+        latency_ms: int = round((at - self.found_at).total_seconds() * 1000)
+        self.recipients.append(str(recipient))
+        self.accepted_ms.append(latency_ms if outcome == "accepted" else None)
+        self.outcomes.append(outcome)
+        metrics.NOTIFICATION_DELIVERIES.inc(self.channel, outcome)
+        if outcome == "accepted":
+            metrics.NOTIFICATION_DELIVERY_SECONDS.observe(latency_ms / 1000, self.channel, EXAM_CENTER_MAP.get(self.exam_center_id, ""))
+
+    def to_model(self, ttl: timedelta) -> NotificationReceiptCreate:
+        return NotificationReceiptCreate(
+            alert_id=self.alert_id,
+            channel=self.channel,
+            exam_center_id=self.exam_center_id,
+            license_type=self.license_type,
+            exam_ids=self.exam_ids,
+            found_at=self.found_at,
+            expires_at=self.found_at + ttl,
+            recipients=self.recipients,
+            accepted_ms=self.accepted_ms,
+            outcomes=self.outcomes,
+        )
+
+
+def _percentile(ordered: list[int], q: float) -> float | None:
+    """Nearest-rank percentile of sorted values, q in [0, 100]."""
+    if not ordered:
+        return None
+    return float(ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)])
+
+
+def latency_percentiles(receipts: list[dict]) -> list[NotificationLatencyRead]:
+    """Delivery latency percentiles per channel and exam center over receipt documents."""
+    latencies: dict[tuple[str, int], list[int]] = {}
+    failures: dict[tuple[str, int], int] = {}
+    for receipt in receipts:
+        key: tuple[str, int] = (receipt["channel"], receipt["exam_center_id"])
+        latencies.setdefault(key, []).extend(latency for latency in receipt["accepted_ms"] if latency is not None)
+        failures[key] = failures.get(key, 0) + receipt["outcomes"].count("failed")
+
+    results: list[NotificationLatencyRead] = []
+    for (channel, exam_center_id), accepted in sorted(latencies.items()):
+        accepted.sort()
+        failed: int = failures[(channel, exam_center_id)]
+        results.append(
+            NotificationLatencyRead(
+                channel=channel,
+                exam_center=EXAM_CENTER_MAP.get(exam_center_id, str(exam_center_id)),
+                receipts=len(accepted) + failed,
+                failed=failed,
+                p50_ms=_percentile(accepted, 50),
+                p90_ms=_percentile(accepted, 90),
+                p99_ms=_percentile(accepted, 99),
+                max_ms=float(accepted[-1]) if accepted else None,
+            )
+        )
+    return results
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class OrderedDispatcher:
+    """
+    Runs jobs concurrently across keys while keeping submission order within a key.
+
+    Each submitted job waits for the previous job with the same key to finish, and a semaphore
+    bounds how many jobs run at the same time over all keys.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending: int = 0
+        self._tails: dict[Hashable, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, job: Callable[[], Awaitable[T]]) -> T:
+        previous: asyncio.Future | None = self._tails.get(key)
+        done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        self.pending += 1
+        try:
+            if previous:
+                await asyncio.shield(previous)
+            async with self.semaphore:
+                return await job()
+        finally:
+            self.pending -= 1
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    def schedule(self, key: Hashable, job: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """Submit a job without waiting for it, the order between scheduled jobs of a key is kept."""
+        task: asyncio.Task = asyncio.create_task(self.submit(key, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import threading
+from datetime import UTC, datetime
+from typing import IO, Iterator
+
+
+class PollRecorder:
+    """
+    Appends raw successful poll payloads to a gzip compressed JSON lines file.
+
+    The path may contain strftime placeholders (e.g. `recordings/sbat-%Y-%m-%d.jsonl.gz`) to get one file per day.
+    Each record is flushed on write, so a crash loses at most the record being written.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.records: int = 0
+        self._file: IO[bytes] | None = None
+        self._current_path: str | None = None
+        self._lock = threading.Lock()
+
+    def write(self, request_body: dict, payload: list[dict], received_at: datetime, elapsed_seconds: float) -> None:
+        record: dict = {
+            "received_at": received_at.isoformat(),
+            "elapsed_seconds": elapsed_seconds,
+            "request_body": request_body,
+            "payload": payload,
+        }
+        line: bytes = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            file: IO[bytes] = self._open(received_at.strftime(self.path))
+            file.write(line)
+            file.flush()  # sync flush, everything up to here can be decompressed
+            self.records += 1
+
+    def _open(self, path: str) -> IO[bytes]:
+        if self._file is None or path != self._current_path:
+            self._close()
+            directory: str = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # appending starts a new gzip member, readers see the members as one stream
+            self._file = gzip.open(path, "ab")
+            self._current_path = path
+        return self._file
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._current_path = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+def read_recording(path: str) -> Iterator[dict]:
+    """Yields the records of a recording with `received_at` parsed, a truncated last record is skipped."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    record: dict = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                received_at: datetime = datetime.fromisoformat(record["received_at"])
+                record["received_at"] = received_at if received_at.tzinfo else received_at.replace(tzinfo=UTC)
+                yield record
+        except EOFError:
+            # the recorder was not closed cleanly, the gzip trailer is missing
+            return
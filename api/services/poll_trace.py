@@ -0,0 +1,176 @@
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from typing import Any, Iterator
+
+from ..models.sbat import PollSpanRead, PollTraceRead
+
+current_trace: ContextVar["PollTrace | None"] = ContextVar("current_poll_trace", default=None)
+
+
+class Span:
+    """One timed phase of a poll, use as a context manager, nested spans get it as their parent."""
+
+    __slots__ = ("trace", "name", "span_id", "parent", "started_at", "ended_at", "attributes")
+
+    def __init__(self, trace: "PollTrace", name: str, parent: "Span | None", attributes: dict[str, Any]) -> None:
+        self.trace: PollTrace = trace
+        self.name: str = name
+        self.span_id: str = secrets.token_hex(8)
+        self.parent: Span | None = parent
+        self.started_at: float = 0.0
+        self.ended_at: float | None = None
+        self.attributes: dict[str, Any] = attributes
+
+    def set_attribute(self, key: str, value: str | int | float | bool) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self.started_at = time.perf_counter()
+        self.trace.stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.ended_at = time.perf_counter()
+        if exc_info[0] is not None:
+            self.attributes["error"] = exc_info[0].__name__
+        self.trace.stack.pop()
+
+
+class _NoSpan:
+    """Stands in for a span outside of a traced poll, so instrumented code needs no checks."""
+
+    def set_attribute(self, key: str, value: str | int | float | bool) -> None:
+        pass
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class PollTrace:
+    """The phase timeline of one poll of an exam center, timed with perf_counter and anchored to the wall clock."""
+
+    def __init__(self, exam_center: str, license_type: str) -> None:
+        self.trace_id: str = secrets.token_hex(16)
+        self.exam_center: str = exam_center
+        self.license_type: str = license_type
+        self.started_at: datetime = datetime.now(UTC)
+        self.started_at_perf: float = time.perf_counter()
+        self.spans: list[Span] = []
+        self.stack: list[Span] = []
+
+    def span(self, name: str, **attributes: Any) -> Span:
+        span = Span(self, name, self.stack[-1] if self.stack else None, attributes)
+        self.spans.append(span)
+        return span
+
+    def _offset_ms(self, perf_counter: float) -> float:
+        return (perf_counter - self.started_at_perf) * 1000
+
+    def _unix_nano(self, perf_counter: float) -> int:
+        return int(self.started_at.timestamp() * 1e9 + (perf_counter - self.started_at_perf) * 1e9)
+
+    def to_read_model(self) -> PollTraceRead:
+        root: Span | None = self.spans[0] if self.spans else None
+        return PollTraceRead(
+            trace_id=self.trace_id,
+            exam_center=self.exam_center,
+            license_type=self.license_type,
+            started_at=self.started_at,
+            duration_ms=(root.ended_at - root.started_at) * 1000 if root and root.ended_at else None,
+            spans=[
+                PollSpanRead(
+                    name=span.name,
+                    span_id=span.span_id,
+                    parent_span_id=span.parent.span_id if span.parent else None,
+                    start_offset_ms=self._offset_ms(span.started_at),
+                    duration_ms=(span.ended_at - span.started_at) * 1000 if span.ended_at else None,
+                    attributes=span.attributes,
+                )
+                for span in self.spans
+            ],
+        )
+
+    def to_otlp_spans(self) -> list[dict]:
+        """The spans in the OTLP/JSON encoding (hex ids, nanosecond timestamps as strings, typed attribute values)."""
+        otlp_spans: list[dict] = []
+        for span in self.spans:
+            attributes: dict[str, Any] = {"exam_center": self.exam_center, "license_type": self.license_type, **span.attributes}
+            otlp_span: dict = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(self._unix_nano(span.started_at)),
+                "endTimeUnixNano": str(self._unix_nano(span.ended_at if span.ended_at else span.started_at)),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()],
+            }
+            if span.parent:
+                otlp_span["parentSpanId"] = span.parent.span_id
+            if "error" in span.attributes:
+                otlp_span["status"] = {"code": 2, "message": str(span.attributes["error"])}
+            otlp_spans.append(otlp_span)
+        return otlp_spans
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def span(name: str, **attributes: Any) -> Span | _NoSpan:
+    """A span in the poll traced by the current task, or a no-op outside of a traced poll."""
+    trace: PollTrace | None = current_trace.get()
+    return trace.span(name, **attributes) if trace else NO_SPAN
+
+
+class PollTracer:
+    """Keeps the phase timelines of the last `capacity` polls in a ring buffer."""
+
+    def __init__(self, capacity: int = 100) -> None:
+        self.traces: deque[PollTrace] = deque(maxlen=capacity)
+
+    @contextmanager
+    def trace(self, exam_center: str, license_type: str) -> Iterator[PollTrace]:
+        poll_trace = PollTrace(exam_center, license_type)
+        token = current_trace.set(poll_trace)
+        try:
+            with poll_trace.span("poll"):
+                yield poll_trace
+        finally:
+            current_trace.reset(token)
+            self.traces.append(poll_trace)
+
+    def recent(self, limit: int) -> list[PollTrace]:
+        """The last `limit` traces, newest first."""
+        return list(reversed(self.traces))[:limit]
+
+    def to_otlp(self, limit: int) -> dict:
+        """The recent traces as an OTLP/JSON ExportTraceServiceRequest, ready to POST to a collector's /v1/traces."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "sbat-monitor"}}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [otlp_span for poll_trace in self.recent(limit) for otlp_span in poll_trace.to_otlp_spans()],
+                        }
+                    ],
+                }
+            ]
+        }
@@ -0,0 +1,126 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+# leaf functions in which a thread waits (the event loop on I/O, pool workers for jobs) instead of using CPU
+IDLE_FUNCTIONS: frozenset[str] = frozenset({"select", "poll", "wait"})
+# where the event loop calls into a callback or task step, the frames above it are the same in every sample
+LOOP_CALLBACK_CODE = asyncio.events.Handle._run.__code__  # pylint: disable=protected-access
+MIN_INTERVAL = 0.001
+MAX_OVERHEAD = 0.05
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    path: str = code.co_filename
+    relative: str = os.path.relpath(path) if path.startswith(os.getcwd()) else os.sep.join(path.split(os.sep)[-2:])
+    return f"{code.co_qualname} ({relative}:{code.co_firstlineno})"
+
+
+def _task_label(loop: asyncio.AbstractEventLoop) -> str | None:
+    """The coroutine of the task the loop is stepping right now, read from the sampling thread."""
+    task: asyncio.Task | None = asyncio.current_task(loop)
+    return f"task {task.get_coro().__qualname__}" if task else None
+
+
+class Profiler:
+    """
+    Time-bounded profiling sessions over the live process, one at a time.
+
+    `sample` walks the stacks of the event loop thread (or every thread) from a background thread with
+    sys._current_frames and returns them in the collapsed format of flamegraph.pl and speedscope, with the
+    asyncio task the loop was stepping as the root frame (instead of the event loop frames) so the poll loop,
+    webhook handlers and requests separate. The sampling interval doubles whenever the sampler would use more than MAX_OVERHEAD of a core.
+    `trace` runs cProfile on the event loop thread instead, which sees every call but slows the loop down.
+    """
+
+    def __init__(self, max_seconds: float = 60) -> None:
+        self.max_seconds: float = max_seconds
+        self.lock: threading.Lock = threading.Lock()
+
+    def _acquire(self, seconds: float) -> float:
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profiling session is already running")
+        return min(seconds, self.max_seconds)
+
+    async def sample(
+        self, seconds: float, interval: float = 0.005, all_threads: bool = False, include_idle: bool = False
+    ) -> tuple[str, float]:
+        """Collapsed stacks sampled over `seconds`, and the sampling interval the session ended with."""
+        seconds = self._acquire(seconds)
+        interval = max(interval, MIN_INTERVAL)
+        # the sampler thread needs the GIL to look at a busy loop thread, without a shorter switch interval it
+        # only gets it once the loop waits on I/O and the samples would show the loop idle
+        switch_interval: float = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, interval / 4))
+        try:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            stacks, interval = await asyncio.to_thread(self._sample, loop, threading.get_ident(), seconds, interval, all_threads, include_idle)
+        finally:
+            sys.setswitchinterval(switch_interval)
+            self.lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()), interval
+
+    def _sample(
+        self, loop: asyncio.AbstractEventLoop, loop_thread_id: int, seconds: float, interval: float, all_threads: bool, include_idle: bool
+    ) -> tuple[Counter[str], float]:
+        stacks: Counter[str] = Counter()
+        own_thread_id: int = threading.get_ident()
+        thread_names: dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline: float = time.perf_counter() + seconds
+        # overhead is accounted per one second window
+        window_started_at: float = time.perf_counter()
+        window_cost: float = 0.0
+
+        while (sampled_at := time.perf_counter()) < deadline:
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if thread_id == own_thread_id or (not all_threads and thread_id != loop_thread_id):
+                    continue
+                if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                labels: list[str] = []
+                while frame is not None and frame.f_code is not LOOP_CALLBACK_CODE:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if thread_id == loop_thread_id and frame is not None:
+                    labels.append(_task_label(loop) or "callback")
+                if all_threads:
+                    labels.append(f"thread {thread_names.get(thread_id, thread_id)}")
+                stacks[";".join(reversed(labels))] += 1
+
+            now: float = time.perf_counter()
+            window_cost += now - sampled_at
+            if now - window_started_at >= 1.0:
+                if window_cost > MAX_OVERHEAD * (now - window_started_at):
+                    interval *= 2
+                window_started_at, window_cost = now, 0.0
+            time.sleep(interval)
+        return stacks, interval
+
+    async def trace(self, seconds: float) -> bytes:
+        """cProfile of the event loop thread over `seconds`, as a pstats file."""
+        seconds = self._acquire(seconds)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        finally:
+            self.lock.release()
+        profile.create_stats()
+        buffer = io.BytesIO()
+        marshal.dump(profile.stats, buffer)
+        return buffer.getvalue()
@@ -0,0 +1,236 @@
+import asyncio
+import csv
+import io
+import os
+from datetime import UTC, datetime, timedelta
+from typing import Literal
+
+import numpy as np
+
+from ..db.base_repo import BaseRepository
+from ..db.document_view import ReturnMode
+from ..models.sbat import (
+    EXAM_CENTER_MAP,
+    ResponseSizeTrendRead,
+    ResponseTimeBucketRead,
+    ServerResponseTimeAnalyticsRead,
+    ServerResponseTimeRead,
+    SlownessWindowRead,
+)
+
+Columns = dict[str, np.ndarray]
+
+COLUMN_TYPES: dict[str, type] = {"start": np.float64, "duration_ms": np.float64, "response_size": np.int64, "exam_center_id": np.int64}
+# a sample is stored once its request finished, starts newer than this are loaded on a later refresh
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def _timestamp(at: datetime) -> float:
+    # the databases return naive UTC datetimes
+    return (at if at.tzinfo else at.replace(tzinfo=UTC)).timestamp()
+
+
+def _empty_columns() -> Columns:
+    return {name: np.empty(0, dtype) for name, dtype in COLUMN_TYPES.items()}
+
+
+def _to_columns(samples: list[dict]) -> Columns:
+    count: int = len(samples)
+    start = np.fromiter((_timestamp(sample["start"]) for sample in samples), np.float64, count)
+    return {
+        "start": start,
+        # differences of the datetimes, epoch seconds as floats would round the durations to about a microsecond
+        "duration_ms": np.fromiter(((sample["end"] - sample["start"]).total_seconds() * 1000 for sample in samples), np.float64, count),
+        "response_size": np.fromiter((sample["response_size"] for sample in samples), np.int64, count),
+        "exam_center_id": np.fromiter((sample["request_body"].get("examCenterId") or 0 for sample in samples), np.int64, count),
+    }
+
+
+def _exam_center(exam_center_id: int) -> str:
+    return EXAM_CENTER_MAP.get(int(exam_center_id), str(exam_center_id))
+
+
+def analyze(columns: Columns, since: datetime, until: datetime, by: Literal["hour", "hour_of_day"], slow_factor: float) -> ServerResponseTimeAnalyticsRead:
+    """
+    Percentiles per exam center and bucket, slowness windows and response size trends of the samples in [since, until).
+
+    One lexsort orders the samples by exam center, bucket and duration, after which every per-bucket statistic
+    is a reduction over contiguous slices and every percentile a gather at computed offsets.
+    """
+    selected: np.ndarray = (columns["start"] >= since.timestamp()) & (columns["start"] < until.timestamp())
+    start, duration, size, center = (columns[name][selected] for name in ("start", "duration_ms", "response_size", "exam_center_id"))
+    analytics = ServerResponseTimeAnalyticsRead(
+        since=since,
+        until=until,
+        first_sample_at=datetime.fromtimestamp(start.min(), UTC) if len(start) else None,
+        by=by,
+        count=len(start),
+        buckets=[],
+        slowness_windows=[],
+        response_size_trends=[],
+    )
+    if not len(start):
+        return analytics
+
+    hour: np.ndarray = start // 3600
+    bucket: np.ndarray = hour % 24 if by == "hour_of_day" else hour
+    order: np.ndarray = np.lexsort((duration, bucket, center))
+    start, duration, size, center, bucket = start[order], duration[order], size[order], center[order], bucket[order]
+
+    first: np.ndarray = np.flatnonzero(np.concatenate(([True], (np.diff(center) != 0) | (np.diff(bucket) != 0))))
+    counts: np.ndarray = np.diff(np.append(first, len(duration)))
+    bucket_center: np.ndarray = center[first]
+    bucket_key: np.ndarray = bucket[first]
+
+    def quantile(q: float) -> np.ndarray:
+        # linear interpolation between the closest ranks, as numpy.quantile's default
+        position: np.ndarray = first + q * (counts - 1)
+        low: np.ndarray = np.floor(position).astype(np.int64)
+        high: np.ndarray = np.ceil(position).astype(np.int64)
+        return duration[low] + (duration[high] - duration[low]) * (position - low)
+
+    p50: np.ndarray = quantile(0.5)
+    p90: np.ndarray = quantile(0.9)
+    p99: np.ndarray = quantile(0.99)
+    mean: np.ndarray = np.add.reduceat(duration, first) / counts
+    mean_size: np.ndarray = np.add.reduceat(size, first) / counts
+    maximum: np.ndarray = duration[first + counts - 1]
+
+    # a bucket is slow next to the median p50 of its exam center's buckets, the buckets are already grouped by center
+    centers, center_first, center_buckets = np.unique(bucket_center, return_index=True, return_counts=True)
+    by_p50: np.ndarray = np.lexsort((p50, bucket_center))
+    center_median: np.ndarray = (p50[by_p50[center_first + (center_buckets - 1) // 2]] + p50[by_p50[center_first + center_buckets // 2]]) / 2
+    slow: np.ndarray = p50 > slow_factor * np.repeat(center_median, center_buckets)
+
+    for i in range(len(first)):
+        analytics.buckets.append(
+            ResponseTimeBucketRead(
+                exam_center=_exam_center(bucket_center[i]),
+                hour=datetime.fromtimestamp(bucket_key[i] * 3600, UTC) if by == "hour" else None,
+                hour_of_day=int(bucket_key[i] % 24),
+                count=int(counts[i]),
+                mean_ms=float(mean[i]),
+                p50_ms=float(p50[i]),
+                p90_ms=float(p90[i]),
+                p99_ms=float(p99[i]),
+                max_ms=float(maximum[i]),
+                mean_response_bytes=float(mean_size[i]),
+                slow=bool(slow[i]),
+            )
+        )
+
+    # a window starts at every slow bucket that does not directly follow a slow bucket of the same exam center
+    slow_buckets: np.ndarray = np.flatnonzero(slow)
+    if len(slow_buckets):
+        opens: np.ndarray = np.concatenate(
+            ([True], (np.diff(bucket_center[slow_buckets]) != 0) | (np.diff(bucket_key[slow_buckets]) != 1))
+        )
+        window_first: np.ndarray = np.flatnonzero(opens)
+        window_counts: np.ndarray = np.add.reduceat(counts[slow_buckets], window_first)
+        window_p50: np.ndarray = np.maximum.reduceat(p50[slow_buckets], window_first)
+        window_hours: np.ndarray = np.diff(np.append(window_first, len(slow_buckets)))
+        for i, bucket_index in enumerate(slow_buckets[window_first]):
+            analytics.slowness_windows.append(
+                SlownessWindowRead(
+                    exam_center=_exam_center(bucket_center[bucket_index]),
+                    first_hour=datetime.fromtimestamp(bucket_key[bucket_index] * 3600, UTC) if by == "hour" else None,
+                    first_hour_of_day=int(bucket_key[bucket_index] % 24),
+                    hours=int(window_hours[i]),
+                    count=int(window_counts[i]),
+                    max_p50_ms=float(window_p50[i]),
+                )
+            )
+
+    # least squares slope of the response size over days since the first sample, per exam center
+    center_index: np.ndarray = np.searchsorted(centers, center)
+    days: np.ndarray = (start - start.min()) / 86400
+    n: np.ndarray = np.bincount(center_index).astype(np.float64)
+    sum_days: np.ndarray = np.bincount(center_index, days)
+    sum_size: np.ndarray = np.bincount(center_index, size)
+    variance: np.ndarray = n * np.bincount(center_index, days * days) - sum_days**2
+    covariance: np.ndarray = n * np.bincount(center_index, days * size) - sum_days * sum_size
+    for i, exam_center_id in enumerate(centers):
+        analytics.response_size_trends.append(
+            ResponseSizeTrendRead(
+                exam_center=_exam_center(exam_center_id),
+                count=int(n[i]),
+                mean_response_bytes=float(sum_size[i] / n[i]),
+                bytes_per_day=float(covariance[i] / variance[i]) if variance[i] > 1e-12 * n[i] ** 2 else None,
+            )
+        )
+    return analytics
+
+
+def buckets_csv(analytics: ServerResponseTimeAnalyticsRead) -> str:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(ResponseTimeBucketRead.model_fields))
+    writer.writeheader()
+    writer.writerows(bucket.model_dump(mode="json") for bucket in analytics.buckets)
+    return output.getvalue()
+
+
+class ResponseTimeAnalytics:
+    """
+    Columnar copy of the raw SBAT response time samples for vectorized analytics.
+
+    The samples are kept as NumPy arrays (start, duration, response size, exam center) that each refresh extends
+    with the samples stored since the previous one and trims to `retention`. With a `cache_path` the arrays are
+    saved to an .npz file after every refresh and read back on the first one, so a restart only loads the samples
+    it missed and the analytics can reach further back than the raw samples' TTL.
+    """
+
+    def __init__(self, retention: timedelta = timedelta(days=90), cache_path: str | None = None) -> None:
+        self.retention: timedelta = retention
+        self.cache_path: str | None = cache_path
+        self.columns: Columns | None = None
+        self.loaded_until: datetime | None = None
+        self.lock = asyncio.Lock()
+
+    def _read_cache(self) -> tuple[Columns, datetime | None]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return _empty_columns(), None
+        try:
+            with np.load(self.cache_path) as cache:
+                columns: Columns = {name: cache[name].astype(dtype) for name, dtype in COLUMN_TYPES.items()}
+                return columns, datetime.fromtimestamp(float(cache["loaded_until"]), UTC)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Ignoring the response time cache {self.cache_path}: {e}")
+            return _empty_columns(), None
+
+    def _write_cache(self, columns: Columns, loaded_until: datetime) -> None:
+        # written next to the cache and renamed over it, a crash mid-write leaves the previous cache intact
+        temporary_path: str = f"{self.cache_path}.tmp.npz"
+        np.savez(temporary_path, loaded_until=np.float64(loaded_until.timestamp()), **columns)
+        os.replace(temporary_path, self.cache_path)
+
+    async def refresh(self, repo: BaseRepository) -> datetime:
+        """Loads the samples stored since the previous refresh, returns the time up to which samples are loaded."""
+        async with self.lock:
+            if self.columns is None:
+                self.columns, self.loaded_until = await asyncio.to_thread(self._read_cache)
+
+            until: datetime = datetime.now(UTC) - SETTLE_TIME
+            oldest: datetime = until - self.retention
+            samples: list[dict] = await repo.find(
+                "server_response_times",
+                {"start": {"$gte": max(self.loaded_until or oldest, oldest), "$lt": until}},
+                ServerResponseTimeRead,
+                {"_id": 0, "start": 1, "end": 1, "request_body": 1, "response_size": 1},
+                ReturnMode.DICT,
+            )
+            new_columns: Columns = await asyncio.to_thread(_to_columns, samples)
+            kept: np.ndarray = self.columns["start"] >= oldest.timestamp()
+            self.columns = {name: np.concatenate((self.columns[name][kept], new_columns[name])) for name in COLUMN_TYPES}
+            self.loaded_until = until
+            if self.cache_path:
+                await asyncio.to_thread(self._write_cache, self.columns, until)
+            return until
+
+    async def analyze(
+        self, repo: BaseRepository, days: int, by: Literal["hour", "hour_of_day"] = "hour", slow_factor: float = 2.0
+    ) -> ServerResponseTimeAnalyticsRead:
+        """Raises ValueError when `days` reaches back further than the samples are kept."""
+        if timedelta(days=days) > self.retention:
+            raise ValueError(f"Response time analytics keep {self.retention.days} days of samples, not {days}")
+        until: datetime = await self.refresh(repo)
+        return await asyncio.to_thread(analyze, self.columns, until - timedelta(days=days), until, by, slow_factor)
@@ -1,13 +1,18 @@
 import asyncio
 import json
+import time
+import zlib
+from contextlib import asynccontextmanager
 from datetime import UTC, datetime, timedelta
 from multiprocessing import AuthenticationError
-from typing import Literal, NoReturn
+from typing import AsyncIterator, Literal, NoReturn
 
 import httpx
 import jwt
 
+from .. import metrics
 from ..db.base_repo import BaseRepository
+from ..db.document_view import ReturnMode
 from ..models.sbat import (
     EXAM_CENTER_MAP,
     ExamTimeSlotCreate,
@@ -16,17 +21,24 @@ from ..models.sbat import (
     MonitorStatus,
     SbatRequestCreate,
     SbatRequestRead,
+    SbatTokenCreate,
+    SbatTokenRead,
     ServerResponseTimeCreate,
-    ServerResponseTimeRead,
+    SlotEvent,
 )
 from ..models.settings import Settings
-from ..utils import send_discord_message_with_role_mention, send_email, send_telegram_message_to_all
+from .notification_receipts import AlertReceipts
+from .poll_recorder import PollRecorder
+from .poll_trace import PollTracer, span
+from ..utils import send_discord_message_with_role_mention, send_email, send_telegram_message
+
+
+# response headers kept in the request log, the others are the same on every response
+LOGGED_RESPONSE_HEADERS: tuple[str, ...] = ("content-type", "content-length", "date", "retry-after", "www-authenticate")
 
 
 class SbatMonitor:
 
-    AUTH_URL = "https://api.rijbewijs.sbat.be/praktijk/api/user/authenticate"
-    CHECK_URL = "https://api.rijbewijs.sbat.be/praktijk/api/exam/available"
     STANDARD_HEADERS: dict[str, str] = {
         "Cache-Control": "no-cache",
         "Content-Type": "application/json",
@@ -36,9 +48,17 @@ class SbatMonitor:
         "Accept-Encoding": "gzip, deflate, br",
     }
 
-    def __init__(self, repo: BaseRepository, settings: Settings, config: MonitorConfiguration) -> None:
+    def __init__(
+        self, repo: BaseRepository, settings: Settings, config: MonitorConfiguration, http_client: httpx.AsyncClient | None = None
+    ) -> None:
         self.repo: BaseRepository = repo
         self.settings: Settings = settings
+        self.http_client: httpx.AsyncClient | None = http_client
+        self.auth_url: str = f"{settings.sbat_api_url}/user/authenticate"
+        self.check_url: str = f"{settings.sbat_api_url}/exam/available"
+        self.recorder: PollRecorder | None = PollRecorder(settings.sbat_record_path) if settings.sbat_record_path else None
+        self.tracer = PollTracer(settings.poll_trace_capacity)
+        self.last_poll_at: datetime | None = None
 
         # Initialize with default values to ensure consistency
         self.license_types: list[Literal["B", "AM"]] = ["B"]
@@ -53,6 +73,7 @@ class SbatMonitor:
         self.last_started_at: datetime | None = None
         self.last_stopped_at: datetime | None = None
         self.stopped_due_to: str | None = None
+        self.crashed: bool = False
 
     @property
     def config(self) -> MonitorConfiguration:
@@ -86,10 +107,12 @@ class SbatMonitor:
             pass
 
     def clean_up(self, task: asyncio.Task) -> None:
+        self.crashed = False
         if task.cancelled():
             self.stopped_due_to = "SBAT MONITOR STOPPED: Task was cancelled."
         elif task.done():
             exception: BaseException | None = task.exception()
+            self.crashed = exception is not None
             if exception:
                 self.stopped_due_to = f"SBAT MONITOR STOPPED: Exception occurred: {exception}"
             else:
@@ -98,8 +121,17 @@ class SbatMonitor:
         self.last_stopped_at = datetime.now()
         if self.last_started_at:
             self.total_time_running += self.last_stopped_at - self.last_started_at
+        if self.recorder:
+            self.recorder.close()
         self.task = None
 
+    def heartbeat_age(self) -> float | None:
+        """Seconds since the last completed poll (or the start, before the first one), None when not running."""
+        if not self.task or self.task.done():
+            return None
+        last_beat: datetime = self.last_poll_at or self.last_started_at.astimezone(UTC)
+        return (datetime.now(UTC) - last_beat).total_seconds()
+
     def status(self) -> MonitorStatus:
         if self.task and not self.task.done():
             current_time: datetime = datetime.now()
@@ -121,37 +153,50 @@ class SbatMonitor:
             stopped_due_to=self.stopped_due_to,
         )
 
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self.http_client:
+            yield self.http_client
+        else:
+            async with httpx.AsyncClient(event_hooks=metrics.HTTP_EVENT_HOOKS) as client:
+                yield client
+
     async def authenticate(self) -> str:
-        last_request: SbatRequestRead | None = await self.repo.find_last_sbat_auth_request()
-        if last_request:
-            try:
-                payload: dict = jwt.decode(last_request.response.get("response_text"), options={"verify_signature": False})
-                if datetime.now() < datetime.fromtimestamp(payload["exp"]):
-                    return last_request.response.get("response_text")
-            except (jwt.DecodeError, jwt.InvalidTokenError, jwt.ExpiredSignatureError):
-                pass
+        stored_token: SbatTokenRead | None = await self.repo.find_sbat_token(self.settings.sbat_username)
+        # the databases hand datetimes back as naive UTC
+        if stored_token and datetime.now(UTC) < stored_token.expires_at.replace(tzinfo=UTC):
+            metrics.SBAT_AUTHENTICATIONS.inc("cached")
+            return stored_token.token
 
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             auth_response: httpx.Response = await client.post(
-                self.AUTH_URL,
+                self.auth_url,
                 json={"username": self.settings.sbat_username, "password": self.settings.sbat_password},
                 headers=self.STANDARD_HEADERS,
                 timeout=60,
             )
 
-        sbat_request = SbatRequestCreate(
-            timestamp=datetime.now(UTC),
-            request_type="authentication",
-            response={"status_code": auth_response.status_code, "headers": auth_response.headers, "response_text": auth_response.text},
-            url=self.AUTH_URL,
-            email_used=self.settings.sbat_username,
-        )
-        await self.repo.create("requests", sbat_request, SbatRequestRead)
+        # a successful response body is the token, it is kept in sbat_tokens and not in the log
+        await self._log_request("authentication", self.auth_url, auth_response, keep_body=auth_response.status_code != 200)
 
         if auth_response.status_code == 200:
+            metrics.SBAT_AUTHENTICATIONS.inc("refreshed")
             token: str = auth_response.text
+            try:
+                payload: dict = jwt.decode(token, options={"verify_signature": False})
+                await self.repo.save_sbat_token(
+                    SbatTokenCreate(
+                        username=self.settings.sbat_username,
+                        token=token,
+                        expires_at=datetime.fromtimestamp(payload["exp"], UTC),
+                        refreshed_at=datetime.now(UTC),
+                    )
+                )
+            except (jwt.InvalidTokenError, KeyError):
+                print("The SBAT token has no readable expiry, it is not stored")
             return token
         else:
+            metrics.SBAT_AUTHENTICATIONS.inc("failed")
             raise AuthenticationError("Authentication failed")
 
     async def check_for_time_slots(self) -> NoReturn:
@@ -162,31 +207,37 @@ class SbatMonitor:
             for license_type in self.license_types:
                 for exam_center_id in self.exam_center_ids:
                     exam_center_name: str = EXAM_CENTER_MAP[exam_center_id]
-                    start_time: datetime = datetime.now(UTC)
-                    response, request_body = await self._perform_check(headers, license_type, exam_center_id, exam_center_name)
-                    end_time: datetime = datetime.now(UTC)
-                    response_size: int = len(response.content) if response.content else 0
-                    await self.repo.create(
-                        "server_response_times",
-                        ServerResponseTimeCreate.model_validate(
-                            {"start": start_time, "end": end_time, "request_body": request_body, "response_size": response_size}
-                        ),
-                        ServerResponseTimeRead,
-                    )
-
-                    # possible exp of token
-                    if self._is_exp_error(response):
-                        headers: dict[str, str] = {**self.STANDARD_HEADERS, "Authorization": f"Bearer {await self.authenticate()}"}
-                        continue
-
-                    await self._handle_response(response, request_body)
+                    with self.tracer.trace(exam_center_name, license_type):
+                        with span("sbat_request") as request_span:
+                            start_time: datetime = datetime.now(UTC)
+                            response, request_body = await self._perform_check(headers, license_type, exam_center_id, exam_center_name)
+                            end_time: datetime = datetime.now(UTC)
+                            response_size: int = len(response.content) if response.content else 0
+                            request_span.set_attribute("status_code", response.status_code)
+                            request_span.set_attribute("response_size", response_size)
+                        metrics.SBAT_POLL_SECONDS.observe((end_time - start_time).total_seconds(), exam_center_name, license_type)
+                        metrics.SBAT_RESPONSE_BYTES.observe(response_size, exam_center_name, license_type)
+                        await self._store_response_time(
+                            ServerResponseTimeCreate.model_validate(
+                                {"start": start_time, "end": end_time, "request_body": request_body, "response_size": response_size}
+                            )
+                        )
+
+                        # possible exp of token
+                        if self._is_exp_error(response):
+                            with span("token_refresh"):
+                                headers: dict[str, str] = {**self.STANDARD_HEADERS, "Authorization": f"Bearer {await self.authenticate()}"}
+                            continue
+
+                        await self._handle_response(response, request_body, end_time)
+                    self.last_poll_at = datetime.now(UTC)
                     await asyncio.sleep(self.seconds_inbetween)
 
     async def _perform_check(
         self, headers: dict[str, str], license_type: str, exam_center_id: int, exam_center_name: str
     ) -> tuple[httpx.Response, dict]:
         print(f"Checking '{exam_center_name}' for new time slots for license type '{license_type}'...")
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             body: dict = {
                 "examCenterId": exam_center_id,
                 "licenseType": license_type,
@@ -195,7 +246,7 @@ class SbatMonitor:
             }
             return (
                 await client.post(
-                    self.CHECK_URL,
+                    self.check_url,
                     headers=headers,
                     json=body,
                     timeout=60,
@@ -207,90 +258,222 @@ class SbatMonitor:
         www_authenticate: str | None = response.headers.get("WWW-Authenticate")
         return response.status_code == 401 and www_authenticate and "The token is expired" in www_authenticate
 
-    async def _handle_response(self, response: httpx.Response, request_body: dict) -> None:
+    async def _handle_response(self, response: httpx.Response, request_body: dict, received_at: datetime) -> None:
         license_type: str = request_body.get("licenseType")
         exam_center_id: int = request_body.get("examCenterId")
         exam_center_name: str = EXAM_CENTER_MAP[exam_center_id]
         if response.status_code == 200:
-            data: dict = response.json()
-            await self.notify_users_and_update_db(data, exam_center_id, exam_center_name, license_type)
+            with span("parse_response"):
+                data: dict = response.json()
+            if self.recorder:
+                with span("record"):
+                    await asyncio.to_thread(
+                        self.recorder.write, request_body, data, datetime.now(UTC), response.elapsed.total_seconds()
+                    )
+            await self.notify_users_and_update_db(data, exam_center_id, exam_center_name, license_type, received_at)
 
         else:
-            sbat_request = SbatRequestCreate(
-                timestamp=datetime.now(UTC),
-                request_type="check_for_time_slots",
-                request_body=request_body,
-                response={"status_code": response.status_code, "headers": response.headers, "response_text": response.text},
-                url=self.CHECK_URL,
-                email_used=self.settings.sbat_username,
-            )
-            await self.repo.create("requests", sbat_request, SbatRequestRead)
+            with span("request_log_write"):
+                await self._log_request("check_for_time_slots", self.check_url, response, request_body)
 
     async def notify_users_and_update_db(
-        self, time_slots: list[dict], exam_center_id: int, exam_center_name: str, license_type: str
+        self, time_slots: list[dict], exam_center_id: int, exam_center_name: str, license_type: str, found_at: datetime | None = None
     ) -> None:
-        current_time_slots = set()
-        notified_time_slots: set[int] = await self.repo.find_notified_time_slot_ids(exam_center_id, license_type)
+        """`found_at` is when the SBAT response came in, new slots are stored with it and the receipt latencies count from it."""
+        with span("find_notified_time_slot_ids"):
+            notified_time_slots: set[int] = await self.repo.find_notified_time_slot_ids(exam_center_id, license_type)
+
+        # Hot path: only exam ids are looked at, already notified slots are never parsed.
+        current_time_slots: set[int] = {time_slot["id"] for time_slot in time_slots}
+        new_time_slots: list[dict] = [time_slot for time_slot in time_slots if time_slot["id"] not in notified_time_slots]
+
         message: str = ""
+        found_at = found_at or datetime.now(UTC)
+        if new_time_slots:
+            metrics.SLOTS_FOUND.inc(exam_center_name, license_type, amount=len(new_time_slots))
+            message = self._format_time_slots(new_time_slots)
+            with span("store_new_time_slots", count=len(new_time_slots)):
+                await self._store_new_time_slots(new_time_slots, found_at)
+
+        if message:
+            subject: str = f"New driving exam time slots available for license type '{license_type}' at exam center '{exam_center_name}':"
+            message: str = subject + "\nLink: https://rijbewijs.sbat.be/praktijk/examen/Login \n" + message
+            with span("find_recipients"):
+                email_recipients: set[str] = await self.repo.find_all_subscribed_emails(exam_center_id, license_type)
+                telegram_recipients: set[int] = await self.repo.find_all_subscribed_telegram_ids(exam_center_id, license_type)
+
+            # one correlation id per alert, carried by the trace spans and every delivery receipt
+            alert_id: str = AlertReceipts.new_alert_id()
+            exam_ids: list[int] = [time_slot["id"] for time_slot in new_time_slots]
+            receipts: list[AlertReceipts] = []
+            if self.settings.smtp_server:
+                email_receipts = AlertReceipts(alert_id, "email", exam_center_id, license_type, exam_ids, found_at)
+                receipts.append(email_receipts)
+                started_at: float = time.perf_counter()
+                with span("email", alert_id=alert_id, recipients=len(email_recipients)):
+                    failed: dict[str, str] = send_email(
+                        subject,
+                        email_recipients,
+                        self.settings.sender_email,
+                        self.settings.sender_password,
+                        self.settings.smtp_server,
+                        self.settings.smtp_port,
+                        starttls=self.settings.smtp_starttls,
+                        message=message,
+                    )
+                metrics.NOTIFICATION_SECONDS.observe(time.perf_counter() - started_at, "email")
+                sent_at: datetime = datetime.now(UTC)
+                for recipient in email_recipients:
+                    email_receipts.add(recipient, "failed" if recipient in failed else "accepted", sent_at)
+            if self.settings.discord_bot_token:
+                discord_receipts = AlertReceipts(alert_id, "discord", exam_center_id, license_type, exam_ids, found_at)
+                receipts.append(discord_receipts)
+                started_at = time.perf_counter()
+                with span("discord", alert_id=alert_id):
+                    accepted: bool = await send_discord_message_with_role_mention(
+                        self.settings.discord_bot_token,
+                        self.settings.discord_guild_id,
+                        self.settings.discord_channel_id,
+                        f"{exam_center_name} - {license_type}",
+                        message,
+                    )
+                metrics.NOTIFICATION_SECONDS.observe(time.perf_counter() - started_at, "discord")
+                discord_receipts.add(self.settings.discord_channel_id, "accepted" if accepted else "failed", datetime.now(UTC))
+            if self.settings.telegram_bot_token:
+                telegram_receipts = AlertReceipts(alert_id, "telegram", exam_center_id, license_type, exam_ids, found_at)
+                receipts.append(telegram_receipts)
+
+                async def send_telegram(chat_id: int) -> None:
+                    accepted: bool = await send_telegram_message(message, self.settings.telegram_bot_token, chat_id)
+                    telegram_receipts.add(chat_id, "accepted" if accepted else "failed", datetime.now(UTC))
+
+                started_at = time.perf_counter()
+                with span("telegram", alert_id=alert_id, recipients=len(telegram_recipients)):
+                    await asyncio.gather(*(send_telegram(chat_id) for chat_id in telegram_recipients))
+                metrics.NOTIFICATION_SECONDS.observe(time.perf_counter() - started_at, "telegram")
+
+            await self._store_receipts([alert_receipts for alert_receipts in receipts if alert_receipts.recipients])
+
+        taken_time_slots: set[int] = notified_time_slots - current_time_slots
+        if taken_time_slots:
+            metrics.SLOTS_TAKEN.inc(exam_center_name, license_type, amount=len(taken_time_slots))
+            slot_events: list[SlotEvent | None] = []
+            with span("mark_taken", count=len(taken_time_slots)):
+                for exam_id in taken_time_slots:
+                    taken_time_slot: ExamTimeSlotRead | None = await self.repo.update_time_slot_status(exam_id, "taken")
+                    await self.repo.update_one(
+                        "slots", {"exam_id": exam_id, "first_taken_at": None}, {"first_taken_at": datetime.now(UTC)}, ExamTimeSlotRead
+                    )
+                    if taken_time_slot:
+                        slot_events.append(self._slot_event("taken", taken_time_slot, taken_time_slot.taken_at))
+            with span("slot_stats_write"):
+                await self.repo.record_slot_events([slot_event for slot_event in slot_events if slot_event])
+
+    @staticmethod
+    def _slot_event(
+        kind: Literal["found", "taken", "re_released"], time_slot: ExamTimeSlotCreate | ExamTimeSlotRead, at: datetime
+    ) -> SlotEvent | None:
+        if time_slot.exam_center_id is None:
+            return None
+        return SlotEvent(
+            kind=kind,
+            at=at,
+            exam_center_id=time_slot.exam_center_id,
+            driving_school=time_slot.driving_school,
+            seconds_on_offer=(at - time_slot.found_at).total_seconds() if kind == "taken" else None,
+        )
 
+    @staticmethod
+    def _format_time_slots(time_slots: list[dict]) -> str:
+        message: str = ""
         for time_slot in time_slots:
-            exam_id: int = time_slot["id"]
             start_time: datetime = datetime.fromisoformat(time_slot["from"])
             end_time: datetime = datetime.fromisoformat(time_slot["till"])
-            current_time_slots.add(exam_id)
-
-            if exam_id not in notified_time_slots:
-
-                new_time_slot_messag: str = f"{start_time.date()}  {start_time.time()} - {end_time.time()}\n"
-                if new_time_slot_messag not in message:
-                    message += new_time_slot_messag
-
-                found_slot: ExamTimeSlotRead | None = await self.repo.find_one("slots", {"exam_id": exam_id}, ExamTimeSlotRead)
-                if found_slot and found_slot.status == "taken":
-                    await self.repo.update_time_slot_status(exam_id, "notified")
-                else:
-                    time_slot_to_add = ExamTimeSlotCreate(
-                        exam_id=time_slot["id"],
-                        first_found_at=datetime.now(UTC),
-                        found_at=datetime.now(UTC),
-                        start_time=datetime.fromisoformat(time_slot["from"]),
-                        end_time=datetime.fromisoformat(time_slot["till"]),
-                        status="notified",
-                        is_public=time_slot["isPublic"],
-                        day_id=time_slot["dayScheduleId"],
-                        driving_school=time_slot["drivingSchool"],
-                        exam_center_id=time_slot["examCenterId"],
-                        exam_type=time_slot["examType"],
-                        examinee=time_slot["examinee"],
-                        types_blob=json.loads(time_slot["typesBlob"]),
-                    )
-                    await self.repo.create("slots", time_slot_to_add, ExamTimeSlotRead)
+            new_time_slot_message: str = f"{start_time.date()}  {start_time.time()} - {end_time.time()}\n"
+            if new_time_slot_message not in message:
+                message += new_time_slot_message
+        return message
+
+    @staticmethod
+    def _parse_time_slot(time_slot: dict, found_at: datetime) -> ExamTimeSlotCreate:
+        return ExamTimeSlotCreate(
+            exam_id=time_slot["id"],
+            first_found_at=found_at,
+            found_at=found_at,
+            start_time=datetime.fromisoformat(time_slot["from"]),
+            end_time=datetime.fromisoformat(time_slot["till"]),
+            status="notified",
+            is_public=time_slot["isPublic"],
+            day_id=time_slot["dayScheduleId"],
+            driving_school=time_slot["drivingSchool"],
+            exam_center_id=time_slot["examCenterId"],
+            exam_type=time_slot["examType"],
+            examinee=time_slot["examinee"],
+            types_blob=json.loads(time_slot["typesBlob"]),
+        )
 
-        if message:
-            subject: str = f"New driving exam time slots available for license type '{license_type}' at exam center '{exam_center_name}':"
-            message: str = subject + "\nLink: https://rijbewijs.sbat.be/praktijk/examen/Login \n" + message
-            email_recipients: set[str] = await self.repo.find_all_subscribed_emails(exam_center_id, license_type)
-            telegram_recipients: set[int] = await self.repo.find_all_subscribed_telegram_ids(exam_center_id, license_type)
-            send_email(
-                subject,
-                email_recipients,
-                self.settings.sender_email,
-                self.settings.sender_password,
-                self.settings.smtp_server,
-                self.settings.smtp_port,
-                message=message,
-            )
-            await send_discord_message_with_role_mention(
-                self.settings.discord_bot_token,
-                self.settings.discord_guild_id,
-                self.settings.discord_channel_id,
-                f"{exam_center_name} - {license_type}",
-                message,
-            )
-            await send_telegram_message_to_all(message, self.settings.telegram_bot_token, telegram_recipients)
+    async def _log_request(
+        self, request_type: str, url: str, response: httpx.Response, request_body: dict | None = None, keep_body: bool = True
+    ) -> None:
+        """Log the request with a compressed body and the whitelisted headers, the Housekeeper deletes the expired rows."""
+        now: datetime = datetime.now(UTC)
+        response_log: dict = {
+            "status_code": response.status_code,
+            "headers": {name: response.headers[name] for name in LOGGED_RESPONSE_HEADERS if name in response.headers},
+            "body_size": len(response.content),
+        }
+        if keep_body:
+            response_log["body_zlib"] = zlib.compress(response.content)
+        sbat_request = SbatRequestCreate(
+            timestamp=now,
+            request_type=request_type,
+            request_body=request_body,
+            response=response_log,
+            url=url,
+            email_used=self.settings.sbat_username,
+            expires_at=now + timedelta(days=self.settings.sbat_request_log_ttl_days),
+        )
+        await self.repo.create("requests", sbat_request, SbatRequestRead)
 
-        for exam_id in notified_time_slots - current_time_slots:
-            await self.repo.update_time_slot_status(exam_id, "taken")
-            await self.repo.update_one(
-                "slots", {"exam_id": exam_id, "first_taken_at": None}, {"first_taken_at": datetime.now(UTC)}, ExamTimeSlotRead
-            )
+    async def _store_response_time(self, sample: ServerResponseTimeCreate) -> None:
+        """Persist the sample with its minute and hour rollups."""
+        with span("server_response_times_write"):
+            await self.repo.add_server_response_time(sample, timedelta(days=self.settings.server_response_time_ttl_days))
+
+    async def _store_receipts(self, receipts: list[AlertReceipts]) -> None:
+        """Persist the delivery receipts of an alert."""
+        ttl: timedelta = timedelta(days=self.settings.notification_receipt_ttl_days)
+        with span("receipts_write"):
+            await self.repo.create_many("notification_receipts", [alert_receipts.to_model(ttl) for alert_receipts in receipts])
+
+    async def _store_new_time_slots(self, time_slots: list[dict], found_at: datetime) -> None:
+        """Persist unseen slots with one lookup and one bulk insert, slots taken before are marked notified again."""
+        time_slots_by_id: dict[int, dict] = {time_slot["id"]: time_slot for time_slot in time_slots}
+        known_time_slots: list[dict] = await self.repo.find(
+            "slots",
+            {"exam_id": {"$in": list(time_slots_by_id)}},
+            ExamTimeSlotRead,
+            {"exam_id": 1, "status": 1, "_id": 0},
+            ReturnMode.DICT,
+        )
+        known_statuses: dict[int, str] = {time_slot["exam_id"]: time_slot["status"] for time_slot in known_time_slots}
+        # slots taken long ago were archived, when one is offered again it moves back instead of being stored twice
+        unknown_exam_ids: list[int] = [exam_id for exam_id in time_slots_by_id if exam_id not in known_statuses]
+        restored_exam_ids: set[int] = await self.repo.restore_archived_time_slots(unknown_exam_ids) if unknown_exam_ids else set()
+        if restored_exam_ids:
+            metrics.SLOTS_RESTORED.inc(amount=len(restored_exam_ids))
+
+        time_slots_to_add: list[ExamTimeSlotCreate] = []
+        slot_events: list[SlotEvent | None] = []
+        for exam_id, time_slot in time_slots_by_id.items():
+            status: str | None = known_statuses.get(exam_id)
+            if status == "taken" or exam_id in restored_exam_ids:
+                re_released_time_slot: ExamTimeSlotRead | None = await self.repo.update_time_slot_status(exam_id, "notified")
+                if re_released_time_slot:
+                    slot_events.append(self._slot_event("re_released", re_released_time_slot, found_at))
+            elif status is None:
+                time_slots_to_add.append(self._parse_time_slot(time_slot, found_at))
+
+        await self.repo.create_many("slots", time_slots_to_add)
+        slot_events.extend(self._slot_event("found", time_slot, found_at) for time_slot in time_slots_to_add)
+        await self.repo.record_slot_events([slot_event for slot_event in slot_events if slot_event])
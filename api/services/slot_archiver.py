@@ -0,0 +1,53 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+from .. import metrics
+from ..db.base_repo import BaseRepository
+
+
+class SlotArchiver:
+    """
+    Keeps the `slots` collection down to the slots the poll loop still looks at.
+
+    Every `interval` seconds the slots whose exam has started, and those taken more than `taken_after` ago,
+    are moved to `slots_archive` in batches of `batch_size`. A taken slot that SBAT offers again is moved back
+    by the poll loop, `BaseRepository.find_time_slots_in_all_tiers` answers queries over both collections.
+    """
+
+    def __init__(self, interval: float = 3600, taken_after: timedelta = timedelta(days=14), batch_size: int = 1000) -> None:
+        self.interval: float = interval
+        self.taken_after: timedelta = taken_after
+        self.batch_size: int = batch_size
+        self.last_run_at: datetime | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self, repo: BaseRepository) -> None:
+        if not self.task:
+            self.task = asyncio.create_task(self._run(repo))
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self, repo: BaseRepository) -> None:
+        while True:
+            try:
+                await self.archive(repo)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # the next run picks up where this one stopped, every batch is moved on its own
+                print(f"Failed to archive time slots: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def archive(self, repo: BaseRepository) -> int:
+        now: datetime = datetime.now(UTC)
+        archived: int = await repo.archive_time_slots(now, now - self.taken_after, self.batch_size)
+        self.last_run_at = now
+        if archived:
+            metrics.SLOTS_ARCHIVED.inc(amount=archived)
+            print(f"Archived {archived} time slots")
+        return archived
@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+
+from .. import metrics, utils
+
+
+class TelegramSender:
+    """
+    Sends Telegram messages through one shared connection pool.
+
+    Messages are queued and a single worker drains them in batches of at most `batch_size` per
+    `batch_interval` seconds, which keeps the bot below Telegram's global rate limit.
+    """
+
+    def __init__(self, bot_token: str | None, batch_size: int = 30, batch_interval: float = 1.0) -> None:
+        self.bot_token: str | None = bot_token
+        self.batch_size: int = batch_size
+        self.batch_interval: float = batch_interval
+        self.queue: asyncio.Queue[tuple[int | str, str]] = asyncio.Queue()
+        self.client: httpx.AsyncClient | None = None
+        self.task: asyncio.Task | None = None
+
+    def enqueue(self, chat_id: int | str, text: str) -> None:
+        if not self.task or self.task.done():
+            self.client = self.client or httpx.AsyncClient(timeout=10, event_hooks=metrics.HTTP_EVENT_HOOKS)
+            self.task = asyncio.create_task(self._run())
+        self.queue.put_nowait((chat_id, text))
+
+    async def _run(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            batch: list[tuple[int | str, str]] = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            started_at: float = loop.time()
+            # a failed message must not take the worker down with it, the rest of the queue still has to go out
+            results: list = await asyncio.gather(*(self._send(chat_id, text) for chat_id, text in batch), return_exceptions=True)
+            for (chat_id, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    print(f"Failed to send telegram message to {chat_id}: {result}")
+            for _ in batch:
+                self.queue.task_done()
+
+            if len(batch) == self.batch_size:
+                await asyncio.sleep(max(0.0, self.batch_interval - (loop.time() - started_at)))
+
+    async def _send(self, chat_id: int | str, text: str) -> None:
+        url: str = f"{utils.TELEGRAM_API_URL}/bot{self.bot_token}/sendMessage"
+
+        async def send_request() -> None:
+            response: httpx.Response = await self.client.post(url, data={"chat_id": chat_id, "text": text})
+            response.raise_for_status()
+
+        await utils.retry_request(send_request)
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.client:
+            await self.client.aclose()
+            self.client = None
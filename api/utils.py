@@ -10,6 +10,12 @@ import jwt
 from google.cloud import storage
 from jinja2 import Environment, FileSystemLoader, Template
 
+from .metrics import HTTP_EVENT_HOOKS
+
+# Module level so local stand-ins (see benchmarks/sinks.py) can replace the real APIs.
+DISCORD_API_URL = "https://discord.com/api/v10"
+TELEGRAM_API_URL = "https://api.telegram.org"
+
 
 def create_access_token(data: dict, minutes: int, secret_key: str, algorithm: str) -> str:
     to_encode: dict = data.copy()
@@ -44,11 +50,11 @@ async def retry_request(request_function: Callable, max_retries: int = 3, max_wa
 
 
 async def assign_role_to_user(guild_id: str, user_id: str, role_id: str, bot_token: str):
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}"}
 
     async def request_function():
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.put(url, headers=headers)
             response.raise_for_status()
 
@@ -56,11 +62,11 @@ async def assign_role_to_user(guild_id: str, user_id: str, role_id: str, bot_tok
 
 
 async def remove_role_from_user(guild_id: str, user_id: str, role_id: str, bot_token: str):
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/members/{user_id}/roles/{role_id}"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}"}
 
     async def request_function():
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.delete(url, headers=headers)
             response.raise_for_status()
 
@@ -69,10 +75,10 @@ async def remove_role_from_user(guild_id: str, user_id: str, role_id: str, bot_t
 
 async def get_role_id_by_name(bot_token: str, guild_id: str, role_name: str) -> str:
     """Asynchronously fetches the role ID by role name from a Discord guild (server)."""
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/roles"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/roles"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}"}
 
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         response: httpx.Response = await client.get(url, headers=headers)
 
     if response.status_code == 200:
@@ -83,9 +89,9 @@ async def get_role_id_by_name(bot_token: str, guild_id: str, role_name: str) ->
 
 
 async def get_user_roles_in_guild(guild_id: str, user_id: int, bot_token: str) -> list[str]:
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/members/{user_id}"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/members/{user_id}"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}", "Content-Type": "application/json"}
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         response: httpx.Response = await client.get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
@@ -93,39 +99,53 @@ async def get_user_roles_in_guild(guild_id: str, user_id: int, bot_token: str) -
 
 
 async def get_all_roles_in_guild(guild_id: str, bot_token: str) -> list[dict]:
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/roles"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/roles"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}", "Content-Type": "application/json"}
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         response: httpx.Response = await client.get(url, headers=headers)
         response.raise_for_status()
         return response.json()
 
 
-async def send_discord_message(bot_token: str, channel_id: str, message: str):
-    """Asynchronously sends a message to a Discord channel."""
-    url: str = f"https://discord.com/api/v10/channels/{channel_id}/messages"
+async def send_discord_message(bot_token: str, channel_id: str, message: str) -> bool:
+    """Asynchronously sends a message to a Discord channel, returns whether Discord accepted it."""
+    url: str = f"{DISCORD_API_URL}/channels/{channel_id}/messages"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}", "Content-Type": "application/json"}
     payload: dict = {"content": message, "tts": False}
 
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         response: httpx.Response = await client.post(url, headers=headers, json=payload)
 
     if response.status_code != 200:
         print(f"Failed to send message: {response.status_code} - {response.text}")
+        return False
+    return True
 
 
-async def send_discord_message_with_role_mention(bot_token: str, guild_id: str, channel_id: str, role: str, message: str):
+async def send_discord_message_with_role_mention(bot_token: str, guild_id: str, channel_id: str, role: str, message: str) -> bool:
     """sends a message in a specified channel mentioning the role."""
     role_id: str = await get_role_id_by_name(bot_token, guild_id, role)
     message: str = f"<@&{role_id}>\n {message}"
-    await send_discord_message(bot_token, channel_id, message)
+    return await send_discord_message(bot_token, channel_id, message)
+
+
+async def edit_original_interaction_response(application_id: str, interaction_token: str, content: str) -> None:
+    """Replaces the original (deferred) response of a Discord interaction with the given content."""
+    url: str = f"{DISCORD_API_URL}/webhooks/{application_id}/{interaction_token}/messages/@original"
+
+    async def request_function() -> None:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
+            response: httpx.Response = await client.patch(url, json={"content": content}, timeout=10)
+            response.raise_for_status()
+
+    await retry_request(request_function)
 
 
 async def is_user_in_guild(guild_id: str, user_id: str, bot_token: str) -> bool:
-    url: str = f"https://discord.com/api/v10/guilds/{guild_id}/members/{user_id}"
+    url: str = f"{DISCORD_API_URL}/guilds/{guild_id}/members/{user_id}"
     headers: dict[str, str] = {"Authorization": f"Bot {bot_token}"}
 
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         response = await client.get(url, headers=headers)
         if response.status_code == 200:
             return True
@@ -133,32 +153,34 @@ async def is_user_in_guild(guild_id: str, user_id: str, bot_token: str) -> bool:
             return False
 
 
-async def send_telegram_message(message: str, bot_token: str, chat_id: str) -> None:
-    url: str = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+async def send_telegram_message(message: str, bot_token: str, chat_id: str) -> bool:
+    """Sends a Telegram message with retries, returns whether Telegram accepted it."""
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
     payload: dict[str, str] = {"chat_id": chat_id, "text": message}
 
-    async def send_request() -> None:
-        async with httpx.AsyncClient() as client:
+    async def send_request() -> bool:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.post(url, data=payload, timeout=10)
             response.raise_for_status()
+            return True
 
-    await retry_request(send_request)
+    return await retry_request(send_request) is True
 
 
-async def send_telegram_message_to_all(message: str, bot_token: str, recipient_ids: Iterable):
+async def send_telegram_message_to_all(message: str, bot_token: str, recipient_ids: Iterable) -> list[bool]:
     tasks: list[Coroutine] = [send_telegram_message(message, bot_token, chat_id) for chat_id in recipient_ids]
-    await asyncio.gather(*tasks)
+    return await asyncio.gather(*tasks)
 
 
 async def create_single_use_invite_link(chat_id: str, bot_token: str, name: str | None = None) -> str | None:
     """Create a single-use invite link for a Telegram chat."""
-    url: str = f"https://api.telegram.org/bot{bot_token}/createChatInviteLink"
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/createChatInviteLink"
     payload: dict = {"chat_id": chat_id, "creates_join_request": True}
     if name:
         payload.update({"name": name})
 
     async def create_request() -> str:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.post(url, json=payload)
             response.raise_for_status()
             data: dict = response.json()
@@ -169,11 +191,11 @@ async def create_single_use_invite_link(chat_id: str, bot_token: str, name: str
 
 async def revoke_invite_link(chat_id: str, invite_link: str, bot_token: str) -> bool:
     """Revoke a Telegram invite link."""
-    url: str = f"https://api.telegram.org/bot{bot_token}/revokeChatInviteLink"
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/revokeChatInviteLink"
     payload: dict = {"chat_id": chat_id, "invite_link": invite_link}
 
     async def revoke_request() -> None:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.post(url, json=payload)
             response.raise_for_status()
 
@@ -181,11 +203,11 @@ async def revoke_invite_link(chat_id: str, invite_link: str, bot_token: str) ->
 
 
 async def accept_join_request(chat_id: str, user_id: int, bot_token: str) -> None:
-    url: str = f"https://api.telegram.org/bot{bot_token}/approveChatJoinRequest"
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/approveChatJoinRequest"
     payload: dict = {"chat_id": chat_id, "user_id": user_id}
 
     async def approve_request() -> None:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.post(url, json=payload)
             response.raise_for_status()
 
@@ -194,11 +216,11 @@ async def accept_join_request(chat_id: str, user_id: int, bot_token: str) -> Non
 
 async def decline_join_request(chat_id: str, user_id: int, bot_token: str) -> None:
     """Decline a join request for a Telegram chat."""
-    url: str = f"https://api.telegram.org/bot{bot_token}/declineChatJoinRequest"
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/declineChatJoinRequest"
     payload: dict = {"chat_id": chat_id, "user_id": user_id}
 
     async def decline_request() -> None:
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
             response: httpx.Response = await client.post(url, json=payload)
             response.raise_for_status()
 
@@ -206,7 +228,7 @@ async def decline_join_request(chat_id: str, user_id: int, bot_token: str) -> No
 
 
 def get_channel_id(bot_token: str) -> None:
-    response: httpx.Response = httpx.get(f"https://api.telegram.org/bot{bot_token}/getUpdates")
+    response: httpx.Response = httpx.get(f"{TELEGRAM_API_URL}/bot{bot_token}/getUpdates")
     if response.status_code == 200:
         data: dict = response.json()
         result_list: list = data.get("result", [])
@@ -217,9 +239,9 @@ def get_channel_id(bot_token: str) -> None:
 
 
 async def kick_user_from_chat(bot_token: str, chat_id: int, user_id: int):
-    url: str = f"https://api.telegram.org/bot{bot_token}/kickChatMember"
+    url: str = f"{TELEGRAM_API_URL}/bot{bot_token}/kickChatMember"
     payload: dict[str, int] = {"chat_id": chat_id, "user_id": user_id}
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(event_hooks=HTTP_EVENT_HOOKS) as client:
         await client.post(url, json=payload)
 
 
@@ -259,16 +281,17 @@ def send_email(
     is_html: bool = False,
     message: str | None = None,
     html_template: str | None = None,
+    starttls: bool = True,
     **kwargs,
-) -> None:
-    """Send an email to the provided recipients."""
+) -> dict[str, str]:
+    """Send an email to the provided recipients, returns the recipients the server did not accept with the reason."""
     if not recipient_list:
         print("No recipients provided")
-        return
+        return {}
     msg = EmailMessage()
     msg["From"] = sender
     if len(recipient_list) == 1:
-        msg["To"] = recipient_list.pop()
+        msg["To"] = next(iter(recipient_list))
     else:
         msg["To"] = sender
         msg["Bcc"] = ", ".join(recipient_list)
@@ -288,10 +311,13 @@ def send_email(
     try:
         with smtplib.SMTP(smtp_server, smtp_port) as server:
             server.ehlo()
-            server.starttls()
-            server.ehlo()
+            if starttls:
+                server.starttls()
+                server.ehlo()
             server.login(sender, password)
-            server.send_message(msg)
-            print(f"Email sent to {len(recipient_list)} recipients")
+            refused: dict[str, tuple[int, bytes]] = server.send_message(msg)
+            print(f"Email sent to {len(recipient_list) - len(refused)} recipients")
+            return {recipient: f"{code} {reply.decode(errors='replace')}" for recipient, (code, reply) in refused.items()}
     except Exception as e:  # pylint: disable=broad-except
         print(f"Failed to send email: {e}")
+        return {recipient: str(e) for recipient in recipient_list}
@@ -1,17 +1,15 @@
 import asyncio
 
-from fastapi import BackgroundTasks
-
-from api.models.subscriber import SubscriberRead
-
 from ..db.base_repo import BaseRepository
+from ..db.document_view import DocumentView, ReturnMode
 from ..helpers import assign_roles_based_on_preferences
 from ..models.discord import DiscordSubscriptionRoles
+from ..models.sbat import MonitorPreferences
 from ..models.settings import Settings
-from ..utils import assign_role_to_user, is_user_in_guild, remove_role_from_user
+from ..utils import assign_role_to_user, edit_original_interaction_response, is_user_in_guild, remove_role_from_user
 
 
-async def handle_start(background_tasks: BackgroundTasks, repo: BaseRepository, settings: Settings, interaction: dict) -> str:
+async def handle_start(repo: BaseRepository, settings: Settings, interaction: dict) -> str:
     discord_user_id: int = interaction.get("member", {}).get("user", {}).get("id") or interaction.get("user", {}).get("id")
     if not await is_user_in_guild(settings.discord_guild_id, discord_user_id, settings.discord_bot_token):
         return (
@@ -20,17 +18,21 @@ async def handle_start(background_tasks: BackgroundTasks, repo: BaseRepository,
             "Probeer het opnieuw zodra je lid bent geworden."
         )
 
-    subscriber: SubscriberRead | None = await repo.find_subscriber_by_discord_user_id(discord_user_id)
+    subscriber: DocumentView | None = await repo.find_subscriber_by_discord_user_id(
+        discord_user_id, {"is_subscription_active": 1, "monitoring_preferences": 1}, ReturnMode.VIEW
+    )
     for role_id in [role.value for role in DiscordSubscriptionRoles]:
         await remove_role_from_user(settings.discord_guild_id, discord_user_id, role_id, settings.discord_bot_token)
-        asyncio.sleep(1)
+        await asyncio.sleep(1)
 
     if subscriber:
         if subscriber.is_subscription_active:
             await assign_role_to_user(
                 settings.discord_guild_id, discord_user_id, DiscordSubscriptionRoles.ACTIVE.value, settings.discord_bot_token
             )
-            background_tasks.add_task(assign_roles_based_on_preferences, subscriber.monitoring_preferences, discord_user_id, settings)
+            preferences: MonitorPreferences = MonitorPreferences.model_validate(subscriber.monitoring_preferences)
+            # this already runs after the deferred response, the roles are in place before the message says so
+            await assign_roles_based_on_preferences(preferences, discord_user_id, settings)
             return (
                 "🎉 Gefeliciteerd! Je hebt nu de rol **'Subscription Active'** en alle rollen in jouw"
                 "[voorkeuren](https://rijexamenmeldingen.be/profile) toegewezen gekregen. "
@@ -62,5 +64,15 @@ async def handle_start(background_tasks: BackgroundTasks, repo: BaseRepository,
         )
 
 
+async def handle_deferred_start(repo: BaseRepository, settings: Settings, interaction: dict) -> None:
+    """Runs /start after Discord received a deferred response and replaces that response with the result."""
+    try:
+        response_message: str = await handle_start(repo, settings, interaction)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f"Error in handle_start: {e}")
+        response_message = "Er is een fout opgetreden bij het verwerken van uw verzoek. Probeer het later opnieuw."
+    await edit_original_interaction_response(interaction.get("application_id"), interaction.get("token"), response_message)
+
+
 async def handle_voorkeuren() -> str:
     return "dit lukt momenteel nog niet via onze bot.\n" "Bezoek https://rijexamenmeldingen.be/profile om je voorkeuren aan te passen."
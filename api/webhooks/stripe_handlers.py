@@ -1,4 +1,7 @@
+import asyncio
+
 from ..db.base_repo import BaseRepository
+from ..db.document_view import DocumentView, ReturnMode
 from ..models.discord import DiscordSubscriptionRoles
 from ..models.settings import Settings
 from ..models.subscriber import SubscriberRead
@@ -7,15 +10,19 @@ from ..utils import is_user_in_guild, remove_role_from_user, send_email
 
 async def handle_invoice_payment_failed(repo: BaseRepository, settings: Settings, invoice: dict) -> None:
     cus: str | None = invoice.get("customer")
-    subscriber: SubscriberRead | None = await repo.find_one("subscribers", {"stripe_customer_id": cus}, SubscriberRead)
+    subscriber: DocumentView | None = await repo.find_one(
+        "subscribers", {"stripe_customer_id": cus}, SubscriberRead, {"email": 1, "name": 1}, ReturnMode.VIEW
+    )
     if subscriber:
-        send_email(
+        await asyncio.to_thread(
+            send_email,
             "Betalingsfout - Actie Vereist",
             [subscriber.email],
             settings.sender_email,
             settings.sender_password,
             settings.smtp_server,
             settings.smtp_port,
+            starttls=settings.smtp_starttls,
             is_html=True,
             html_template="payment_failed_email.html",
             naam=subscriber.name,
@@ -37,13 +44,15 @@ async def handle_subscription_deleted(repo: BaseRepository, settings: Settings,
             settings.discord_guild_id, discord_user_id, DiscordSubscriptionRoles.ACTIVE.value, settings.discord_bot_token
         )
     if subscriber:
-        send_email(
+        await asyncio.to_thread(
+            send_email,
             "Bevestiging van Annulering van je Abonnement.",
             [subscriber.email],
             settings.sender_email,
             settings.sender_password,
             settings.smtp_server,
             settings.smtp_port,
+            starttls=settings.smtp_starttls,
             is_html=True,
             html_template="cancellation_email.html",
             naam=subscriber.name,
@@ -52,13 +61,15 @@ async def handle_subscription_deleted(repo: BaseRepository, settings: Settings,
 
 async def handle_checkout_session_completed(repo: BaseRepository, settings: Settings, session: dict) -> None:
     subscriber: SubscriberRead = await repo.process_checkout_session(session)
-    send_email(
+    await asyncio.to_thread(
+        send_email,
         "Betaling geslaagd! Uw voorkeuren zijn ontvangen.",
         [subscriber.email],
         settings.sender_email,
         settings.sender_password,
         settings.smtp_server,
         settings.smtp_port,
+        starttls=settings.smtp_starttls,
         is_html=True,
         html_template="confirmation_email.html",
         naam=subscriber.name,
@@ -0,0 +1,82 @@
+import asyncio
+
+from ..db.base_repo import BaseRepository
+from ..models.settings import Settings
+from ..services.ordered_dispatcher import OrderedDispatcher
+from .stripe_handlers import (
+    handle_checkout_session_completed,
+    handle_invoice_payment_failed,
+    handle_invoice_payment_succeeded,
+    handle_subscription_deleted,
+)
+
+# seconds between the attempts of a failing event, the customer's later events wait behind it to keep their order
+RETRY_DELAYS: tuple[float, ...] = (1, 5, 30, 120)
+
+
+class StripeEventProcessor:
+    """
+    Applies recorded Stripe events in the background, in order per customer and with bounded concurrency.
+
+    A failing event is retried with backoff. When every attempt failed it stays pending and is scheduled again by
+    Stripe's next redelivery or by `resume_pending` at startup. An event that is already queued or running is not
+    scheduled a second time.
+    """
+
+    def __init__(self, max_concurrency: int, retry_delays: tuple[float, ...] = RETRY_DELAYS) -> None:
+        self.dispatcher = OrderedDispatcher(max_concurrency)
+        self.retry_delays: tuple[float, ...] = retry_delays
+        self.in_flight: set[str] = set()
+
+    @staticmethod
+    def _ordering_key(event: dict) -> str:
+        return event["data"]["object"].get("customer") or event["id"]
+
+    async def process(self, repo: BaseRepository, settings: Settings, event: dict) -> None:
+        if event["id"] in self.in_flight:
+            return
+        self.in_flight.add(event["id"])
+        try:
+            await self.dispatcher.submit(self._ordering_key(event), lambda: self._apply(repo, settings, event))
+        finally:
+            self.in_flight.discard(event["id"])
+
+    def schedule(self, repo: BaseRepository, settings: Settings, event: dict) -> None:
+        if event["id"] in self.in_flight:
+            return
+        self.in_flight.add(event["id"])
+        task: asyncio.Task = self.dispatcher.schedule(self._ordering_key(event), lambda: self._apply(repo, settings, event))
+        task.add_done_callback(lambda _: self.in_flight.discard(event["id"]))
+
+    async def resume_pending(self, repo: BaseRepository, settings: Settings) -> int:
+        """Schedule events that were recorded but never applied, e.g. because the process restarted."""
+        events: list[dict] = await repo.find_unprocessed_stripe_events()
+        for event in events:
+            self.schedule(repo, settings, event)
+        return len(events)
+
+    @staticmethod
+    async def _handle(repo: BaseRepository, settings: Settings, event: dict) -> None:
+        if event["type"] == "checkout.session.completed":
+            await handle_checkout_session_completed(repo, settings, event["data"]["object"])
+        elif event["type"] == "invoice.payment_succeeded":
+            await handle_invoice_payment_succeeded(repo, event["data"]["object"])
+        elif event["type"] == "invoice.payment_failed":
+            await handle_invoice_payment_failed(repo, settings, event["data"]["object"])
+        elif event["type"] == "customer.subscription.deleted":
+            await handle_subscription_deleted(repo, settings, event["data"]["object"])
+
+    async def _apply(self, repo: BaseRepository, settings: Settings, event: dict) -> None:
+        for attempt in range(len(self.retry_delays) + 1):
+            try:
+                await self._handle(repo, settings, event)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                if attempt == len(self.retry_delays):
+                    # the event stays pending until Stripe redelivers it or the next startup resumes it
+                    print(f"Failed to process stripe event {event['id']} after {attempt + 1} attempts: {e}")
+                    return
+                print(f"Failed to process stripe event {event['id']}, retrying in {self.retry_delays[attempt]} s: {e}")
+                await asyncio.sleep(self.retry_delays[attempt])
+            else:
+                await repo.mark_stripe_event_processed(event["id"])
+                return
@@ -1,12 +1,14 @@
 from ..db.base_repo import BaseRepository
-from ..models.subscriber import SubscriberRead
+from ..db.document_view import DocumentView, ReturnMode
 
 
 async def handle_start(repo: BaseRepository, message: dict) -> str:
     try:
         telegram_user: dict = message.get("from", {})
         if message.get("chat", {}).get("type") == "private":
-            subscriber: SubscriberRead | None = await repo.find_subscriber_by_telegram_user_id(telegram_user.get("id"))
+            subscriber: DocumentView | None = await repo.find_subscriber_by_telegram_user_id(
+                telegram_user.get("id"), {"email": 1, "is_subscription_active": 1}, ReturnMode.VIEW
+            )
             if not subscriber:
                 return "U zit niet in ons systeem, login en link je telegram account: https://rijexamenmeldingen.be/profile"
 
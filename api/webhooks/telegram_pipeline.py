@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+from cachetools import LRUCache
+
+from .. import metrics, utils
+from ..db.base_repo import BaseRepository
+from ..services.ordered_dispatcher import OrderedDispatcher
+from ..services.telegram_sender import TelegramSender
+from .telegram_handlers import handle_start, handle_voorkeuren
+
+
+class TelegramUpdatePipeline:
+    """Dedupes Telegram updates by update_id and processes them concurrently while keeping the order per chat."""
+
+    def __init__(self, sender: TelegramSender, max_concurrency: int, seen_capacity: int = 4096) -> None:
+        self.sender: TelegramSender = sender
+        self.dispatcher = OrderedDispatcher(max_concurrency)
+        self._seen_update_ids: LRUCache = LRUCache(maxsize=seen_capacity)
+
+    def is_duplicate(self, update: dict) -> bool:
+        return update.get("update_id") in self._seen_update_ids
+
+    @staticmethod
+    def _ordering_key(update: dict) -> int | None:
+        return update.get("message", {}).get("chat", {}).get("id") or update.get("update_id")
+
+    async def process(self, repo: BaseRepository, update: dict) -> None:
+        await self.dispatcher.submit(self._ordering_key(update), lambda: self._apply(repo, update))
+
+    async def _apply(self, repo: BaseRepository, update: dict) -> None:
+        # the in-memory check only covers this process, the stored events also cover restarts
+        if await repo.create_telegram_event(update):
+            await self._handle(repo, update)
+        # marked only once it went through, an update that failed before it was stored is let through again
+        self._seen_update_ids[update.get("update_id")] = True
+
+    async def _handle(self, repo: BaseRepository, update: dict) -> None:
+        if message := update.get("message"):
+            chat_id: int = message.get("chat").get("id")
+            input_text: str = message.get("text", "").lower().strip()
+            if input_text in ("/start", "/start@sbatmonitoringbot"):
+                self.sender.enqueue(chat_id, await handle_start(repo, message))
+            if input_text in ("/voorkeuren", "/voorkeuren@sbatmonitoringbot"):
+                self.sender.enqueue(chat_id, await handle_voorkeuren(message))
+
+    async def poll(self, repo: BaseRepository, bot_token: str, timeout: int = 30) -> None:
+        """Long-poll getUpdates instead of receiving webhooks, meant for local runs without a public URL."""
+        url: str = f"{utils.TELEGRAM_API_URL}/bot{bot_token}/getUpdates"
+        offset: int | None = None
+        async with httpx.AsyncClient(timeout=timeout + 10, event_hooks=metrics.HTTP_EVENT_HOOKS) as client:
+            while True:
+                try:
+                    response: httpx.Response = await client.get(url, params={"timeout": timeout, "offset": offset})
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    # a 409 means a webhook is still registered for the bot
+                    print(f"Failed to get telegram updates: {e}")
+                    await asyncio.sleep(5)
+                    continue
+
+                for update in response.json().get("result", []):
+                    offset = update["update_id"] + 1
+                    if not self.is_duplicate(update):
+                        self.dispatcher.schedule(self._ordering_key(update), lambda update=update: self._apply(repo, update))
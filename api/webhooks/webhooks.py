@@ -6,25 +6,23 @@ from nacl.exceptions import BadSignatureError
 from nacl.signing import VerifyKey
 
 from ..db.base_repo import BaseRepository
-from ..dependencies import get_repo, get_settings
+from ..dependencies import get_discord_verify_key, get_repo, get_settings, get_stripe_event_processor, get_telegram_pipeline
 from ..models.common import ReferenceCreate, ReferenceRead
 from ..models.settings import Settings
-from ..utils import send_telegram_message
 from . import discord_handlers
-from .stripe_handlers import (
-    handle_checkout_session_completed,
-    handle_invoice_payment_failed,
-    handle_invoice_payment_succeeded,
-    handle_subscription_deleted,
-)
-from .telegram_handlers import handle_start, handle_voorkeuren
+from .stripe_processor import StripeEventProcessor
+from .telegram_pipeline import TelegramUpdatePipeline
 
 webhooks = APIRouter(tags=["Webhooks"])
 
 
 @webhooks.post("/stripe-webhook")
 async def stripe_webhook(
-    request: Request, settings: Settings = Depends(get_settings), repo: BaseRepository = Depends(get_repo("mongodb"))
+    request: Request,
+    background_tasks: BackgroundTasks,
+    settings: Settings = Depends(get_settings),
+    repo: BaseRepository = Depends(get_repo()),
+    processor: StripeEventProcessor = Depends(get_stripe_event_processor),
 ) -> dict[str, str]:
     stripe.api_key = settings.stripe_secret_key
 
@@ -38,38 +36,26 @@ async def stripe_webhook(
     except stripe.error.SignatureVerificationError as e:
         raise HTTPException(status_code=400, detail="Invalid signature") from e
 
-    await repo.create_stripe_event(event)
-
-    if event["type"] == "checkout.session.completed":
-        session: dict = event["data"]["object"]
-        await handle_checkout_session_completed(repo, settings, session)
-    elif event["type"] == "invoice.payment_succeeded":
-        invoice: dict = event["data"]["object"]
-        await handle_invoice_payment_succeeded(repo, invoice)
-    elif event["type"] == "invoice.payment_failed":
-        invoice: dict = event["data"]["object"]
-        await handle_invoice_payment_failed(repo, settings, invoice)
-    elif event["type"] == "customer.subscription.deleted":
-        subscription: dict = event["data"]["object"]
-        await handle_subscription_deleted(repo, settings, subscription)
+    # Record the event durably and acknowledge right away, the handlers run after the response is sent.
+    # A redelivery of an event that is still pending is applied again, the processor skips it while it is in flight.
+    if await repo.create_stripe_event(event) != "processed":
+        background_tasks.add_task(processor.process, repo, settings, event)
 
     return {"status": "success"}
 
 
 @webhooks.post("/telegram-webhook")
 async def telegram_webhook(
-    request: Request, repo: BaseRepository = Depends(get_repo("mongodb")), settings: Settings = Depends(get_settings)
+    request: Request,
+    background_tasks: BackgroundTasks,
+    repo: BaseRepository = Depends(get_repo()),
+    pipeline: TelegramUpdatePipeline = Depends(get_telegram_pipeline),
 ) -> dict[str, str]:
     update: dict = await request.json()
 
-    if message := update.get("message"):
-        input_text: str = message.get("text", "").lower().strip()
-        if input_text in ("/start", "/start@sbatmonitoringbot"):
-            response: str = await handle_start(repo, message)
-            await send_telegram_message(response, settings.telegram_bot_token, message.get("chat").get("id"))
-        if input_text in ("/voorkeuren", "/voorkeuren@sbatmonitoringbot"):
-            response: str = await handle_voorkeuren(message)
-            await send_telegram_message(response, settings.telegram_bot_token, message.get("chat").get("id"))
+    # Acknowledge right away so Telegram does not redeliver, replies go out through the shared sender.
+    if not pipeline.is_duplicate(update):
+        background_tasks.add_task(pipeline.process, repo, update)
 
     return {"status": "ok"}
 
@@ -78,14 +64,14 @@ async def telegram_webhook(
 async def discord_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    repo: BaseRepository = Depends(get_repo("mongodb")),
+    repo: BaseRepository = Depends(get_repo()),
     settings: Settings = Depends(get_settings),
+    verify_key: VerifyKey = Depends(get_discord_verify_key),
 ) -> dict:
     body: bytes = await request.body()
     signature: str | None = request.headers.get("X-Signature-Ed25519")
     timestamp: str | None = request.headers.get("X-Signature-Timestamp")
     message: bytes = f"{timestamp}{body.decode('utf-8')}".encode()
-    verify_key = VerifyKey(bytes.fromhex(settings.discord_public_key))
 
     try:
         verify_key.verify(message, bytes.fromhex(signature))
@@ -100,8 +86,10 @@ async def discord_webhook(
         return {"type": 1}
     elif command_type == 2:
         if command_data == "start":
-            response_message: str = await discord_handlers.handle_start(background_tasks, repo, settings, interaction)
-            return {"type": 4, "data": {"content": response_message}}
+            # /start talks to the Discord API several times, answer with a deferred response (type 5)
+            # so the 3 second interaction deadline is never missed and edit it once the work is done.
+            background_tasks.add_task(discord_handlers.handle_deferred_start, repo, settings, interaction)
+            return {"type": 5}
         elif command_data == "voorkeuren":
             response_message: str = await discord_handlers.handle_voorkeuren()
             return {"type": 4, "data": {"content": response_message}}
@@ -112,7 +100,7 @@ async def discord_webhook(
 
 
 @webhooks.post("/ref-webhook")
-async def log_ref(request: Request, repo: BaseRepository = Depends(get_repo("mongodb"))) -> dict[str, str]:
+async def log_ref(request: Request, repo: BaseRepository = Depends(get_repo())) -> dict[str, str]:
     data: dict = await request.json()
     user_ip: str = request.client.host
     timestamp: str = datetime.datetime.now(datetime.UTC)
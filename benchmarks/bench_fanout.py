@@ -0,0 +1,160 @@
+"""
+Notification fan-out benchmark for `SbatMonitor.notify_users_and_update_db`.
+
+Seeds synthetic subscribers across `EXAM_CENTER_MAP`, releases batches of new slots and measures the
+time until the last delivery per channel, with every channel answered by the local sinks:
+
+    python -m benchmarks.bench_fanout --subscribers 10000 --release-sizes 1 10 100 --output fanout.json
+
+Faults can be injected per channel, e.g. `--faults '{"telegram": {"latency_ms": 50, "rate_limit_rate": 0.01}}'`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from api.db.base_repo import BaseRepository
+from api.models.sbat import EXAM_CENTER_MAP, MonitorConfiguration, MonitorPreferences
+from api.models.settings import Settings
+from api.models.subscriber import SubscriberBase
+from api.services.sbat_monitor import SbatMonitor
+
+from .bench_poll_loop import BACKENDS, benchmark_settings, create_repo
+from .common import emit_results, summarize
+from .sinks import FaultInjection, SinkServers
+
+CHANNELS: tuple[str, ...] = ("email", "discord", "telegram")
+
+
+def synthetic_subscribers(count: int, seed: int) -> list[SubscriberBase]:
+    rng = random.Random(seed)
+    exam_center_ids: list[int] = list(EXAM_CENTER_MAP)
+    subscribers: list[SubscriberBase] = []
+    for index in range(count):
+        subscribers.append(
+            SubscriberBase(
+                name=f"Subscriber {index}",
+                email=f"subscriber{index}@example.com",
+                wants_emails=rng.random() < 0.5,
+                is_subscription_active=rng.random() < 0.9,
+                telegram_user={"id": 100_000 + index} if rng.random() < 0.7 else {},
+                monitoring_preferences=MonitorPreferences(
+                    exam_center_ids=rng.sample(exam_center_ids, rng.randint(1, 2)),
+                    license_types=["B"] if rng.random() < 0.9 else ["B", "AM"],
+                ),
+            )
+        )
+    return subscribers
+
+
+def release(exam_center_id: int, size: int, first_exam_id: int) -> list[dict]:
+    start: datetime = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=14)
+    return [
+        {
+            "id": first_exam_id + index,
+            "from": (start + timedelta(minutes=30 * index)).isoformat(),
+            "till": (start + timedelta(minutes=30 * index + 30)).isoformat(),
+            "isPublic": True,
+            "dayScheduleId": 1,
+            "drivingSchool": None,
+            "examCenterId": exam_center_id,
+            "examType": "E2",
+            "examinee": None,
+            "typesBlob": json.dumps(["B"]),
+        }
+        for index in range(size)
+    ]
+
+
+def fanout_settings(args: argparse.Namespace, sinks: SinkServers) -> Settings:
+    settings: Settings = benchmark_settings(args.database_url, "http://unused")
+    return settings.model_copy(
+        update={
+            "sender_email": "monitor@example.com",
+            "sender_password": "benchmark",
+            "smtp_server": sinks.host,
+            "smtp_port": sinks.smtp_port,
+            "smtp_starttls": False,
+            "discord_bot_token": "benchmark",
+            "discord_guild_id": "1",
+            "discord_channel_id": "2",
+            "telegram_bot_token": "benchmark",
+        }
+    )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    faults: dict[str, FaultInjection] = {channel: FaultInjection(**config) for channel, config in json.loads(args.faults).items()}
+    repo: BaseRepository = await create_repo(args.backend, args.database_url, args.database_name)
+    await repo.create_many("subscribers", synthetic_subscribers(args.subscribers, args.seed))
+
+    exam_center_id: int = args.exam_center_id
+    expected: dict[str, int] = {
+        "email": len(await repo.find_all_subscribed_emails(exam_center_id, "B")),
+        "discord": 1,
+        "telegram": len(await repo.find_all_subscribed_telegram_ids(exam_center_id, "B")),
+    }
+
+    runs: list[dict] = []
+    with SinkServers(faults, http_port=args.http_port, smtp_port=args.smtp_port) as sinks:
+        monitor = SbatMonitor(repo, fanout_settings(args, sinks), MonitorConfiguration(exam_center_ids=[exam_center_id]))
+        next_exam_id: int = 1
+        for size in args.release_sizes:
+            sinks.log.clear()
+            time_slots: list[dict] = release(exam_center_id, size, next_exam_id)
+            next_exam_id += size
+
+            started_at: float = time.time()
+            with contextlib.redirect_stdout(sys.stderr):
+                await monitor.notify_users_and_update_db(time_slots, exam_center_id, EXAM_CENTER_MAP[exam_center_id], "B")
+            finished_at: float = time.time()
+            # retries run inside notify_users_and_update_db, give in-flight sink requests a moment to land
+            await asyncio.sleep(0.2)
+
+            channels: dict[str, dict] = {}
+            for channel in CHANNELS:
+                deliveries = sinks.log.for_channel(channel)
+                offsets: list[float] = [delivery.timestamp - started_at for delivery in deliveries]
+                channels[channel] = {
+                    "expected_recipients": expected[channel],
+                    "attempts": len(deliveries),
+                    "delivered": sum(delivery.outcome == "delivered" for delivery in deliveries),
+                    "time_to_first_delivery_seconds": min(offsets, default=None),
+                    "time_to_last_delivery_seconds": max(offsets, default=None),
+                    "delivery_offsets_seconds": summarize(offsets),
+                }
+            runs.append({"release_size": size, "notify_seconds": finished_at - started_at, "channels": channels})
+
+    return {"subscribers": args.subscribers, "exam_center_id": exam_center_id, "runs": runs}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--release-sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--exam-center-id", type=int, choices=list(EXAM_CENTER_MAP), default=1)
+    parser.add_argument("--faults", default="{}", help='JSON object of FaultInjection fields per channel ("email", "discord", "telegram")')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--http-port", type=int, default=8025)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--backend", choices=BACKENDS, default="mongodb")
+    parser.add_argument("--database-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database-name", default="bench-rijexamen-meldingen")
+    parser.add_argument("--output", default="-", help="file for the JSON results, '-' for stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    results: dict = asyncio.run(run(args))
+    parameters: dict = {key: value for key, value in vars(args).items() if key != "output"}
+    emit_results("fanout", parameters, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark of `SbatMonitor.check_for_time_slots` against the fake SBAT API.
+
+Reports polls/sec, detection-to-persist latency of released slots and CPU/memory per poll as JSON:
+
+    python -m benchmarks.bench_poll_loop --scenario release_burst --duration 30 --output poll_loop.json
+
+The fake API runs in-process by default, so CPU numbers include it. Start `python -m benchmarks.fake_sbat`
+separately and pass `--sbat-url` to measure the monitor alone.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import psutil
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from api.db.base_repo import BaseRepository
+from api.db.document_view import ReturnMode
+from api.db.memory_repo import InMemoryRepository
+from api.db.mongo_repo import MongoRepository
+from api.db.password_hasher import PasswordHasher
+from api.db.sqlite_repo import SqliteRepository
+from api.models.sbat import EXAM_CENTER_MAP, ExamTimeSlotRead, MonitorConfiguration
+from api.models.settings import Settings
+from api.services.sbat_monitor import SbatMonitor
+
+from .common import emit_results, summarize
+from .fake_sbat import SCENARIOS, FakeSbatState, create_fake_sbat_app, load_scenario
+
+IN_PROCESS_SBAT_URL = "http://fake-sbat"
+BACKENDS: tuple[str, ...] = ("mongodb", "sqlite", "memory")
+
+
+def benchmark_settings(database_url: str, sbat_api_url: str) -> Settings:
+    """Settings for benchmarks: no .env file and every notification channel disabled."""
+    return Settings(
+        _env_file=None,
+        database_url=database_url,
+        sbat_username="benchmark@example.com",
+        sbat_password="benchmark",
+        sbat_api_url=sbat_api_url,
+        stripe_secret_key="sk_test_benchmark",
+        stripe_publishable_key="pk_test_benchmark",
+        stripe_endpoint_secret="whsec_benchmark",
+        jwt_secret_key="benchmark",
+        discord_bot_token=None,
+        discord_guild_id=None,
+        telegram_bot_token=None,
+        smtp_server=None,
+    )
+
+
+async def create_mongo_repo(database_url: str, database_name: str, password_hasher: PasswordHasher | None = None) -> BaseRepository:
+    client: AsyncIOMotorClient = AsyncIOMotorClient(database_url)
+    await client.drop_database(database_name)
+    repo = MongoRepository(client[database_name], password_hasher=password_hasher)
+    await repo.ensure_indexes(timedelta(days=14))
+    return repo
+
+
+def create_sqlite_repo(database_name: str, password_hasher: PasswordHasher | None = None) -> BaseRepository:
+    path: str = os.path.join(tempfile.gettempdir(), f"{database_name}.db")
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + suffix)
+    return SqliteRepository(path, password_hasher=password_hasher)
+
+
+async def create_repo(
+    backend: str, database_url: str, database_name: str, password_hasher: PasswordHasher | None = None
+) -> BaseRepository:
+    """A fresh repository, the in-memory backend gives a zero-latency baseline to compare MongoDB and SQLite against."""
+    if backend == "memory":
+        return InMemoryRepository(password_hasher=password_hasher)
+    if backend == "sqlite":
+        return create_sqlite_repo(database_name, password_hasher)
+    return await create_mongo_repo(database_url, database_name, password_hasher)
+
+
+async def detection_latencies(repo: BaseRepository, released_at: dict[int, float]) -> tuple[list[float], int]:
+    """Seconds between the fake API releasing a slot and the monitor persisting it, plus the number never persisted."""
+    slots: list[dict] = await repo.find(
+        "slots", {"exam_id": {"$in": list(released_at)}}, ExamTimeSlotRead, {"exam_id": 1, "first_found_at": 1, "_id": 0}, ReturnMode.DICT
+    )
+    latencies: list[float] = []
+    for slot in slots:
+        first_found_at: datetime = slot["first_found_at"]
+        if first_found_at.tzinfo is None:
+            first_found_at = first_found_at.replace(tzinfo=UTC)
+        latencies.append(first_found_at.timestamp() - released_at[slot["exam_id"]])
+    return latencies, len(released_at) - len(slots)
+
+
+async def sample_rss(process: psutil.Process, samples: list[int], interval: float = 0.5) -> None:
+    while True:
+        samples.append(process.memory_info().rss)
+        await asyncio.sleep(interval)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    scenario = load_scenario(args.scenario, args.scenario_file)
+    state: FakeSbatState | None = None
+    if args.sbat_url:
+        http_client = httpx.AsyncClient(timeout=60)
+        sbat_api_url: str = args.sbat_url
+    else:
+        fake_app = create_fake_sbat_app(scenario)
+        state = fake_app.state.sbat
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_app), timeout=60)
+        sbat_api_url = IN_PROCESS_SBAT_URL
+
+    settings: Settings = benchmark_settings(args.database_url, sbat_api_url)
+    repo: BaseRepository = await create_repo(args.backend, args.database_url, args.database_name)
+    config = MonitorConfiguration(exam_center_ids=args.exam_center_ids, license_types=args.license_types)
+    monitor = SbatMonitor(repo, settings, config, http_client=http_client)
+    monitor.seconds_inbetween = args.interval  # bypasses the PositiveInt validation on purpose
+
+    process = psutil.Process()
+    rss_samples: list[int] = []
+    sampler: asyncio.Task = asyncio.create_task(sample_rss(process, rss_samples))
+    cpu_started: float = time.process_time()
+    wall_started: float = time.perf_counter()
+
+    # the monitor prints a line per poll, keep stdout clean for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        task: asyncio.Task = asyncio.create_task(monitor.check_for_time_slots())
+        await asyncio.sleep(args.duration)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    wall: float = time.perf_counter() - wall_started
+    cpu: float = time.process_time() - cpu_started
+    sampler.cancel()
+    await http_client.aclose()
+
+    if state is None:
+        async with httpx.AsyncClient() as client:
+            fake_stats: dict = (await client.get(f"{args.sbat_url}/stats")).json()
+        polls: int = fake_stats["polls"]
+        released_at: dict[int, float] = {}
+    else:
+        fake_stats = state.stats()
+        polls = state.total_polls
+        released_at = state.released_at
+
+    latencies, missed = await detection_latencies(repo, released_at)
+    return {
+        "wall_seconds": wall,
+        "polls": polls,
+        "polls_per_second": polls / wall if wall else 0.0,
+        "cpu_ms_per_poll": cpu * 1000 / polls if polls else None,
+        "rss_start_bytes": rss_samples[0] if rss_samples else None,
+        "rss_peak_bytes": max(rss_samples, default=None),
+        "rss_end_bytes": process.memory_info().rss,
+        "rss_growth_bytes_per_poll": (process.memory_info().rss - rss_samples[0]) / polls if polls and rss_samples else None,
+        "detection_to_persist_seconds": summarize(latencies),
+        "releases_not_persisted": missed,
+        "fake_sbat": fake_stats,
+        "fake_sbat_in_process": state is not None,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="release_burst")
+    parser.add_argument("--scenario-file", help="JSON file with Scenario fields, overrides --scenario")
+    parser.add_argument("--sbat-url", help="base URL of an out-of-process fake SBAT API")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run the poll loop")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between polls (seconds_inbetween)")
+    parser.add_argument("--exam-center-ids", type=int, nargs="+", default=list(EXAM_CENTER_MAP))
+    parser.add_argument("--license-types", nargs="+", default=["B", "AM"])
+    parser.add_argument("--backend", choices=BACKENDS, default="mongodb")
+    parser.add_argument("--database-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database-name", default="bench-rijexamen-meldingen")
+    parser.add_argument("--output", default="-", help="file for the JSON results, '-' for stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    results: dict = asyncio.run(run(args))
+    parameters: dict = {key: value for key, value in vars(args).items() if key != "output"}
+    emit_results("poll_loop", parameters, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark of the `BaseRepository` methods on the monitor and auth hot paths at realistic collection sizes.
+
+Seeds a fresh database per slot count, then awaits every operation `--iterations` times and reports ops/s
+and p50/p99 latency per operation as JSON:
+
+    python -m benchmarks.bench_repository --backend memory --slots 1000 100000 1000000 --output repository.json
+
+Pass an earlier output as `--baseline` to compare against it, the exit code is 1 when an operation lost more
+than `--threshold` of its ops/s or its p99 grew by more than that fraction. Password checks use a plaintext
+hasher on the same thread pool, so `verify_subscriber_credentials` measures the repository and not bcrypt.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from passlib.context import CryptContext
+
+from api.db.base_repo import BaseRepository
+from api.db.password_hasher import PasswordHasher
+from api.models.sbat import EXAM_CENTER_MAP, ExamTimeSlotCreate, ExamTimeSlotRead
+from api.models.subscriber import SubscriberBase
+
+from .bench_fanout import synthetic_subscribers
+from .bench_poll_loop import BACKENDS, create_repo
+from .common import emit_results, summarize
+
+OPERATIONS: tuple[str, ...] = (
+    "find_notified_time_slot_ids",
+    "find_all_subscribed_emails",
+    "find_all_subscribed_telegram_ids",
+    "update_time_slot_status",
+    "verify_subscriber_credentials",
+    "create",
+)
+PASSWORD = "benchmark"
+SEED_BATCH_SIZE = 10_000
+
+
+class PlaintextPasswordHasher(PasswordHasher):
+    """Keeps the thread pool hop of PasswordHasher but skips bcrypt, stored hashes are the passwords themselves."""
+
+    @staticmethod
+    def _create_context(rounds: int) -> CryptContext:
+        return CryptContext(schemes=["plaintext"])
+
+
+class CredentialedSubscriber(SubscriberBase):
+    hashed_password: str
+
+
+def synthetic_time_slot(exam_id: int, rng: random.Random, now: datetime) -> ExamTimeSlotCreate:
+    start_time: datetime = now + timedelta(days=rng.randint(1, 90), minutes=30 * rng.randint(0, 16))
+    # most stored slots were taken long ago, only a small share is still open and notified
+    status: str = "notified" if rng.random() < 0.1 else "taken"
+    return ExamTimeSlotCreate(
+        exam_id=exam_id,
+        first_found_at=now,
+        found_at=now,
+        taken_at=now if status == "taken" else None,
+        start_time=start_time,
+        end_time=start_time + timedelta(minutes=30),
+        status=status,
+        exam_center_id=rng.choice(list(EXAM_CENTER_MAP)),
+        types_blob=["B"] if rng.random() < 0.9 else ["B", "AM"],
+    )
+
+
+async def seed(repo: BaseRepository, slots: int, subscribers: int, seed_value: int) -> None:
+    rng = random.Random(seed_value)
+    now: datetime = datetime.now()
+    for start in range(0, slots, SEED_BATCH_SIZE):
+        batch: list[ExamTimeSlotCreate] = [
+            synthetic_time_slot(exam_id, rng, now) for exam_id in range(start + 1, min(start + SEED_BATCH_SIZE, slots) + 1)
+        ]
+        await repo.create_many("slots", batch)
+
+    subscriber_models: list[CredentialedSubscriber] = [
+        CredentialedSubscriber(**subscriber.model_dump(), hashed_password=PASSWORD)
+        for subscriber in synthetic_subscribers(subscribers, seed_value)
+    ]
+    for start in range(0, len(subscriber_models), SEED_BATCH_SIZE):
+        await repo.create_many("subscribers", subscriber_models[start : start + SEED_BATCH_SIZE])
+
+
+def operations(repo: BaseRepository, slots: int, subscribers: int, seed_value: int) -> dict[str, Callable[[], Awaitable]]:
+    rng = random.Random(seed_value)
+    exam_center_ids: list[int] = list(EXAM_CENTER_MAP)
+    next_exam_id: int = slots + 1
+    now: datetime = datetime.now()
+
+    async def create() -> None:
+        nonlocal next_exam_id
+        await repo.create("slots", synthetic_time_slot(next_exam_id, rng, now), ExamTimeSlotRead)
+        next_exam_id += 1
+
+    return {
+        "find_notified_time_slot_ids": lambda: repo.find_notified_time_slot_ids(rng.choice(exam_center_ids), "B"),
+        "find_all_subscribed_emails": lambda: repo.find_all_subscribed_emails(rng.choice(exam_center_ids), "B"),
+        "find_all_subscribed_telegram_ids": lambda: repo.find_all_subscribed_telegram_ids(rng.choice(exam_center_ids), "B"),
+        # "taken" keeps the set of notified slots, and with it find_notified_time_slot_ids, stable across the run
+        "update_time_slot_status": lambda: repo.update_time_slot_status(rng.randint(1, slots), "taken"),
+        "verify_subscriber_credentials": lambda: repo.verify_subscriber_credentials(
+            f"subscriber{rng.randrange(subscribers)}@example.com", PASSWORD
+        ),
+        "create": create,
+    }
+
+
+async def measure(operation: Callable[[], Awaitable], iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await operation()
+
+    latencies: list[float] = []
+    started_at: float = time.perf_counter()
+    for _ in range(iterations):
+        operation_started_at: float = time.perf_counter()
+        await operation()
+        latencies.append((time.perf_counter() - operation_started_at) * 1000)
+    elapsed: float = time.perf_counter() - started_at
+    return {"ops_per_second": iterations / elapsed if elapsed else None, "latency_ms": summarize(latencies)}
+
+
+def find_regressions(runs: list[dict], baseline: dict, threshold: float) -> list[dict]:
+    """Operations that lost more than `threshold` of their baseline ops/s or whose p99 grew by more than it."""
+    baseline_runs: dict[int, dict] = {run["slots"]: run for run in baseline["results"]["runs"]}
+    regressions: list[dict] = []
+    for run in runs:
+        for name, result in run["operations"].items():
+            previous: dict | None = baseline_runs.get(run["slots"], {}).get("operations", {}).get(name)
+            if not previous:
+                continue
+            slower: bool = result["ops_per_second"] < previous["ops_per_second"] * (1 - threshold)
+            tail: bool = result["latency_ms"]["p99"] > previous["latency_ms"]["p99"] * (1 + threshold)
+            if slower or tail:
+                regressions.append(
+                    {
+                        "slots": run["slots"],
+                        "operation": name,
+                        "ops_per_second": result["ops_per_second"],
+                        "baseline_ops_per_second": previous["ops_per_second"],
+                        "p99_ms": result["latency_ms"]["p99"],
+                        "baseline_p99_ms": previous["latency_ms"]["p99"],
+                    }
+                )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> dict:
+    password_hasher = PlaintextPasswordHasher(max_workers=1)
+    runs: list[dict] = []
+    for slots in args.slots:
+        repo: BaseRepository = await create_repo(args.backend, args.database_url, args.database_name, password_hasher)
+        seed_started_at: float = time.perf_counter()
+        await seed(repo, slots, args.subscribers, args.seed)
+        seed_seconds: float = time.perf_counter() - seed_started_at
+
+        measured: dict[str, dict] = {}
+        for name, operation in operations(repo, slots, args.subscribers, args.seed).items():
+            if name in args.operations:
+                measured[name] = await measure(operation, args.iterations, args.warmup)
+        runs.append({"slots": slots, "subscribers": args.subscribers, "seed_seconds": seed_seconds, "operations": measured})
+        print(f"{slots} slots: " + ", ".join(f"{name} {result['ops_per_second']:.0f} ops/s" for name, result in measured.items()), file=sys.stderr)
+
+    results: dict = {"backend": args.backend, "runs": runs}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline: dict = json.load(file)
+        if baseline["parameters"].get("backend") != args.backend:
+            print(f"Baseline was measured on {baseline['parameters'].get('backend')}, not {args.backend}", file=sys.stderr)
+        results["baseline_commit"] = baseline.get("commit")
+        results["regressions"] = find_regressions(runs, baseline, args.threshold)
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="slot collection sizes to run at")
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per operation")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed calls per operation before measuring")
+    parser.add_argument("--baseline", help="earlier output of this benchmark to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed fractional loss of ops/s or growth of p99")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=BACKENDS, default="mongodb")
+    parser.add_argument("--database-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database-name", default="bench-repository-rijexamen-meldingen")
+    parser.add_argument("--output", default="-", help="file for the JSON results, '-' for stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    results: dict = asyncio.run(run(args))
+    parameters: dict = {key: value for key, value in vars(args).items() if key != "output"}
+    emit_results("repository", parameters, results, args.output)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
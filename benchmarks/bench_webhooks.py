@@ -0,0 +1,261 @@
+"""
+Load benchmark for the Stripe, Discord and Telegram webhooks with correctly signed payloads.
+
+Stripe events carry a real `Stripe-Signature` (HMAC-SHA256) header and Discord interactions a real
+Ed25519 signature, so signature verification is part of the measured path. The app is served on a
+local socket and every outgoing Discord/Telegram/SMTP call goes to the notification sinks:
+
+    python -m benchmarks.bench_webhooks --requests 2000 --concurrency 50 --max-p99-ms 100 --output webhooks.json
+
+Reports req/s, acknowledgement latency percentiles, event-loop lag and how long the background work
+took to drain per endpoint. The load generator shares the event loop with the app, so loop lag is an
+upper bound. With `--max-p99-ms` the exit code is 1 when an endpoint misses the latency budget.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+import httpx
+from nacl.signing import SigningKey
+
+SIGNING_KEY = SigningKey(bytes(range(32)))
+STRIPE_ENDPOINT_SECRET = "whsec_benchmark"
+
+# api.dependencies reads the settings on import, point them at benchmark values before importing the app
+os.environ.update(
+    {
+        "DATABASE_URL": os.environ.get("DATABASE_URL", "mongodb://localhost:27017"),
+        "SBAT_USERNAME": "benchmark@example.com",
+        "SBAT_PASSWORD": "benchmark",
+        "STRIPE_SECRET_KEY": "sk_test_benchmark",
+        "STRIPE_PUBLISHABLE_KEY": "pk_test_benchmark",
+        "STRIPE_ENDPOINT_SECRET": STRIPE_ENDPOINT_SECRET,
+        "JWT_SECRET_KEY": "benchmark",
+        "DISCORD_BOT_TOKEN": "benchmark",
+        "DISCORD_GUILD_ID": "1",
+        "DISCORD_CHANNEL_ID": "2",
+        "DISCORD_PUBLIC_KEY": SIGNING_KEY.verify_key.encode().hex(),
+        "TELEGRAM_BOT_TOKEN": "benchmark",
+        "TELEGRAM_CHAT_ID": "-100",
+        "SENDER_EMAIL": "monitor@example.com",
+        "SENDER_PASSWORD": "benchmark",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": "2525",
+        "SMTP_STARTTLS": "false",
+    }
+)
+
+# pylint: disable=wrong-import-position
+from fastapi import FastAPI
+
+from api.db.base_repo import BaseRepository
+from api.dependencies import get_repo, get_settings, get_stripe_event_processor, get_telegram_pipeline, get_telegram_sender
+from api.models.subscriber import SubscriberBase
+from api.webhooks.webhooks import webhooks
+
+from .bench_fanout import synthetic_subscribers
+from .bench_poll_loop import BACKENDS, create_repo
+from .common import emit_results, measure_loop_lag, serve_app, summarize
+from .sinks import FaultInjection, SinkServers
+
+ENDPOINTS: tuple[str, ...] = ("stripe", "discord", "telegram")
+STRIPE_EVENT_TYPES: tuple[str, ...] = ("invoice.payment_succeeded", "invoice.payment_failed")
+DISCORD_COMMANDS: tuple[str, ...] = ("ping", "voorkeuren", "start")
+
+
+class SeededSubscriber(SubscriberBase):
+    hashed_password: str = ""
+
+
+def seeded_subscribers(count: int, seed: int) -> list[SeededSubscriber]:
+    return [
+        SeededSubscriber(
+            **subscriber.model_dump(exclude={"stripe_customer_id", "discord_user"}),
+            stripe_customer_id=f"cus_bench_{index}",
+            discord_user={"id": str(200_000 + index)},
+        )
+        for index, subscriber in enumerate(synthetic_subscribers(count, seed))
+    ]
+
+
+def stripe_request(index: int, subscribers: int, event_types: list[str]) -> tuple[bytes, dict[str, str]]:
+    customer_index: int = index % subscribers
+    event: dict = {
+        "id": f"evt_bench_{index}",
+        "object": "event",
+        "api_version": "2024-06-20",
+        "created": int(time.time()),
+        "livemode": False,
+        "type": event_types[index % len(event_types)],
+        "data": {
+            "object": {
+                "id": f"in_bench_{index}",
+                "object": "invoice",
+                "customer": f"cus_bench_{customer_index}",
+                "amount_paid": 500,
+                "amount_due": 500,
+            }
+        },
+    }
+    body: bytes = json.dumps(event).encode()
+    timestamp: int = int(time.time())
+    signature: str = hmac.new(STRIPE_ENDPOINT_SECRET.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return body, {"Content-Type": "application/json", "Stripe-Signature": f"t={timestamp},v1={signature}"}
+
+
+def discord_request(index: int, subscribers: int, commands: list[str]) -> tuple[bytes, dict[str, str]]:
+    command: str = commands[index % len(commands)]
+    interaction: dict = {"id": str(index), "application_id": "1", "token": f"interaction-{index}", "version": 1}
+    if command == "ping":
+        interaction["type"] = 1
+    else:
+        interaction.update(
+            {
+                "type": 2,
+                "data": {"id": "1", "name": command, "type": 1},
+                "member": {"user": {"id": str(200_000 + index % subscribers), "username": f"user{index}"}},
+            }
+        )
+    body: bytes = json.dumps(interaction).encode()
+    timestamp: str = str(int(time.time()))
+    signature: str = SIGNING_KEY.sign(timestamp.encode() + body).signature.hex()
+    return body, {"Content-Type": "application/json", "X-Signature-Ed25519": signature, "X-Signature-Timestamp": timestamp}
+
+
+def telegram_request(index: int, subscribers: int) -> tuple[bytes, dict[str, str]]:
+    user_id: int = 100_000 + index % subscribers
+    update: dict = {
+        "update_id": 1_000_000 + index,
+        "message": {
+            "message_id": index,
+            "date": int(time.time()),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "chat": {"id": user_id, "type": "private"},
+            "text": "/start" if index % 2 == 0 else "/voorkeuren",
+        },
+    }
+    return json.dumps(update).encode(), {"Content-Type": "application/json"}
+
+
+def build_requests(endpoint: str, args: argparse.Namespace) -> list[tuple[bytes, dict[str, str]]]:
+    if endpoint == "stripe":
+        return [stripe_request(index, args.subscribers, args.stripe_event_types) for index in range(args.requests)]
+    if endpoint == "discord":
+        return [discord_request(index, args.subscribers, args.discord_commands) for index in range(args.requests)]
+    return [telegram_request(index, args.subscribers) for index in range(args.requests)]
+
+
+async def drive(base_url: str, path: str, requests: list[tuple[bytes, dict[str, str]]], concurrency: int) -> tuple[list[float], dict[int, int], float]:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    pending = iter(requests)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        async with client:
+            for body, headers in pending:
+                started_at: float = time.perf_counter()
+                try:
+                    status_code: int = (await client.post(path, content=body, headers=headers)).status_code
+                except httpx.HTTPError:
+                    status_code = 0
+                latencies.append(time.perf_counter() - started_at)
+                statuses[status_code] = statuses.get(status_code, 0) + 1
+
+    # One client (so one keep-alive connection) per worker: a shared pool's bookkeeping grows with the number
+    # of connections and would make the load generator the bottleneck. Clients are created up front because
+    # creating one loads the CA bundle and blocks the event loop for tens of milliseconds.
+    clients: list[httpx.AsyncClient] = [httpx.AsyncClient(base_url=base_url, timeout=60) for _ in range(concurrency)]
+    started_at: float = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return latencies, statuses, time.perf_counter() - started_at
+
+
+async def wait_for_drain(timeout: float) -> float:
+    """Seconds until the Stripe and Telegram dispatchers have no pending jobs left."""
+    started_at: float = time.perf_counter()
+    dispatchers = (get_stripe_event_processor().dispatcher, get_telegram_pipeline().dispatcher)
+    while time.perf_counter() - started_at < timeout:
+        await asyncio.sleep(0.05)
+        if all(dispatcher.pending == 0 for dispatcher in dispatchers):
+            break
+    return time.perf_counter() - started_at
+
+
+async def run(args: argparse.Namespace) -> dict:
+    faults: dict[str, FaultInjection] = {channel: FaultInjection(**config) for channel, config in json.loads(args.faults).items()}
+
+    repo: BaseRepository = await create_repo(args.backend, args.database_url, args.database_name)
+    await repo.create_many("subscribers", seeded_subscribers(args.subscribers, args.seed))
+
+    app = FastAPI(title="Webhook benchmark")
+    app.include_router(webhooks)
+    app.dependency_overrides[get_repo()] = lambda: repo
+
+    results: dict[str, dict] = {}
+    with SinkServers(faults, http_port=args.sink_http_port, smtp_port=get_settings().smtp_port):
+        async with serve_app(app, args.port) as base_url:
+            for endpoint in args.endpoints:
+                requests: list[tuple[bytes, dict[str, str]]] = build_requests(endpoint, args)
+                loop_lags: list[float] = []
+                lag_task: asyncio.Task = asyncio.create_task(measure_loop_lag(loop_lags))
+                latencies, statuses, elapsed = await drive(base_url, f"/{endpoint}-webhook", requests, args.concurrency)
+                drain_seconds: float = await wait_for_drain(args.drain_timeout)
+                lag_task.cancel()
+
+                latency_ms: dict[str, float] = {key: value * 1000 if key != "count" else value for key, value in summarize(latencies).items()}
+                results[endpoint] = {
+                    "requests": len(requests),
+                    "requests_per_second": len(requests) / elapsed if elapsed else None,
+                    "status_codes": statuses,
+                    "latency_ms": latency_ms,
+                    "loop_lag_ms": {key: value * 1000 if key != "count" else value for key, value in summarize(loop_lags).items()},
+                    "drain_seconds": drain_seconds,
+                    "within_budget": args.max_p99_ms is None or latency_ms["p99"] <= args.max_p99_ms,
+                }
+        results["telegram_sender_queue"] = get_telegram_sender().queue.qsize()
+        await get_telegram_sender().close()
+
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--stripe-event-types", nargs="+", default=list(STRIPE_EVENT_TYPES))
+    parser.add_argument("--discord-commands", nargs="+", choices=DISCORD_COMMANDS, default=list(DISCORD_COMMANDS))
+    parser.add_argument("--max-p99-ms", type=float, help="latency budget, exit with 1 when an endpoint's p99 exceeds it")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--faults", default="{}", help='JSON object of FaultInjection fields per channel ("email", "discord", "telegram")')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--sink-http-port", type=int, default=8025)
+    parser.add_argument("--backend", choices=BACKENDS, default="memory")
+    parser.add_argument("--database-url", default=os.environ["DATABASE_URL"])
+    parser.add_argument("--database-name", default="bench-rijexamen-meldingen")
+    parser.add_argument("--output", default="-", help="file for the JSON results, '-' for stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    # the handlers print, keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        results: dict = asyncio.run(run(args))
+    parameters: dict = {key: value for key, value in vars(args).items() if key != "output"}
+    emit_results("webhooks", parameters, results, args.output)
+    if not all(result["within_budget"] for endpoint, result in results.items() if endpoint in ENDPOINTS):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import math
+import platform
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from typing import AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    index: int = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def emit_results(benchmark: str, parameters: dict, results: dict, output: str) -> dict:
+    """Write benchmark results as JSON (to stdout for '-') so runs on different commits can be compared."""
+    document: dict = {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    text: str = json.dumps(document, indent=2, default=str)
+    if output == "-":
+        print(text)
+    else:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    return document
+
+
+@asynccontextmanager
+async def serve_app(app: FastAPI, port: int, host: str = "127.0.0.1") -> AsyncIterator[str]:
+    """Serve an ASGI app on a real socket inside the running event loop, yields its base URL."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off"))
+    task: asyncio.Task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def measure_loop_lag(samples: list[float], interval: float = 0.01) -> None:
+    """Append how late the event loop wakes up from a sleep of `interval` seconds, until cancelled."""
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    while True:
+        started_at: float = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started_at - interval))
@@ -0,0 +1,186 @@
+"""
+Local stand-in for the SBAT API implementing the `/user/authenticate` and `/exam/available` contracts.
+
+Run it standalone with `python -m benchmarks.fake_sbat --scenario release_burst --port 8001` and point
+`SBAT_API_URL` at it, or mount `create_fake_sbat_app` in-process with `httpx.ASGITransport`.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+import jwt
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+TOKEN_SECRET = "fake-sbat-secret"
+EXPIRED_TOKEN_HEADER = 'Bearer error="invalid_token", error_description="The token is expired"'
+
+
+@dataclass
+class Scenario:
+    name: str = "steady"
+    base_slots: int = 20  # slots available from the first poll on, per exam center and license type
+    release_every: int = 0  # release new slots every n polls of an exam center and license type, 0 disables releases
+    release_size: int = 5
+    take_every: int = 0  # every n polls the oldest released slots are taken again
+    take_size: int = 3
+    token_ttl_seconds: float = 3600
+    error_rate: float = 0.0  # fraction of checks answered with one of error_status_codes
+    error_status_codes: list[int] = field(default_factory=lambda: [429, 500, 502, 503])
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    seed: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Scenario":
+        return cls(**data)
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "steady": Scenario(name="steady"),
+    "release_burst": Scenario(name="release_burst", release_every=5, release_size=25, take_every=7, take_size=10),
+    "token_expiry": Scenario(name="token_expiry", token_ttl_seconds=2, release_every=10),
+    "flaky": Scenario(name="flaky", error_rate=0.2, release_every=5),
+    "slow": Scenario(name="slow", latency_ms=800, latency_jitter_ms=400, release_every=5),
+    "huge_payload": Scenario(name="huge_payload", base_slots=5000, release_every=3, release_size=50),
+}
+
+
+class FakeSbatState:
+    def __init__(self, scenario: Scenario) -> None:
+        self.scenario: Scenario = scenario
+        self.random = random.Random(scenario.seed)
+        self.next_exam_id: int = 1
+        self.available: dict[tuple[int, str], dict[int, dict]] = {}
+        self.polls: dict[tuple[int, str], int] = {}
+        self.released_at: dict[int, float] = {}
+        self.authentications: int = 0
+        self.expired_token_responses: int = 0
+        self.error_responses: int = 0
+
+    @property
+    def total_polls(self) -> int:
+        return sum(self.polls.values())
+
+    def _new_slot(self, exam_center_id: int, license_type: str) -> dict:
+        exam_id: int = self.next_exam_id
+        self.next_exam_id += 1
+        start: datetime = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(
+            days=self.random.randint(1, 60), minutes=30 * self.random.randint(0, 16)
+        )
+        return {
+            "id": exam_id,
+            "from": start.isoformat(),
+            "till": (start + timedelta(minutes=30)).isoformat(),
+            "isPublic": True,
+            "dayScheduleId": self.random.randint(1, 10_000),
+            "drivingSchool": None,
+            "examCenterId": exam_center_id,
+            "examType": "E2",
+            "examinee": None,
+            "typesBlob": json.dumps([license_type]),
+        }
+
+    def poll(self, exam_center_id: int, license_type: str) -> list[dict]:
+        key: tuple[int, str] = (exam_center_id, license_type)
+        if key not in self.available:
+            self.available[key] = {}
+            for _ in range(self.scenario.base_slots):
+                slot: dict = self._new_slot(exam_center_id, license_type)
+                self.available[key][slot["id"]] = slot
+
+        self.polls[key] = self.polls.get(key, 0) + 1
+        polls: int = self.polls[key]
+        slots: dict[int, dict] = self.available[key]
+
+        if self.scenario.take_every and polls % self.scenario.take_every == 0:
+            released: list[int] = [exam_id for exam_id in slots if exam_id in self.released_at]
+            for exam_id in released[: self.scenario.take_size]:
+                del slots[exam_id]
+
+        if self.scenario.release_every and polls % self.scenario.release_every == 0:
+            for _ in range(self.scenario.release_size):
+                slot = self._new_slot(exam_center_id, license_type)
+                slots[slot["id"]] = slot
+                self.released_at[slot["id"]] = time.time()
+
+        return list(slots.values())
+
+    def stats(self) -> dict:
+        return {
+            "polls": self.total_polls,
+            "authentications": self.authentications,
+            "expired_token_responses": self.expired_token_responses,
+            "error_responses": self.error_responses,
+            "released_slots": len(self.released_at),
+        }
+
+
+def create_fake_sbat_app(scenario: Scenario) -> FastAPI:
+    app = FastAPI(title="Fake SBAT API")
+    state = FakeSbatState(scenario)
+    app.state.sbat = state
+
+    @app.post("/user/authenticate")
+    async def authenticate(request: Request) -> Response:
+        credentials: dict = await request.json()
+        state.authentications += 1
+        token: str = jwt.encode(
+            {"sub": credentials.get("username"), "exp": int(time.time() + scenario.token_ttl_seconds)}, TOKEN_SECRET, algorithm="HS256"
+        )
+        return PlainTextResponse(token)
+
+    @app.post("/exam/available")
+    async def available(request: Request) -> Response:
+        if scenario.latency_ms or scenario.latency_jitter_ms:
+            await asyncio.sleep(max(0.0, scenario.latency_ms + state.random.uniform(-1, 1) * scenario.latency_jitter_ms) / 1000)
+
+        try:
+            jwt.decode(request.headers.get("Authorization", "").removeprefix("Bearer "), TOKEN_SECRET, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            state.expired_token_responses += 1
+            return Response(status_code=401, headers={"WWW-Authenticate": EXPIRED_TOKEN_HEADER})
+        except jwt.InvalidTokenError:
+            return Response(status_code=401, headers={"WWW-Authenticate": 'Bearer error="invalid_token"'})
+
+        if scenario.error_rate and state.random.random() < scenario.error_rate:
+            state.error_responses += 1
+            status_code: int = state.random.choice(scenario.error_status_codes)
+            headers: dict[str, str] = {"Retry-After": "1"} if status_code == 429 else {}
+            return PlainTextResponse(f"fake error {status_code}", status_code=status_code, headers=headers)
+
+        body: dict = await request.json()
+        return JSONResponse(state.poll(body["examCenterId"], body["licenseType"]))
+
+    @app.get("/stats")
+    async def stats() -> dict:
+        return {"scenario": asdict(scenario), **state.stats()}
+
+    return app
+
+
+def load_scenario(name: str | None, scenario_file: str | None) -> Scenario:
+    if scenario_file:
+        with open(scenario_file, encoding="utf-8") as file:
+            return Scenario.from_dict(json.load(file))
+    return SCENARIOS[name or "steady"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="steady")
+    parser.add_argument("--scenario-file", help="JSON file with Scenario fields, overrides --scenario")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    uvicorn.run(create_fake_sbat_app(load_scenario(args.scenario, args.scenario_file)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
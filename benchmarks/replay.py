@@ -0,0 +1,144 @@
+"""
+Replays recorded SBAT poll payloads through `SbatMonitor.notify_users_and_update_db`.
+
+Record payloads by setting `SBAT_RECORD_PATH` (e.g. `recordings/sbat-%Y-%m-%d.jsonl.gz`), then push a
+recorded day through the real diff, persist and notify pipeline at accelerated speed, with every
+notification delivered to the local sinks:
+
+    python -m benchmarks.replay recordings/sbat-2024-09-02.jsonl.gz --speed 120 --subscribers 2000 --output replay.json
+
+`--speed 0` replays as fast as possible and `--profile replay.pstats` profiles the whole replay.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import heapq
+import json
+import sys
+import time
+from datetime import date, datetime
+
+from api.db.base_repo import BaseRepository
+from api.models.sbat import EXAM_CENTER_MAP, MonitorConfiguration
+from api.services.poll_recorder import read_recording
+from api.services.sbat_monitor import SbatMonitor
+
+from .bench_fanout import CHANNELS, fanout_settings, synthetic_subscribers
+from .bench_poll_loop import BACKENDS, create_repo
+from .common import emit_results, summarize
+from .sinks import FaultInjection, SinkServers
+
+
+def load_records(paths: list[str], day: date | None) -> list[dict]:
+    records: list[dict] = [record for path in paths for record in read_recording(path)]
+    if day:
+        records = [record for record in records if record["received_at"].date() == day]
+    return sorted(records, key=lambda record: record["received_at"])
+
+
+async def replay(monitor: SbatMonitor, records: list[dict], speed: float, sinks: SinkServers) -> tuple[list[dict], list[float]]:
+    polls: list[dict] = []
+    schedule_lags: list[float] = []
+    first_received_at: datetime = records[0]["received_at"]
+    started_at: float = time.perf_counter()
+
+    for record in records:
+        if speed > 0:
+            due_at: float = started_at + (record["received_at"] - first_received_at).total_seconds() / speed
+            await asyncio.sleep(max(0.0, due_at - time.perf_counter()))
+            schedule_lags.append(max(0.0, time.perf_counter() - due_at))
+
+        exam_center_id: int = record["request_body"]["examCenterId"]
+        license_type: str = record["request_body"]["licenseType"]
+        notified: set[int] = await monitor.repo.find_notified_time_slot_ids(exam_center_id, license_type)
+        new_time_slots: int = sum(time_slot["id"] not in notified for time_slot in record["payload"])
+        deliveries_before: int = len(sinks.log.deliveries)
+
+        poll_started_at: float = time.perf_counter()
+        await monitor.notify_users_and_update_db(record["payload"], exam_center_id, EXAM_CENTER_MAP[exam_center_id], license_type)
+        polls.append(
+            {
+                "received_at": record["received_at"].isoformat(),
+                "exam_center_id": exam_center_id,
+                "license_type": license_type,
+                "time_slots": len(record["payload"]),
+                "new_time_slots": new_time_slots,
+                "deliveries": len(sinks.log.deliveries) - deliveries_before,
+                "seconds": time.perf_counter() - poll_started_at,
+            }
+        )
+    return polls, schedule_lags
+
+
+async def run(args: argparse.Namespace) -> dict:
+    records: list[dict] = load_records(args.recordings, date.fromisoformat(args.day) if args.day else None)
+    if not records:
+        raise SystemExit("No records to replay")
+
+    faults: dict[str, FaultInjection] = {channel: FaultInjection(**config) for channel, config in json.loads(args.faults).items()}
+    repo: BaseRepository = await create_repo(args.backend, args.database_url, args.database_name)
+    await repo.create_many("subscribers", synthetic_subscribers(args.subscribers, args.seed))
+
+    exam_center_ids: list[int] = sorted({record["request_body"]["examCenterId"] for record in records})
+    profiler: cProfile.Profile | None = cProfile.Profile() if args.profile else None
+    with SinkServers(faults, http_port=args.http_port, smtp_port=args.smtp_port) as sinks:
+        monitor = SbatMonitor(repo, fanout_settings(args, sinks), MonitorConfiguration(exam_center_ids=exam_center_ids))
+        started_at: float = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            if profiler:
+                profiler.enable()
+            polls, schedule_lags = await replay(monitor, records, args.speed, sinks)
+            if profiler:
+                profiler.disable()
+        elapsed: float = time.perf_counter() - started_at
+        deliveries: dict[str, int] = {channel: len(sinks.log.for_channel(channel)) for channel in CHANNELS}
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+
+    recorded_seconds: float = (records[-1]["received_at"] - records[0]["received_at"]).total_seconds()
+    return {
+        "polls": len(polls),
+        "recorded_from": records[0]["received_at"].isoformat(),
+        "recorded_till": records[-1]["received_at"].isoformat(),
+        "recorded_seconds": recorded_seconds,
+        "replay_seconds": elapsed,
+        "effective_speed": recorded_seconds / elapsed if elapsed else None,
+        "poll_seconds": summarize([poll["seconds"] for poll in polls]),
+        "schedule_lag_seconds": summarize(schedule_lags),
+        "new_time_slots": sum(poll["new_time_slots"] for poll in polls),
+        "deliveries": deliveries,
+        "slowest_polls": heapq.nlargest(args.top, polls, key=lambda poll: poll["seconds"]),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="recording files written by PollRecorder")
+    parser.add_argument("--day", help="only replay records received on this date (YYYY-MM-DD, UTC)")
+    parser.add_argument("--speed", type=float, default=60.0, help="replay speed-up factor, 0 replays as fast as possible")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--faults", default="{}", help='JSON object of FaultInjection fields per channel ("email", "discord", "telegram")')
+    parser.add_argument("--profile", help="write cProfile stats of the replay to this file")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest polls to report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--http-port", type=int, default=8025)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--backend", choices=BACKENDS, default="mongodb")
+    parser.add_argument("--database-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database-name", default="replay-rijexamen-meldingen")
+    parser.add_argument("--output", default="-", help="file for the JSON results, '-' for stdout")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    results: dict = asyncio.run(run(args))
+    parameters: dict = {key: value for key, value in vars(args).items() if key != "output"}
+    emit_results("replay", parameters, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
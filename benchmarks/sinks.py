@@ -0,0 +1,250 @@
+"""
+Local stand-ins for the notification channels: SMTP, the Telegram Bot API and the Discord REST API.
+
+Every sink records the deliveries it accepted and can inject latency, 429 responses and failures.
+The sinks run on their own threads and event loops, so blocking clients such as smtplib can talk to
+them from the event loop under test without deadlocking it.
+"""
+
+import asyncio
+import base64
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from api import utils
+from api.models.sbat import EXAM_CENTER_MAP
+
+
+@dataclass
+class FaultInjection:
+    latency_ms: float = 0.0
+    rate_limit_rate: float = 0.0  # fraction of requests answered with 429
+    failure_rate: float = 0.0  # fraction of requests answered with a server error
+    retry_after_seconds: int = 1
+    seed: int = 0
+    rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+
+    def outcome(self) -> str:
+        draw: float = self.rng.random()
+        if draw < self.rate_limit_rate:
+            return "rate_limited"
+        if draw < self.rate_limit_rate + self.failure_rate:
+            return "failed"
+        return "delivered"
+
+
+@dataclass
+class Delivery:
+    channel: str
+    recipient: str
+    timestamp: float
+    outcome: str
+
+
+class DeliveryLog:
+    def __init__(self) -> None:
+        self.deliveries: list[Delivery] = []
+
+    def record(self, channel: str, recipient: str, outcome: str) -> None:
+        self.deliveries.append(Delivery(channel, recipient, time.time(), outcome))
+
+    def for_channel(self, channel: str) -> list[Delivery]:
+        return [delivery for delivery in self.deliveries if delivery.channel == channel]
+
+    def clear(self) -> None:
+        self.deliveries.clear()
+
+
+def create_telegram_router(log: DeliveryLog, faults: FaultInjection) -> APIRouter:
+    router = APIRouter()
+
+    @router.post("/bot{bot_token}/sendMessage")
+    async def send_message(bot_token: str, request: Request) -> JSONResponse:  # pylint: disable=unused-argument
+        form = await request.form()
+        if faults.latency_ms:
+            await asyncio.sleep(faults.latency_ms / 1000)
+        outcome: str = faults.outcome()
+        log.record("telegram", str(form.get("chat_id")), outcome)
+        if outcome == "rate_limited":
+            return JSONResponse(
+                {"ok": False, "error_code": 429, "parameters": {"retry_after": faults.retry_after_seconds}}, status_code=429
+            )
+        if outcome == "failed":
+            return JSONResponse({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status_code=500)
+        return JSONResponse({"ok": True, "result": {"chat": {"id": form.get("chat_id")}, "text": form.get("text")}})
+
+    @router.post("/bot{bot_token}/createChatInviteLink")
+    async def create_chat_invite_link(bot_token: str, request: Request) -> dict:  # pylint: disable=unused-argument
+        payload: dict = await request.json()
+        return {"ok": True, "result": {"invite_link": f"https://t.me/+sink{payload.get('chat_id')}", "member_limit": 1}}
+
+    return router
+
+
+def create_discord_router(log: DeliveryLog, faults: FaultInjection) -> APIRouter:
+    router = APIRouter()
+    roles: list[dict] = [
+        {"id": str(index), "name": f"{center} - {license_type}"}
+        for index, (center, license_type) in enumerate(
+            ((center, license_type) for center in EXAM_CENTER_MAP.values() for license_type in ("B", "AM")), start=1
+        )
+    ]
+
+    @router.get("/guilds/{guild_id}/roles")
+    async def get_roles(guild_id: str) -> list[dict]:  # pylint: disable=unused-argument
+        return roles
+
+    @router.post("/channels/{channel_id}/messages")
+    async def create_message(channel_id: str, request: Request) -> JSONResponse:
+        payload: dict = await request.json()
+        if faults.latency_ms:
+            await asyncio.sleep(faults.latency_ms / 1000)
+        outcome: str = faults.outcome()
+        role_mention: str = payload.get("content", "").split("\n", 1)[0]
+        log.record("discord", f"{channel_id}:{role_mention}", outcome)
+        if outcome == "rate_limited":
+            return JSONResponse({"message": "You are being rate limited.", "retry_after": faults.retry_after_seconds}, status_code=429)
+        if outcome == "failed":
+            return JSONResponse({"message": "Internal Server Error"}, status_code=500)
+        return JSONResponse({"id": str(len(log.deliveries)), "channel_id": channel_id, "content": payload.get("content")})
+
+    @router.get("/guilds/{guild_id}/members/{user_id}")
+    async def get_member(guild_id: str, user_id: str) -> dict:  # pylint: disable=unused-argument
+        return {"user": {"id": user_id}, "roles": []}
+
+    @router.api_route("/guilds/{guild_id}/members/{user_id}/roles/{role_id}", methods=["PUT", "DELETE"])
+    async def update_member_role(guild_id: str, user_id: str, role_id: str) -> Response:  # pylint: disable=unused-argument
+        return Response(status_code=204)
+
+    @router.patch("/webhooks/{application_id}/{interaction_token}/messages/@original")
+    async def edit_original_response(application_id: str, interaction_token: str, request: Request) -> JSONResponse:
+        payload: dict = await request.json()
+        if faults.latency_ms:
+            await asyncio.sleep(faults.latency_ms / 1000)
+        outcome: str = faults.outcome()
+        log.record("discord_interaction", f"{application_id}:{interaction_token}", outcome)
+        if outcome != "delivered":
+            return JSONResponse({"message": "Internal Server Error"}, status_code=500)
+        return JSONResponse({"id": interaction_token, "content": payload.get("content")})
+
+    return router
+
+
+class SmtpSink:
+    """Minimal SMTP server (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA) recording one delivery per recipient other than the sender."""
+
+    def __init__(self, log: DeliveryLog, faults: FaultInjection) -> None:
+        self.log: DeliveryLog = log
+        self.faults: FaultInjection = faults
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        sender: str = ""
+        recipients: list[str] = []
+        await reply("220 smtp-sink ESMTP")
+        try:
+            while line := await reader.readline():
+                command: str = line.decode().strip()
+                verb: str = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    await reply("250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif verb == "AUTH":
+                    if command.upper().startswith("AUTH LOGIN"):
+                        await reply(f"334 {base64.b64encode(b'Username:').decode()}")
+                        await reader.readline()
+                        await reply(f"334 {base64.b64encode(b'Password:').decode()}")
+                        await reader.readline()
+                    await reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    sender = command.split(":", 1)[1].split()[0].strip("<>")
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    if self.faults.latency_ms:
+                        await asyncio.sleep(self.faults.latency_ms / 1000)
+                    outcome: str = self.faults.outcome()
+                    # a fan-out goes To: the sender with the subscribers in Bcc, the sender's own copy is not a delivery
+                    for recipient in recipients:
+                        if recipient != sender:
+                            self.log.record("email", recipient, outcome)
+                    await reply("250 OK" if outcome == "delivered" else "451 Requested action aborted")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("250 OK")
+        finally:
+            writer.close()
+
+
+class SinkServers:
+    """Runs the SMTP, Telegram and Discord sinks on a background thread and points `api.utils` at them."""
+
+    def __init__(self, faults: dict[str, FaultInjection] | None = None, host: str = "127.0.0.1", http_port: int = 8025, smtp_port: int = 2525):
+        faults = faults or {}
+        self.log = DeliveryLog()
+        self.host: str = host
+        self.http_port: int = http_port
+        self.smtp_port: int = smtp_port
+
+        self.app = FastAPI(title="Notification sinks")
+        self.app.include_router(create_telegram_router(self.log, faults.get("telegram", FaultInjection())), prefix="/telegram")
+        self.app.include_router(create_discord_router(self.log, faults.get("discord", FaultInjection())), prefix="/discord")
+        self.smtp = SmtpSink(self.log, faults.get("email", FaultInjection()))
+
+        self._http_server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=http_port, log_level="warning", lifespan="off"))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._previous_urls: tuple[str, str] | None = None
+
+    @property
+    def telegram_api_url(self) -> str:
+        return f"http://{self.host}:{self.http_port}/telegram"
+
+    @property
+    def discord_api_url(self) -> str:
+        return f"http://{self.host}:{self.http_port}/discord"
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        smtp_server: asyncio.Server = await asyncio.start_server(self.smtp.handle, self.host, self.smtp_port)
+        http_task: asyncio.Task = asyncio.create_task(self._http_server.serve())
+        while not self._http_server.started:
+            await asyncio.sleep(0.01)
+        self._started.set()
+        await http_task
+        smtp_server.close()
+
+    def __enter__(self) -> "SinkServers":
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="notification-sinks", daemon=True)
+        self._thread.start()
+        if not self._started.wait(timeout=10):
+            raise RuntimeError("Notification sinks did not start")
+        self._previous_urls = (utils.TELEGRAM_API_URL, utils.DISCORD_API_URL)
+        utils.TELEGRAM_API_URL = self.telegram_api_url
+        utils.DISCORD_API_URL = self.discord_api_url
+        return self
+
+    def __exit__(self, *_) -> None:
+        utils.TELEGRAM_API_URL, utils.DISCORD_API_URL = self._previous_urls
+        self._http_server.should_exit = True
+        self._thread.join(timeout=10)
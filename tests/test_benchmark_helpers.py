@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmarks.bench_repository import find_regressions
+from benchmarks.common import emit_results, percentile, summarize
+
+
+def test_percentiles_are_nearest_rank() -> None:
+    values: list[float] = [float(value) for value in range(100, 0, -1)]
+
+    assert [percentile(values, q) for q in (0, 1, 50, 90, 99, 100)] == [1, 1, 50, 90, 99, 100]
+    assert percentile([7.0], 99) == 7
+    assert percentile([], 50) == 0
+
+
+def test_summaries_of_empty_and_filled_samples() -> None:
+    assert summarize([4, 1, 3, 2]) == {"count": 4, "mean": 2.5, "p50": 2, "p90": 4, "p99": 4, "max": 4}
+    assert summarize([]) == {"count": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+
+
+def test_results_are_written_with_the_run_metadata(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    output: Path = tmp_path / "results.json"
+
+    document: dict = emit_results("poll_loop", {"polls": 10}, {"p50": 1.5}, str(output))
+
+    assert json.loads(output.read_text(encoding="utf-8")) == document
+    assert (document["benchmark"], document["parameters"], document["results"]) == ("poll_loop", {"polls": 10}, {"p50": 1.5})
+    assert {"commit", "timestamp", "python", "platform"} <= document.keys()
+
+    emit_results("poll_loop", {}, {}, "-")
+    assert json.loads(capsys.readouterr().out)["benchmark"] == "poll_loop"
+
+
+def repository_run(slots: int, operations: dict[str, tuple[float, float]]) -> dict:
+    return {
+        "slots": slots,
+        "operations": {name: {"ops_per_second": ops, "latency_ms": {"p99": p99}} for name, (ops, p99) in operations.items()},
+    }
+
+
+def test_regressions_are_throughput_drops_or_tail_growth_past_the_threshold() -> None:
+    baseline: dict = {"results": {"runs": [repository_run(1000, {"find": (1000, 2.0), "insert": (500, 4.0), "update": (200, 5.0)})]}}
+    runs: list[dict] = [
+        repository_run(1000, {"find": (850, 2.0), "insert": (480, 4.8), "update": (195, 5.4), "delete": (1, 100)}),
+        repository_run(10_000, {"find": (1, 100)}),
+    ]
+
+    regressions: list[dict] = find_regressions(runs, baseline, 0.1)
+
+    assert [(regression["operation"], regression["ops_per_second"], regression["p99_ms"]) for regression in regressions] == [
+        ("find", 850, 2.0),
+        ("insert", 480, 4.8),
+    ]
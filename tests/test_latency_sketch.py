@@ -0,0 +1,39 @@
+import random
+from collections import Counter
+
+import pytest
+
+from api.latency_sketch import RELATIVE_ACCURACY, LatencySketch
+
+
+def sketch_of(values: list[float]) -> LatencySketch:
+    return LatencySketch(Counter(LatencySketch.index(value) for value in values))
+
+
+def test_quantiles_stay_within_the_relative_accuracy() -> None:
+    values: list[float] = sorted(random.Random(7).lognormvariate(6, 1.5) for _ in range(5000))
+    sketch: LatencySketch = sketch_of(values)
+
+    assert sketch.count == 5000
+    for q in (0, 0.25, 0.5, 0.9, 0.99, 1):
+        exact: float = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=RELATIVE_ACCURACY)
+
+
+def test_merged_sketches_equal_the_sketch_of_all_values() -> None:
+    first: list[float] = [120, 250, 250, 4000]
+    second: list[float] = [90, 250, 60000]
+    merged: LatencySketch = sketch_of(first)
+    merged.merge(sketch_of(second))
+
+    assert merged.bins == sketch_of(first + second).bins
+    assert merged.quantile(0.5) == pytest.approx(250, rel=RELATIVE_ACCURACY)
+
+
+def test_stored_bins_and_edge_cases() -> None:
+    stored: LatencySketch = LatencySketch.from_document({str(LatencySketch.index(100)): 3})
+
+    assert stored.quantile(0.5) == pytest.approx(100, rel=RELATIVE_ACCURACY)
+    assert LatencySketch().quantile(0.5) is None
+    # values below the minimum share its bin instead of raising on log(0)
+    assert LatencySketch.index(0) == LatencySketch.index(0.0001)
@@ -0,0 +1,87 @@
+import importlib
+from types import ModuleType
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from api import metrics
+from api.metrics import MetricsRegistry, timed_repository_method
+from api.models.settings import Settings
+
+
+def test_registry_renders_the_prometheus_text_format() -> None:
+    registry = MetricsRegistry()
+    responses = registry.counter("responses_total", "Responses by host.", ("host",))
+    depth = registry.gauge("queue_depth", "Queued jobs.")
+    latency = registry.histogram("latency_seconds", "Request latency.", ("path",), (0.1, 1.0))
+    responses.inc('api "v2"\n')
+    responses.inc('api "v2"\n', amount=2)
+    depth.set(2.5)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, "/slots")
+
+    assert registry.render() == (
+        "# HELP responses_total Responses by host.\n"
+        "# TYPE responses_total counter\n"
+        'responses_total{host="api \\"v2\\"\\n"} 3\n'
+        "# HELP queue_depth Queued jobs.\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 2.5\n"
+        "# HELP latency_seconds Request latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{path="/slots",le="0.1"} 2\n'
+        'latency_seconds_bucket{path="/slots",le="1"} 3\n'
+        'latency_seconds_bucket{path="/slots",le="+Inf"} 4\n'
+        'latency_seconds_sum{path="/slots"} 3.65\n'
+        'latency_seconds_count{path="/slots"} 4\n'
+    )
+    with pytest.raises(ValueError):
+        registry.gauge("queue_depth", "Queued jobs.")
+
+
+class TimedRepository:
+    @timed_repository_method
+    async def find_one(self) -> int:
+        return 1
+
+    @timed_repository_method
+    async def find_many(self) -> list[int]:
+        return [await self.find_one(), await self.find_one()]
+
+
+@pytest.mark.asyncio
+async def test_only_the_outermost_repository_call_is_timed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics, "REPOSITORY_SECONDS", metrics.Histogram("repository_seconds", "", ("backend", "method")))
+
+    assert await TimedRepository().find_many() == [1, 1]
+    await TimedRepository().find_one()
+
+    # the bucket counts add up to the number of observations, the last entry is the sum of the durations
+    observations: dict[tuple, float] = {key: sum(counts[:-1]) for key, counts in metrics.REPOSITORY_SECONDS.values.items()}
+    assert observations == {("TimedRepository", "find_many"): 1, ("TimedRepository", "find_one"): 1}
+
+
+@pytest.fixture
+def dependencies(monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    # the module reads the settings on import
+    for name in ("SBAT_USERNAME", "SBAT_PASSWORD", "STRIPE_SECRET_KEY", "STRIPE_PUBLISHABLE_KEY", "STRIPE_ENDPOINT_SECRET", "JWT_SECRET_KEY"):
+        monkeypatch.setenv(name, "test")
+    for name in ("DISCORD_BOT_TOKEN", "DISCORD_GUILD_ID"):
+        monkeypatch.setenv(name, "")
+    return importlib.import_module("api.dependencies")
+
+
+@pytest.mark.asyncio
+async def test_metrics_need_the_static_token(dependencies: ModuleType) -> None:  # pylint: disable=redefined-outer-name
+    verify_metrics_token = dependencies.verify_metrics_token
+    settings: Settings = Settings.model_construct(metrics_token="scrape-token")
+
+    await verify_metrics_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials="scrape-token"), settings)
+    for credentials in (None, HTTPAuthorizationCredentials(scheme="Bearer", credentials="user-jwt")):
+        with pytest.raises(HTTPException) as unauthorized:
+            await verify_metrics_token(credentials, settings)
+        assert unauthorized.value.status_code == 401
+    with pytest.raises(HTTPException) as disabled:
+        await verify_metrics_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials="scrape-token"), Settings.model_construct())
+    assert disabled.value.status_code == 403
@@ -0,0 +1,46 @@
+from datetime import UTC, datetime, timedelta
+
+from api.services.notification_receipts import AlertReceipts, latency_percentiles
+
+FOUND_AT: datetime = datetime(2026, 3, 2, 9, tzinfo=UTC)
+
+
+def receipt(channel: str, exam_center_id: int, accepted_ms: list[int | None]) -> dict:
+    return {
+        "channel": channel,
+        "exam_center_id": exam_center_id,
+        "accepted_ms": accepted_ms,
+        "outcomes": ["accepted" if latency is not None else "failed" for latency in accepted_ms],
+    }
+
+
+def test_receipts_keep_the_offset_from_found_at() -> None:
+    receipts = AlertReceipts("a1", "email", 1, "B", [11, 12], FOUND_AT)
+    receipts.add("user@example.com", "accepted", FOUND_AT + timedelta(milliseconds=1500))
+    receipts.add(42, "failed", FOUND_AT + timedelta(seconds=3))
+
+    stored = receipts.to_model(timedelta(days=30))
+
+    assert (stored.recipients, stored.accepted_ms, stored.outcomes) == (["user@example.com", "42"], [1500, None], ["accepted", "failed"])
+    assert stored.expires_at == FOUND_AT + timedelta(days=30)
+
+
+def test_percentiles_are_nearest_rank_per_channel_and_exam_center() -> None:
+    receipts: list[dict] = [
+        receipt("email", 1, list(range(100, 0, -1))[:50]),
+        receipt("email", 1, [*range(50, 0, -1), None]),
+        receipt("telegram", 1, [None, None]),
+        receipt("email", 7, [300]),
+    ]
+
+    latencies = latency_percentiles(receipts)
+
+    assert [(latency.channel, latency.exam_center, latency.receipts, latency.failed) for latency in latencies] == [
+        ("email", "sintdenijswestrem", 101, 1),
+        ("email", "brakel", 1, 0),
+        ("telegram", "sintdenijswestrem", 2, 2),
+    ]
+    email = latencies[0]
+    assert (email.p50_ms, email.p90_ms, email.p99_ms, email.max_ms) == (50, 90, 99, 100)
+    assert (latencies[1].p50_ms, latencies[1].p99_ms) == (300, 300)
+    assert (latencies[2].p50_ms, latencies[2].max_ms) == (None, None)
@@ -0,0 +1,61 @@
+import asyncio
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.sinks import DeliveryLog, FaultInjection, SmtpSink, create_discord_router, create_telegram_router
+
+
+def test_fault_injection_draws_outcomes_at_the_configured_rates() -> None:
+    faults = FaultInjection(rate_limit_rate=0.2, failure_rate=0.1, seed=3)
+    outcomes: list[str] = [faults.outcome() for _ in range(10_000)]
+
+    assert outcomes.count("rate_limited") == pytest.approx(2000, rel=0.1)
+    assert outcomes.count("failed") == pytest.approx(1000, rel=0.1)
+    # the same seed replays the same outcomes
+    replayed = FaultInjection(rate_limit_rate=0.2, failure_rate=0.1, seed=3)
+    assert outcomes == [replayed.outcome() for _ in range(10_000)]
+    assert {FaultInjection().outcome() for _ in range(100)} == {"delivered"}
+
+
+def test_http_sinks_record_every_attempt_and_answer_like_the_apis() -> None:
+    log = DeliveryLog()
+    app = FastAPI()
+    app.include_router(create_telegram_router(log, FaultInjection(rate_limit_rate=1.0, retry_after_seconds=3)), prefix="/telegram")
+    app.include_router(create_discord_router(log, FaultInjection()), prefix="/discord")
+    client = TestClient(app)
+
+    rate_limited = client.post("/telegram/bottoken/sendMessage", data={"chat_id": "42", "text": "hi"})
+    delivered = client.post("/discord/channels/7/messages", json={"content": "@brakel - B\nnew slots"})
+
+    assert (rate_limited.status_code, rate_limited.json()["parameters"]["retry_after"]) == (429, 3)
+    assert delivered.status_code == 200
+    assert [(delivery.channel, delivery.recipient, delivery.outcome) for delivery in log.deliveries] == [
+        ("telegram", "42", "rate_limited"),
+        ("discord", "7:@brakel - B", "delivered"),
+    ]
+    assert len(log.for_channel("discord")) == 1
+
+
+@pytest.mark.asyncio
+async def test_smtp_sink_records_the_bcc_recipients_without_the_senders_copy() -> None:
+    log = DeliveryLog()
+    server: asyncio.Server = await asyncio.start_server(SmtpSink(log, FaultInjection()).handle, "127.0.0.1", 0)
+    port: int = server.sockets[0].getsockname()[1]
+    message = EmailMessage()
+    message["From"] = message["To"] = "monitor@example.com"
+    message["Bcc"] = "a@example.com, b@example.com"
+    message.set_content("new slots")
+
+    def send() -> None:
+        with smtplib.SMTP("127.0.0.1", port) as smtp:
+            smtp.login("monitor@example.com", "secret")
+            smtp.send_message(message)
+
+    async with server:
+        await asyncio.to_thread(send)
+
+    assert sorted(delivery.recipient for delivery in log.for_channel("email")) == ["a@example.com", "b@example.com"]
@@ -0,0 +1,48 @@
+from datetime import UTC, date, datetime, timedelta
+from pathlib import Path
+
+from api.services.poll_recorder import PollRecorder, read_recording
+from benchmarks.replay import load_records
+
+RECEIVED_AT: datetime = datetime(2026, 3, 2, 23, 59, tzinfo=UTC)
+
+
+def test_records_round_trip_through_one_file_per_day(tmp_path: Path) -> None:
+    recorder = PollRecorder(str(tmp_path / "recordings" / "sbat-%Y-%m-%d.jsonl.gz"))
+    for minutes in (0, 0.5, 2):
+        recorder.write({"examCenterId": 1, "licenseType": "B"}, [{"id": int(minutes * 10)}], RECEIVED_AT + timedelta(minutes=minutes), 0.25)
+    recorder.close()
+    # reopening appends a new gzip member to the same day
+    recorder.write({"examCenterId": 7, "licenseType": "B"}, [], RECEIVED_AT + timedelta(minutes=1), 0.5)
+    recorder.close()
+
+    first_day: list[dict] = list(read_recording(str(tmp_path / "recordings" / "sbat-2026-03-02.jsonl.gz")))
+    second_day: list[dict] = list(read_recording(str(tmp_path / "recordings" / "sbat-2026-03-03.jsonl.gz")))
+
+    assert recorder.records == 4
+    assert [(record["payload"], record["request_body"]["examCenterId"]) for record in first_day] == [([{"id": 0}], 1), ([{"id": 5}], 1)]
+    assert first_day[0] == {
+        "received_at": RECEIVED_AT,
+        "elapsed_seconds": 0.25,
+        "request_body": {"examCenterId": 1, "licenseType": "B"},
+        "payload": [{"id": 0}],
+    }
+    assert [record["received_at"] for record in second_day] == [RECEIVED_AT + timedelta(minutes=2), RECEIVED_AT + timedelta(minutes=1)]
+
+    paths: list[str] = [str(tmp_path / "recordings" / f"sbat-2026-03-0{day}.jsonl.gz") for day in (2, 3)]
+    replayed: list[dict] = load_records(paths, date(2026, 3, 3))
+    assert [record["received_at"] for record in replayed] == [RECEIVED_AT + timedelta(minutes=1), RECEIVED_AT + timedelta(minutes=2)]
+
+
+def test_a_recording_cut_off_mid_write_reads_up_to_the_last_whole_record(tmp_path: Path) -> None:
+    path: Path = tmp_path / "sbat.jsonl.gz"
+    recorder = PollRecorder(str(path))
+    recorder.write({"examCenterId": 1}, [{"id": 1}], RECEIVED_AT, 0.25)
+    # a crash mid-write leaves a partial line after the flushed records and no gzip trailer
+    recorder._file.write(b'{"received_at": "2026-03-')  # pylint: disable=protected-access
+    recorder._file.flush()  # pylint: disable=protected-access
+    crashed: bytes = path.read_bytes()
+    recorder.close()
+    path.write_bytes(crashed)
+
+    assert [record["payload"] for record in read_recording(str(path))] == [[{"id": 1}]]
@@ -0,0 +1,50 @@
+import pytest
+
+from api.services.poll_trace import PollTracer, span
+
+
+def test_spans_nest_under_the_poll_and_export_as_otlp() -> None:
+    tracer = PollTracer(capacity=2)
+    with tracer.trace("brakel", "B"):
+        with span("sbat_request", attempt=1) as request_span:
+            request_span.set_attribute("status_code", 200)
+            with span("parse_response"):
+                pass
+        with pytest.raises(RuntimeError):
+            with span("store_new_time_slots", count=2.5, cached=True):
+                raise RuntimeError("database unavailable")
+
+    (poll_trace,) = tracer.recent(10)
+    poll, request, parse, store = poll_trace.spans
+    assert (request.parent, parse.parent, store.parent) == (poll, request, poll)
+
+    otlp_spans = tracer.to_otlp(10)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [otlp_span["name"] for otlp_span in otlp_spans] == ["poll", "sbat_request", "parse_response", "store_new_time_slots"]
+    assert {otlp_span["traceId"] for otlp_span in otlp_spans} == {poll_trace.trace_id}
+    assert "parentSpanId" not in otlp_spans[0]
+    assert [otlp_span["parentSpanId"] for otlp_span in otlp_spans[1:]] == [poll.span_id, request.span_id, poll.span_id]
+    for otlp_span in otlp_spans:
+        assert int(otlp_span["startTimeUnixNano"]) <= int(otlp_span["endTimeUnixNano"])
+    assert otlp_spans[1]["attributes"] == [
+        {"key": "exam_center", "value": {"stringValue": "brakel"}},
+        {"key": "license_type", "value": {"stringValue": "B"}},
+        {"key": "attempt", "value": {"intValue": "1"}},
+        {"key": "status_code", "value": {"intValue": "200"}},
+    ]
+    store_attributes: dict = {attribute["key"]: attribute["value"] for attribute in otlp_spans[3]["attributes"]}
+    assert (store_attributes["count"], store_attributes["cached"]) == ({"doubleValue": 2.5}, {"boolValue": True})
+    assert otlp_spans[3]["status"] == {"code": 2, "message": "RuntimeError"}
+
+
+def test_only_the_last_traces_are_kept_newest_first() -> None:
+    tracer = PollTracer(capacity=2)
+    for exam_center in ("brakel", "eeklo", "erembodegem"):
+        with tracer.trace(exam_center, "B"):
+            pass
+
+    assert [poll_trace.exam_center for poll_trace in tracer.recent(10)] == ["erembodegem", "eeklo"]
+    assert [poll_trace.exam_center for poll_trace in tracer.recent(1)] == ["erembodegem"]
+    # outside of a traced poll spans are no-ops
+    with span("sbat_request") as no_span:
+        no_span.set_attribute("status_code", 200)
+    assert len(tracer.recent(10)[0].spans) == 1
@@ -0,0 +1,57 @@
+import asyncio
+import io
+import marshal
+import time
+
+import pytest
+
+from api.services.profiler import Profiler, ProfilerBusyError
+
+
+def burn_cpu(seconds: float) -> None:
+    deadline: float = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy_poll() -> None:
+    burn_cpu(0.3)
+
+
+@pytest.mark.asyncio
+async def test_samples_collapse_to_stacks_rooted_at_the_task() -> None:
+    profiler = Profiler()
+    sampling: asyncio.Task = asyncio.create_task(profiler.sample(0.2, interval=0.002))
+    # give the sampler thread a moment to start before the loop is blocked
+    await asyncio.sleep(0.02)
+    with pytest.raises(ProfilerBusyError):
+        await profiler.sample(0.1)
+    await asyncio.create_task(busy_poll())
+
+    collapsed, interval = await sampling
+
+    assert interval >= 0.002
+    lines: list[tuple[list[str], int]] = [(stack.split(";"), int(count)) for stack, count in (line.rsplit(" ", 1) for line in collapsed.splitlines())]
+    busy: list[tuple[list[str], int]] = [(frames, count) for frames, count in lines if frames[0].endswith("busy_poll")]
+    assert busy, collapsed
+    frames, _ = busy[0]
+    assert frames[0] == "task busy_poll"
+    assert frames[1].startswith("busy_poll (tests/test_profiler.py:")
+    assert frames[-1].startswith("burn_cpu (tests/test_profiler.py:")
+    # the event loop frames below the task step are left out
+    assert not any("base_events" in frame for frames, _ in busy for frame in frames)
+
+
+@pytest.mark.asyncio
+async def test_trace_returns_pstats_of_the_loop_thread() -> None:
+    profiler = Profiler(max_seconds=0.05)
+
+    async def traced() -> None:
+        await asyncio.sleep(0.01)
+        burn_cpu(0.01)
+
+    task: asyncio.Task = asyncio.create_task(traced())
+    stats: dict = marshal.load(io.BytesIO(await profiler.trace(10)))
+    await task
+
+    assert any(function_name == "burn_cpu" for _, _, function_name in stats)
@@ -0,0 +1,526 @@
+import os
+import zlib
+from pathlib import Path
+from datetime import UTC, datetime, timedelta
+from typing import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from api.cache import SubscriberCache
+from api.db.base_repo import BaseRepository
+from api.db.document_view import DocumentView, ReturnMode
+from api.db.memory_repo import InMemoryRepository
+from api.db.mongo_repo import MongoRepository
+from api.db.password_hasher import PasswordHasher
+from api.db.sqlite_repo import SqliteRepository
+from api.models.sbat import (
+    ExamTimeSlotCreate,
+    ExamTimeSlotRead,
+    MonitorPreferences,
+    NotificationReceiptCreate,
+    NotificationReceiptRead,
+    SbatRequestCreate,
+    SbatRequestRead,
+    SbatTokenCreate,
+    SbatTokenRead,
+    ServerResponseTimeCreate,
+    ServerResponseTimeRead,
+    ServerResponseTimeRollupRead,
+    SlotEvent,
+    SlotStatsRead,
+)
+from api.models.subscriber import SubscriberCreate, SubscriberRead
+
+TEST_DATABASE_NAME = "test-repository-contract"
+
+
+def fast_password_hasher() -> PasswordHasher:
+    return PasswordHasher(max_workers=1, rounds=4, min_rounds=4)
+
+
+@pytest_asyncio.fixture(params=["memory", "sqlite", "mongodb"])
+async def repo(request: pytest.FixtureRequest, tmp_path: Path) -> AsyncGenerator[BaseRepository, None]:
+    if request.param == "memory":
+        yield InMemoryRepository(SubscriberCache(128, 60), fast_password_hasher())
+        return
+
+    if request.param == "sqlite":
+        sqlite_repo = SqliteRepository(str(tmp_path / "contract.db"), SubscriberCache(128, 60), fast_password_hasher())
+        yield sqlite_repo
+        sqlite_repo.close()
+        return
+
+    client: AsyncIOMotorClient = AsyncIOMotorClient(
+        os.environ.get("DATABASE_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500
+    )
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+
+    await client.drop_database(TEST_DATABASE_NAME)
+    mongo_repo = MongoRepository(client[TEST_DATABASE_NAME], SubscriberCache(128, 60), fast_password_hasher())
+    await mongo_repo.ensure_indexes(timedelta(days=14))
+    yield mongo_repo
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+
+def time_slot(exam_id: int, exam_center_id: int = 1, status: str = "notified", types_blob: list[str] | None = None) -> ExamTimeSlotCreate:
+    now: datetime = datetime.now(UTC)
+    return ExamTimeSlotCreate(
+        exam_id=exam_id,
+        first_found_at=now,
+        found_at=now,
+        start_time=now + timedelta(days=7),
+        end_time=now + timedelta(days=7, minutes=30),
+        status=status,
+        exam_center_id=exam_center_id,
+        types_blob=types_blob or ["B"],
+    )
+
+
+def subscriber(email: str, **fields) -> SubscriberCreate:
+    return SubscriberCreate(name=email.split("@")[0], email=email, password="correct horse", **fields)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.asyncio
+async def test_create_and_find_one_in_every_return_mode(repo: BaseRepository) -> None:
+    created: ExamTimeSlotRead = await repo.create("slots", time_slot(1), ExamTimeSlotRead)
+
+    model: ExamTimeSlotRead = await repo.find_one("slots", {"exam_id": 1}, ExamTimeSlotRead)
+    document: dict = await repo.find_one("slots", {"exam_id": 1}, ExamTimeSlotRead, return_mode=ReturnMode.DICT)
+    view: DocumentView = await repo.find_one("slots", {"exam_id": 1}, ExamTimeSlotRead, return_mode=ReturnMode.VIEW)
+
+    assert model.id == created.id == str(document["_id"]) == view.id
+    assert model.types_blob == document["types_blob"] == ["B"]
+    assert view.types_blob == ("B",)
+    assert await repo.find_one("slots", {"exam_id": 2}, ExamTimeSlotRead) is None
+
+
+def test_view_fields_win_over_mapping_methods() -> None:
+    view = DocumentView({"_id": ObjectId(), "items": [{"get": 1}], "keys": "k"})
+
+    assert view.items == (DocumentView({"get": 1}),)
+    assert view.items[0].get == 1
+    assert view.keys == view["keys"] == "k"
+    assert DocumentView({"name": "n"}).get("name") == "n"
+    with pytest.raises(AttributeError):
+        view.missing  # pylint: disable=pointless-statement
+
+
+@pytest.mark.asyncio
+async def test_find_with_in_and_projection(repo: BaseRepository) -> None:
+    await repo.create_many("slots", [time_slot(exam_id) for exam_id in range(1, 6)])
+
+    found: list[dict] = await repo.find(
+        "slots", {"exam_id": {"$in": [2, 4, 9]}}, ExamTimeSlotRead, {"exam_id": 1, "status": 1, "_id": 0}, ReturnMode.DICT
+    )
+
+    assert sorted(found, key=lambda slot: slot["exam_id"]) == [{"exam_id": 2, "status": "notified"}, {"exam_id": 4, "status": "notified"}]
+
+
+@pytest.mark.asyncio
+async def test_exclusion_projection(repo: BaseRepository) -> None:
+    await repo.create_subscriber(subscriber("projection@example.com", extra_details={"address": "somewhere"}))
+
+    document: dict = await repo.find_one(
+        "subscribers", {"email": "projection@example.com"}, SubscriberRead, {"extra_details": 0}, ReturnMode.DICT
+    )
+
+    assert "extra_details" not in document
+    assert document["email"] == "projection@example.com"
+    assert "_id" in document
+
+
+@pytest.mark.asyncio
+async def test_notified_time_slot_ids_filter_on_status_center_and_license(repo: BaseRepository) -> None:
+    await repo.create_many(
+        "slots",
+        [
+            time_slot(1),
+            time_slot(2, types_blob=["AM"]),
+            time_slot(3, exam_center_id=7),
+            time_slot(4, status="taken"),
+            time_slot(5, types_blob=["AM", "B"]),
+        ],
+    )
+
+    assert await repo.find_notified_time_slot_ids(1, "B") == {1, 5}
+    assert await repo.find_notified_time_slot_ids(1, "AM") == {2, 5}
+
+
+@pytest.mark.asyncio
+async def test_update_time_slot_status(repo: BaseRepository) -> None:
+    await repo.create("slots", time_slot(1), ExamTimeSlotRead)
+
+    taken: ExamTimeSlotRead = await repo.update_time_slot_status(1, "taken")
+
+    assert taken.status == "taken"
+    assert taken.taken_at is not None
+    assert await repo.find_notified_time_slot_ids(1, "B") == set()
+    assert await repo.update_time_slot_status(2, "taken") is None
+
+
+@pytest.mark.asyncio
+async def test_update_one_matches_missing_and_null_fields(repo: BaseRepository) -> None:
+    await repo.create("slots", time_slot(1), ExamTimeSlotRead)
+    first_taken_at: datetime = datetime(2024, 9, 2, 8, 30, tzinfo=UTC)
+
+    updated: ExamTimeSlotRead = await repo.update_one(
+        "slots", {"exam_id": 1, "first_taken_at": None}, {"first_taken_at": first_taken_at}, ExamTimeSlotRead
+    )
+    not_updated: ExamTimeSlotRead | None = await repo.update_one(
+        "slots", {"exam_id": 1, "first_taken_at": None}, {"first_taken_at": datetime.now(UTC)}, ExamTimeSlotRead
+    )
+
+    assert updated.first_taken_at.replace(tzinfo=UTC) == first_taken_at
+    assert not_updated is None
+
+
+@pytest.mark.asyncio
+async def test_archived_time_slots_leave_the_hot_queries(repo: BaseRepository) -> None:
+    now: datetime = datetime.now(UTC)
+    started: ExamTimeSlotCreate = time_slot(1)
+    started.start_time = now - timedelta(hours=1)
+    taken_long_ago: ExamTimeSlotCreate = time_slot(2, status="taken")
+    taken_long_ago.taken_at = now - timedelta(days=30)
+    taken_recently: ExamTimeSlotCreate = time_slot(3, status="taken")
+    taken_recently.taken_at = now - timedelta(days=1)
+    await repo.create_many("slots", [started, taken_long_ago, taken_recently, time_slot(4)])
+
+    assert await repo.archive_time_slots(now, now - timedelta(days=14), batch_size=1) == 2
+    assert await repo.find_notified_time_slot_ids(1, "B") == {4}
+    hot: list[dict] = await repo.find("slots", {}, ExamTimeSlotRead, {"exam_id": 1, "_id": 0}, ReturnMode.DICT)
+    assert sorted(time_slot["exam_id"] for time_slot in hot) == [3, 4]
+    every_tier: list[dict] = await repo.find_time_slots_in_all_tiers({"exam_center_id": 1}, {"exam_id": 1, "_id": 0}, ReturnMode.DICT)
+    assert sorted(time_slot["exam_id"] for time_slot in every_tier) == [1, 2, 3, 4]
+
+    assert await repo.restore_archived_time_slots([2, 5]) == {2}
+    assert (await repo.find_one("slots", {"exam_id": 2}, ExamTimeSlotRead)).status == "taken"
+    assert len(await repo.find_time_slots_in_all_tiers({})) == 4
+
+
+@pytest.mark.asyncio
+async def test_time_slots_page_through_both_tiers(repo: BaseRepository) -> None:
+    now: datetime = datetime.now(UTC)
+    started: list[ExamTimeSlotCreate] = [time_slot(exam_id) for exam_id in (5, 2, 7)]
+    for slot in started:
+        slot.start_time = now - timedelta(hours=1)
+    await repo.create_many("slots", [*started, time_slot(4), time_slot(1), time_slot(3)])
+    await repo.archive_time_slots(now, now - timedelta(days=14))
+
+    pages: list[list[int]] = [[slot.exam_id for slot in page] async for page in repo.iter_time_slots_in_all_tiers(batch_size=2)]
+
+    assert pages == [[1, 3], [4], [2, 5], [7]]
+
+
+@pytest.mark.asyncio
+async def test_sbat_token_is_one_document_per_username(repo: BaseRepository) -> None:
+    now: datetime = datetime.now(UTC).replace(microsecond=0)
+    for token in ("first", "second"):
+        await repo.save_sbat_token(SbatTokenCreate(username="monitor@example.com", token=token, expires_at=now + timedelta(hours=1), refreshed_at=now))
+
+    stored: SbatTokenRead = await repo.find_sbat_token("monitor@example.com")
+
+    assert (stored.token, stored.expires_at.replace(tzinfo=UTC)) == ("second", now + timedelta(hours=1))
+    assert len(await repo.find("sbat_tokens", {}, SbatTokenRead)) == 1
+    assert await repo.find_sbat_token("other@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_sbat_requests_keep_compressed_bodies_until_they_expire(repo: BaseRepository) -> None:
+    now: datetime = datetime.now(UTC)
+    for request_type, expires_at in (("authentication", now - timedelta(days=1)), ("check_for_time_slots", now + timedelta(days=1))):
+        await repo.create(
+            "requests",
+            SbatRequestCreate(
+                timestamp=now,
+                request_type=request_type,
+                response={"status_code": 500, "body_zlib": zlib.compress(b'{"error": "unavailable"}')},
+                url="https://example.com",
+                email_used="monitor@example.com",
+                expires_at=expires_at,
+            ),
+            SbatRequestRead,
+        )
+
+    assert await repo.delete_expired_sbat_requests(now) == 1
+    remaining: list[SbatRequestRead] = await repo.find("requests", {}, SbatRequestRead)
+    assert [(request.request_type, request.response_text) for request in remaining] == [("check_for_time_slots", '{"error": "unavailable"}')]
+
+
+@pytest.mark.asyncio
+async def test_create_subscriber_and_verify_credentials(repo: BaseRepository) -> None:
+    created: SubscriberRead = await repo.create_subscriber(subscriber("Someone@Example.com"))
+
+    with pytest.raises(Exception, match="Email already subscribed"):
+        await repo.create_subscriber(subscriber("someone@example.com"))
+
+    verified: SubscriberRead | None = await repo.verify_subscriber_credentials("someone@example.com", "correct horse")
+    assert verified is not None and verified.id == created.id
+    assert await repo.verify_subscriber_credentials("someone@example.com", "wrong") is None
+    assert await repo.verify_subscriber_credentials("nobody@example.com", "correct horse") is None
+
+
+@pytest.mark.asyncio
+async def test_weak_password_hashes_are_replaced_on_login(repo: BaseRepository) -> None:
+    await repo.create_subscriber(subscriber("rehash@example.com"))
+    old_hash: str = (await repo.find_one("subscribers", {"email": "rehash@example.com"}, SubscriberRead)).hashed_password
+
+    repo.password_hasher = PasswordHasher(max_workers=1, rounds=5, min_rounds=5)
+    verified: SubscriberRead | None = await repo.verify_subscriber_credentials("rehash@example.com", "correct horse")
+
+    assert verified is not None
+    assert verified.hashed_password != old_hash
+    assert verified.hashed_password.startswith("$2b$05$")
+
+
+@pytest.mark.asyncio
+async def test_find_subscriber_by_nested_user_ids(repo: BaseRepository) -> None:
+    await repo.create_subscriber(subscriber("telegram@example.com", telegram_user={"id": 42, "first_name": "T"}))
+    await repo.create_subscriber(subscriber("discord@example.com", discord_user={"id": "1337"}))
+
+    by_telegram: SubscriberRead = await repo.find_subscriber_by_telegram_user_id(42)
+    by_discord: DocumentView = await repo.find_subscriber_by_discord_user_id("1337", {"email": 1}, ReturnMode.VIEW)
+
+    assert by_telegram.email == "telegram@example.com"
+    assert by_discord.email == "discord@example.com"
+    assert await repo.find_subscriber_by_telegram_user_id(43) is None
+
+
+@pytest.mark.asyncio
+async def test_subscribed_recipients_use_array_membership(repo: BaseRepository) -> None:
+    preferences = MonitorPreferences(exam_center_ids=[1, 7], license_types=["B"])
+    await repo.create_subscriber(
+        subscriber("a@example.com", is_subscription_active=True, wants_emails=True, telegram_user={"id": 1}, monitoring_preferences=preferences)
+    )
+    await repo.create_subscriber(
+        subscriber("b@example.com", is_subscription_active=True, wants_emails=False, telegram_user={"id": 2}, monitoring_preferences=preferences)
+    )
+    await repo.create_subscriber(subscriber("c@example.com", is_subscription_active=False, wants_emails=True, monitoring_preferences=preferences))
+    await repo.create_subscriber(subscriber("d@example.com", is_subscription_active=True, wants_emails=True))
+
+    assert await repo.find_all_subscribed_emails(7, "B") == {"a@example.com"}
+    assert await repo.find_all_subscribed_emails(1, "B") == {"a@example.com", "d@example.com"}
+    assert await repo.find_all_subscribed_emails(7, "AM") == set()
+    assert await repo.find_all_subscribed_telegram_ids(7, "B") == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_updates_are_visible_to_queries_on_the_updated_field(repo: BaseRepository) -> None:
+    created: SubscriberRead = await repo.create_subscriber(subscriber("old@example.com"))
+
+    await repo.update_one("subscribers", {"_id": ObjectId(created.id)}, {"email": "new@example.com"}, SubscriberRead)
+
+    assert await repo.find_one("subscribers", {"email": "old@example.com"}, SubscriberRead) is None
+    assert (await repo.find_one("subscribers", {"email": "new@example.com"}, SubscriberRead)).id == created.id
+
+
+@pytest.mark.asyncio
+async def test_subscriber_updates_invalidate_the_cache(repo: BaseRepository) -> None:
+    created: SubscriberRead = await repo.create_subscriber(subscriber("cached@example.com"))
+    repo.subscriber_cache.set(created)
+
+    await repo.update_one("subscribers", {"_id": ObjectId(created.id)}, {"wants_emails": True}, SubscriberRead)
+
+    assert repo.subscriber_cache.get("cached@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_activate_subscriber_subscription(repo: BaseRepository) -> None:
+    await repo.create_subscriber(subscriber("paying@example.com", stripe_customer_id="cus_1"))
+
+    before: SubscriberRead = await repo.activate_subscriber_subscription("cus_1", 500)
+    await repo.activate_subscriber_subscription("cus_1", 500)
+    after: SubscriberRead = await repo.find_one("subscribers", {"stripe_customer_id": "cus_1"}, SubscriberRead)
+
+    assert before.is_subscription_active is False
+    assert after.is_subscription_active is True
+    assert after.total_spent == 1000
+    assert await repo.activate_subscriber_subscription("cus_unknown", 500) is None
+
+
+@pytest.mark.asyncio
+async def test_process_checkout_session_creates_or_updates_the_subscriber(repo: BaseRepository) -> None:
+    existing: SubscriberRead = await repo.create_subscriber(subscriber("existing@example.com"))
+
+    def session(client_reference_id: str, email: str) -> dict:
+        return {
+            "subscription": "sub_1",
+            "amount_total": 500,
+            "client_reference_id": client_reference_id,
+            "customer": "cus_1",
+            "customer_details": {"name": "Name", "email": email, "phone": None, "address": {"country": "BE"}},
+        }
+
+    updated: SubscriberRead = await repo.process_checkout_session(session(existing.id, "existing@example.com"))
+    unknown_reference: str = str(ObjectId())
+    created: SubscriberRead = await repo.process_checkout_session(session(unknown_reference, "new@example.com"))
+
+    assert updated.id == existing.id
+    assert updated.stripe_ids == ["sub_1"]
+    assert updated.extra_details == {"address": {"country": "BE"}}
+    assert updated.is_subscription_active is True
+    assert created.email == "new@example.com"
+    assert (await repo.find_one("subscribers", {"email": "new@example.com"}, SubscriberRead)).total_spent == 500
+
+    # a redelivered session updates the subscriber it inserted instead of inserting another one
+    replayed: SubscriberRead = await repo.process_checkout_session(session(unknown_reference, "new@example.com"))
+    assert replayed.id == created.id
+    assert len(await repo.find("subscribers", {"email": "new@example.com"}, SubscriberRead)) == 1
+
+
+@pytest.mark.asyncio
+async def test_stripe_events_are_stored_once_and_processed_in_order(repo: BaseRepository) -> None:
+    assert await repo.create_stripe_event({"id": "evt_2", "created": 2, "type": "invoice.payment_succeeded"}) is None
+    assert await repo.create_stripe_event({"id": "evt_1", "created": 1, "type": "invoice.payment_succeeded"}) is None
+    assert await repo.create_stripe_event({"id": "evt_1", "created": 1, "type": "invoice.payment_succeeded"}) == "pending"
+
+    assert [event["id"] for event in await repo.find_unprocessed_stripe_events()] == ["evt_1", "evt_2"]
+
+    await repo.mark_stripe_event_processed("evt_1")
+
+    assert [event["id"] for event in await repo.find_unprocessed_stripe_events()] == ["evt_2"]
+    assert await repo.create_stripe_event({"id": "evt_1", "created": 1, "type": "invoice.payment_succeeded"}) == "processed"
+
+
+@pytest.mark.asyncio
+async def test_telegram_events_are_stored_once(repo: BaseRepository) -> None:
+    assert await repo.create_telegram_event({"update_id": 1, "message": {"text": "/start"}}) is True
+    assert await repo.create_telegram_event({"update_id": 1, "message": {"text": "/start"}}) is False
+    assert await repo.create_telegram_event({"update_id": 2, "message": {"text": "/start"}}) is True
+
+
+@pytest.mark.asyncio
+async def test_discord_events_are_stored_once_per_interaction_token(repo: BaseRepository) -> None:
+    await repo.create_discord_event({"token": "interaction-1", "type": 2})
+    await repo.create_discord_event({"token": "interaction-1", "type": 2})
+    await repo.create_discord_event({"token": "interaction-2", "type": 2})
+
+    assert len(await repo.find("discord_events", {}, SubscriberRead, {"token": 1}, ReturnMode.DICT)) == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_notification_receipts_are_deleted(repo: BaseRepository) -> None:
+    now: datetime = datetime.now(UTC)
+
+    def receipt(alert_id: str, expires_at: datetime) -> NotificationReceiptCreate:
+        return NotificationReceiptCreate(
+            alert_id=alert_id,
+            channel="telegram",
+            exam_center_id=1,
+            license_type="B",
+            exam_ids=[1],
+            found_at=now,
+            expires_at=expires_at,
+            recipients=["1", "2"],
+            accepted_ms=[120, None],
+            outcomes=["accepted", "failed"],
+        )
+
+    await repo.create_many("notification_receipts", [receipt("expired", now - timedelta(days=1)), receipt("live", now + timedelta(days=1))])
+
+    assert await repo.delete_expired_notification_receipts(now) == 1
+    remaining: list[NotificationReceiptRead] = await repo.find("notification_receipts", {}, NotificationReceiptRead)
+    assert [receipt.alert_id for receipt in remaining] == ["live"]
+    assert remaining[0].accepted_ms == [120, None]
+
+
+@pytest.mark.asyncio
+async def test_server_response_times_fold_into_rollups(repo: BaseRepository) -> None:
+    ttl: timedelta = timedelta(days=1)
+    hour: datetime = datetime.now(UTC).replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+
+    def sample(start: datetime, duration_ms: int, response_size: int) -> ServerResponseTimeCreate:
+        return ServerResponseTimeCreate(
+            start=start,
+            end=start + timedelta(milliseconds=duration_ms),
+            request_body={"examCenterId": 1, "licenseType": "B"},
+            response_size=response_size,
+        )
+
+    for start, duration_ms, response_size in ((hour, 200, 100), (hour + timedelta(seconds=30), 400, 300), (hour + timedelta(minutes=5), 900, 50)):
+        await repo.add_server_response_time(sample(start, duration_ms, response_size), ttl)
+
+    minutes: list[ServerResponseTimeRollupRead] = await repo.find(
+        "server_response_time_rollups", {"resolution": "minute"}, ServerResponseTimeRollupRead
+    )
+    first: ServerResponseTimeRollupRead = min(minutes, key=lambda rollup: rollup.bucket_start)
+    assert sorted(rollup.count for rollup in minutes) == [1, 2]
+    assert (first.duration_min_ms, first.duration_max_ms, first.response_bytes_sum) == (200, 400, 400)
+    assert sum(first.sketch.values()) == 2
+
+    hours: list[ServerResponseTimeRollupRead] = await repo.find("server_response_time_rollups", {"resolution": "hour"}, ServerResponseTimeRollupRead)
+    assert [(rollup.count, rollup.duration_sum_ms, rollup.expires_at) for rollup in hours] == [(3, 1500, None)]
+
+    await repo.delete_expired_server_response_times(datetime.now(UTC) + ttl, ttl)
+    assert await repo.find("server_response_time_rollups", {"resolution": "minute"}, ServerResponseTimeRollupRead) == []
+    assert len(await repo.find("server_response_time_rollups", {}, ServerResponseTimeRollupRead)) == 1
+
+
+@pytest.mark.asyncio
+async def test_raw_samples_from_before_the_rollups_are_kept_until_folded_in(repo: BaseRepository) -> None:
+    ttl: timedelta = timedelta(days=1)
+    start: datetime = datetime(2026, 3, 2, 8, 15, tzinfo=UTC)
+    samples: list[ServerResponseTimeCreate] = [
+        ServerResponseTimeCreate(
+            start=start + timedelta(minutes=minute),
+            end=start + timedelta(minutes=minute, milliseconds=200),
+            request_body={"examCenterId": 1, "licenseType": "B"},
+            response_size=100,
+        )
+        for minute in range(5)
+    ]
+    # stored before the rollups existed
+    await repo.create_many("server_response_times", samples)
+
+    assert not await repo.server_response_time_rollups_cover_samples()
+    await repo.delete_expired_server_response_times(datetime.now(UTC), ttl)
+    pages: list[list[ServerResponseTimeRead]] = [page async for page in repo.iter_server_response_times(2)]
+    assert [[sample.start.replace(tzinfo=UTC) for sample in page] for page in pages] == [
+        [sample.start for sample in samples[:2]],
+        [sample.start for sample in samples[2:4]],
+        [samples[4].start],
+    ]
+
+    await repo.record_server_response_time_rollups([sample for page in pages for sample in page], ttl)
+
+    assert await repo.server_response_time_rollups_cover_samples()
+    hours: list[ServerResponseTimeRollupRead] = await repo.find("server_response_time_rollups", {"resolution": "hour"}, ServerResponseTimeRollupRead)
+    assert [(rollup.bucket_start.replace(tzinfo=UTC), rollup.count) for rollup in hours] == [(datetime(2026, 3, 2, 8, tzinfo=UTC), 5)]
+
+
+@pytest.mark.asyncio
+async def test_slot_events_fold_into_monthly_stats(repo: BaseRepository) -> None:
+    at: datetime = datetime(2026, 3, 10, tzinfo=UTC)
+    await repo.record_slot_events(
+        [
+            SlotEvent(kind="found", at=at, exam_center_id=1, driving_school="Rijschool A"),
+            SlotEvent(kind="taken", at=at, exam_center_id=1, driving_school="Rijschool A", seconds_on_offer=60),
+            SlotEvent(kind="found", at=at + timedelta(days=30), exam_center_id=1),
+        ]
+    )
+    await repo.record_slot_events([SlotEvent(kind="taken", at=at, exam_center_id=1, seconds_on_offer=120), SlotEvent(kind="re_released", at=at, exam_center_id=1)])
+
+    centers: list[SlotStatsRead] = await repo.find("slot_stats", {"dimension": "exam_center", "key": "sintdenijswestrem"}, SlotStatsRead)
+    march: SlotStatsRead = min(centers, key=lambda stats: stats.month)
+    assert sorted((stats.found, stats.taken, stats.re_released) for stats in centers) == [(1, 0, 0), (1, 2, 1)]
+    assert (march.month.replace(tzinfo=UTC), march.seconds_on_offer_sum, sum(march.seconds_on_offer_sketch.values())) == (
+        datetime(2026, 3, 1, tzinfo=UTC),
+        180,
+        2,
+    )
+    schools: list[SlotStatsRead] = await repo.find("slot_stats", {"dimension": "driving_school"}, SlotStatsRead)
+    assert [(stats.key, stats.found, stats.taken) for stats in schools] == [("Rijschool A", 1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_ping(repo: BaseRepository) -> None:
+    await repo.ping()
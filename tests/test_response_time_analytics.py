@@ -0,0 +1,119 @@
+import asyncio
+import csv
+import io
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from api.db.memory_repo import InMemoryRepository
+from api.models.sbat import ServerResponseTimeCreate
+from api.services import response_time_analytics
+from api.services.response_time_analytics import ResponseTimeAnalytics, analyze, buckets_csv
+
+DAY: datetime = datetime(2026, 3, 2, tzinfo=UTC)
+
+
+def columns(samples: list[tuple[datetime, float, int, int]]) -> dict[str, np.ndarray]:
+    """Columns of (start, duration_ms, response_size, exam_center_id) samples."""
+    return {
+        "start": np.array([start.timestamp() for start, *_ in samples], np.float64),
+        "duration_ms": np.array([duration for _, duration, _, _ in samples], np.float64),
+        "response_size": np.array([size for *_, size, _ in samples], np.int64),
+        "exam_center_id": np.array([center for *_, center in samples], np.int64),
+    }
+
+
+def test_samples_are_bucketed_per_exam_center_and_hour() -> None:
+    durations: list[float] = [100, 200, 300, 400, 1000]
+    samples = [(DAY + timedelta(minutes=10 * i), duration, 1000, 1) for i, duration in enumerate(durations)]
+    samples += [(DAY + timedelta(hours=1), 50, 2000, 1), (DAY + timedelta(days=1, minutes=5), 70, 3000, 1), (DAY, 80, 4000, 7)]
+
+    analytics = analyze(columns(samples), DAY, DAY + timedelta(days=2), "hour", 2.0)
+
+    assert analytics.count == 8
+    assert [(bucket.exam_center, bucket.hour, bucket.count) for bucket in analytics.buckets] == [
+        ("sintdenijswestrem", DAY, 5),
+        ("sintdenijswestrem", DAY + timedelta(hours=1), 1),
+        ("sintdenijswestrem", DAY + timedelta(days=1), 1),
+        ("brakel", DAY, 1),
+    ]
+    first = analytics.buckets[0]
+    assert (first.mean_ms, first.max_ms, first.mean_response_bytes) == (400, 1000, 1000)
+    assert first.p50_ms == pytest.approx(np.quantile(durations, 0.5))
+    assert first.p90_ms == pytest.approx(np.quantile(durations, 0.9))
+
+    by_hour_of_day = analyze(columns(samples), DAY, DAY + timedelta(days=2), "hour_of_day", 2.0)
+    assert [(bucket.exam_center, bucket.hour, bucket.hour_of_day, bucket.count) for bucket in by_hour_of_day.buckets] == [
+        ("sintdenijswestrem", None, 0, 6),
+        ("sintdenijswestrem", None, 1, 1),
+        ("brakel", None, 0, 1),
+    ]
+    assert analyze(columns(samples), DAY + timedelta(days=3), DAY + timedelta(days=4), "hour", 2.0).buckets == []
+
+
+def test_consecutive_slow_hours_form_one_window() -> None:
+    p50s: list[float] = [100, 100, 500, 600, 100, 100, 450]
+    samples = [(DAY + timedelta(hours=hour), p50, 1000, 1) for hour, p50 in enumerate(p50s)]
+    samples += [(DAY + timedelta(hours=hour), 100, 1000, 7) for hour in range(3)]
+
+    analytics = analyze(columns(samples), DAY, DAY + timedelta(days=1), "hour", 2.0)
+
+    assert [bucket.slow for bucket in analytics.buckets if bucket.exam_center == "sintdenijswestrem"] == [False, False, True, True, False, False, True]
+    assert [(window.exam_center, window.first_hour, window.hours, window.max_p50_ms) for window in analytics.slowness_windows] == [
+        ("sintdenijswestrem", DAY + timedelta(hours=2), 2, 600),
+        ("sintdenijswestrem", DAY + timedelta(hours=6), 1, 450),
+    ]
+
+
+def test_response_size_trend_is_the_least_squares_slope() -> None:
+    samples = [(DAY + timedelta(days=day), 100, 1000 + 25 * day, 1) for day in range(5)]
+
+    (trend,) = analyze(columns(samples), DAY, DAY + timedelta(days=5), "hour", 2.0).response_size_trends
+
+    assert (trend.exam_center, trend.count, trend.mean_response_bytes) == ("sintdenijswestrem", 5, 1050)
+    assert trend.bytes_per_day == pytest.approx(25)
+
+
+def test_buckets_export_as_csv() -> None:
+    samples = [(DAY, 100, 1000, 1), (DAY + timedelta(hours=1), 200, 1000, 1)]
+
+    rows: list[dict] = list(csv.DictReader(io.StringIO(buckets_csv(analyze(columns(samples), DAY, DAY + timedelta(days=1), "hour", 2.0)))))
+
+    assert [(row["exam_center"], row["hour"], row["count"], row["p50_ms"]) for row in rows] == [
+        ("sintdenijswestrem", "2026-03-02T00:00:00Z", "1", "100.0"),
+        ("sintdenijswestrem", "2026-03-02T01:00:00Z", "1", "200.0"),
+    ]
+
+
+async def add_sample(repo: InMemoryRepository, start: datetime) -> None:
+    sample = ServerResponseTimeCreate(
+        start=start, end=start + timedelta(milliseconds=250), request_body={"examCenterId": 1, "licenseType": "B"}, response_size=100
+    )
+    await repo.add_server_response_time(sample, timedelta(days=14))
+
+
+@pytest.mark.asyncio
+async def test_cache_loads_only_new_samples_and_trims_old_ones(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(response_time_analytics, "SETTLE_TIME", timedelta(0))
+    cache_path: str = str(tmp_path / "response-times.npz")
+    repo = InMemoryRepository()
+    await add_sample(repo, datetime.now(UTC) - timedelta(hours=2))
+    await ResponseTimeAnalytics(timedelta(days=1), cache_path).refresh(repo)
+
+    await asyncio.sleep(0.01)
+    # the first sample only survives in the cache, a restart has to read it back and query just the new one
+    later_repo = InMemoryRepository()
+    await add_sample(later_repo, datetime.now(UTC))
+    await asyncio.sleep(0.01)
+    restarted = ResponseTimeAnalytics(timedelta(days=1), cache_path)
+    await restarted.refresh(later_repo)
+    assert len(restarted.columns["start"]) == 2
+    assert restarted.columns["duration_ms"].tolist() == [250, 250]
+    await restarted.refresh(later_repo)
+    assert len(restarted.columns["start"]) == 2
+
+    shorter_retention = ResponseTimeAnalytics(timedelta(hours=1), cache_path)
+    await shorter_retention.refresh(later_repo)
+    assert len(shorter_retention.columns["start"]) == 1
@@ -0,0 +1,33 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from api.db.memory_repo import InMemoryRepository
+from api.models.sbat import ExamTimeSlotCreate, ExamTimeSlotRead, MonitorConfiguration
+from api.services.sbat_monitor import SbatMonitor
+from benchmarks.bench_fanout import release
+from benchmarks.bench_poll_loop import benchmark_settings
+
+
+@pytest.mark.asyncio
+async def test_only_unseen_slots_are_parsed_and_stored(monkeypatch: pytest.MonkeyPatch) -> None:
+    repo = InMemoryRepository()
+    monitor = SbatMonitor(repo, benchmark_settings("memory", "http://unused"), MonitorConfiguration())
+    parsed: list[int] = []
+    parse_time_slot = SbatMonitor._parse_time_slot  # pylint: disable=protected-access
+
+    def counting_parse_time_slot(time_slot: dict, found_at: datetime) -> ExamTimeSlotCreate:
+        parsed.append(time_slot["id"])
+        return parse_time_slot(time_slot, found_at)
+
+    monkeypatch.setattr(SbatMonitor, "_parse_time_slot", staticmethod(counting_parse_time_slot))
+    found_at: datetime = datetime.now(UTC).replace(microsecond=0) - timedelta(seconds=5)
+    await monitor.notify_users_and_update_db(release(1, 2, 1), 1, "sintdenijswestrem", "B", found_at)
+    # slot 1 is gone from the next response, slot 2 is already notified and only slot 3 is new
+    await monitor.notify_users_and_update_db(release(1, 3, 1)[1:], 1, "sintdenijswestrem", "B")
+
+    assert parsed == [1, 2, 3]
+    time_slots: dict[int, ExamTimeSlotRead] = {time_slot.exam_id: time_slot for time_slot in await repo.find("slots", {}, ExamTimeSlotRead)}
+    assert {exam_id: time_slot.status for exam_id, time_slot in time_slots.items()} == {1: "taken", 2: "notified", 3: "notified"}
+    assert time_slots[2].first_found_at.replace(tzinfo=UTC) == found_at
+    assert time_slots[3].first_found_at.replace(tzinfo=UTC) > found_at
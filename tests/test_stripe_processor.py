@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from api.db.document_view import ReturnMode
+from api.db.memory_repo import InMemoryRepository
+from api.models.settings import Settings
+from api.models.subscriber import SubscriberRead
+from api.webhooks import stripe_handlers, stripe_processor
+from api.webhooks.stripe_processor import StripeEventProcessor
+
+
+def invoice_event(event_id: str) -> dict:
+    return {"id": event_id, "created": 1, "type": "invoice.payment_succeeded", "data": {"object": {"customer": "cus_1"}}}
+
+
+@pytest.mark.asyncio
+async def test_failing_events_are_retried_until_they_apply(monkeypatch: pytest.MonkeyPatch) -> None:
+    attempts: list[str] = []
+
+    async def flaky_handler(repo: InMemoryRepository, invoice: dict) -> None:
+        attempts.append(invoice["customer"])
+        if len(attempts) < 3:
+            raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(stripe_processor, "handle_invoice_payment_succeeded", flaky_handler)
+    repo = InMemoryRepository()
+    processor = StripeEventProcessor(2, retry_delays=(0, 0, 0))
+    await repo.create_stripe_event(invoice_event("evt_1"))
+
+    await processor.process(repo, None, invoice_event("evt_1"))
+
+    assert len(attempts) == 3
+    assert await repo.find_unprocessed_stripe_events() == []
+    assert await repo.create_stripe_event(invoice_event("evt_1")) == "processed"
+
+
+@pytest.mark.asyncio
+async def test_events_in_flight_are_not_scheduled_twice(monkeypatch: pytest.MonkeyPatch) -> None:
+    release: asyncio.Event = asyncio.Event()
+    attempts: list[str] = []
+
+    async def slow_handler(repo: InMemoryRepository, invoice: dict) -> None:
+        attempts.append(invoice["customer"])
+        await release.wait()
+
+    monkeypatch.setattr(stripe_processor, "handle_invoice_payment_succeeded", slow_handler)
+    repo = InMemoryRepository()
+    processor = StripeEventProcessor(2, retry_delays=())
+    await repo.create_stripe_event(invoice_event("evt_1"))
+
+    processor.schedule(repo, None, invoice_event("evt_1"))
+    await asyncio.sleep(0)
+    # a redelivery of the still pending event while the first delivery runs
+    assert await repo.create_stripe_event(invoice_event("evt_1")) == "pending"
+    await processor.process(repo, None, invoice_event("evt_1"))
+    release.set()
+    await asyncio.gather(*processor.dispatcher._tasks)  # pylint: disable=protected-access
+
+    assert attempts == ["cus_1"]
+    assert processor.in_flight == set()
+
+
+def checkout_event(event_id: str) -> dict:
+    session: dict = {
+        "customer": "cus_1",
+        "subscription": "sub_1",
+        "amount_total": 500,
+        "client_reference_id": None,
+        "customer_details": {"name": "Jan", "email": "jan@example.com", "phone": "+32470000000", "address": {"country": "BE"}},
+    }
+    return {"id": event_id, "created": 1, "type": "checkout.session.completed", "data": {"object": session}}
+
+
+@pytest.mark.asyncio
+async def test_checkout_retried_after_a_failed_email_inserts_one_subscriber(monkeypatch: pytest.MonkeyPatch) -> None:
+    sent: list[list[str]] = []
+
+    def flaky_send_email(subject: str, recipients: list[str], *args, **kwargs) -> None:
+        sent.append(recipients)
+        if len(sent) == 1:
+            raise ConnectionError("smtp down")
+
+    monkeypatch.setattr(stripe_handlers, "send_email", flaky_send_email)
+    settings: Settings = Settings.model_construct(
+        sender_email="bot@example.com", sender_password="", smtp_server="localhost", smtp_port=25, smtp_starttls=False
+    )
+    repo = InMemoryRepository()
+    processor = StripeEventProcessor(2, retry_delays=(0,))
+    event: dict = checkout_event("evt_1")
+    await repo.create_stripe_event(event)
+
+    await processor.process(repo, settings, event)
+
+    assert sent == [["jan@example.com"], ["jan@example.com"]]
+    assert event["data"]["object"]["customer_details"]["name"] == "Jan"
+    assert await repo.find_unprocessed_stripe_events() == []
+    # a redelivery of the session, e.g. after every attempt failed, updates the subscriber it inserted
+    await processor.process(repo, settings, checkout_event("evt_2"))
+    subscribers: list[dict] = await repo.find("subscribers", {"stripe_customer_id": "cus_1"}, SubscriberRead, return_mode=ReturnMode.DICT)
+    assert [(subscriber["name"], subscriber["extra_details"]) for subscriber in subscribers] == [("Jan", {"address": {"country": "BE"}})]
+
+
+@pytest.mark.asyncio
+async def test_events_stored_without_a_processing_status_count_as_processed() -> None:
+    repo = InMemoryRepository()
+    # stripe_events rows from before the processing status was recorded
+    await repo._insert_documents("stripe_events", [{"id": "evt_1", "type": "invoice.payment_succeeded"}])  # pylint: disable=protected-access
+
+    assert await repo.create_stripe_event(invoice_event("evt_1")) == "processed"
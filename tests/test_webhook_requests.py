@@ -0,0 +1,46 @@
+import importlib
+import json
+import os
+from argparse import Namespace
+from types import ModuleType
+
+import pytest
+import stripe
+from nacl.signing import VerifyKey
+
+
+@pytest.fixture
+def bench_webhooks(monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    # the benchmark points the settings at its own values on import, keep those out of the other tests
+    monkeypatch.setattr(os, "environ", os.environ.copy())
+    return importlib.import_module("benchmarks.bench_webhooks")
+
+
+def test_stripe_requests_carry_a_valid_signature(bench_webhooks: ModuleType) -> None:
+    body, headers = bench_webhooks.stripe_request(7, 5, ["invoice.payment_succeeded", "invoice.payment_failed"])
+
+    event = stripe.Webhook.construct_event(body, headers["Stripe-Signature"], bench_webhooks.STRIPE_ENDPOINT_SECRET)
+
+    assert (event["id"], event["type"], event["data"]["object"]["customer"]) == ("evt_bench_7", "invoice.payment_failed", "cus_bench_2")
+    with pytest.raises(stripe.error.SignatureVerificationError):
+        stripe.Webhook.construct_event(body + b" ", headers["Stripe-Signature"], bench_webhooks.STRIPE_ENDPOINT_SECRET)
+
+
+def test_discord_requests_verify_against_the_public_key(bench_webhooks: ModuleType) -> None:
+    verify_key: VerifyKey = bench_webhooks.SIGNING_KEY.verify_key
+
+    for index, command in enumerate(bench_webhooks.DISCORD_COMMANDS):
+        body, headers = bench_webhooks.discord_request(index, 10, list(bench_webhooks.DISCORD_COMMANDS))
+        verify_key.verify(headers["X-Signature-Timestamp"].encode() + body, bytes.fromhex(headers["X-Signature-Ed25519"]))
+        interaction: dict = json.loads(body)
+        assert interaction["type"] == (1 if command == "ping" else 2)
+
+
+def test_requests_cycle_through_the_subscribers(bench_webhooks: ModuleType) -> None:
+    args = Namespace(requests=4, subscribers=3, stripe_event_types=["invoice.payment_succeeded"], discord_commands=["start"])
+
+    telegram: list[dict] = [json.loads(body) for body, _ in bench_webhooks.build_requests("telegram", args)]
+
+    assert [update["message"]["chat"]["id"] for update in telegram] == [100_000, 100_001, 100_002, 100_000]
+    assert [update["message"]["text"] for update in telegram] == ["/start", "/voorkeuren", "/start", "/voorkeuren"]
+    assert len({update["update_id"] for update in telegram}) == 4